@@ -1,8 +1,9 @@
 from EasyKnn.value import Value
 from EasyKnn.dataset import Dataset
 from EasyKnn.plan import Plan
+from EasyKnn.asyncplan import AsyncPlan
 from EasyKnn.neighbors import Neighbors
 from EasyKnn.point import Point
 from EasyKnn.weight import Weight
 from EasyKnn.errors import ValueAlreadyLinkedError, DatasetAlreadyLinkedError, \
-                           NoDimensionError, ReadOnlyAttributeError, CriticalDeletionError
+                           NoDimensionError, ReadOnlyAttributeError, CriticalDeletionError, StaleNeighborsError
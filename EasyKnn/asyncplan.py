@@ -0,0 +1,222 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Dict, List, Union
+
+from EasyKnn import kernels
+from EasyKnn.errors import ReadOnlyAttributeError, CriticalDeletionError
+from EasyKnn.metrics import Metric, get_metric
+from EasyKnn.neighbors import Neighbors
+from EasyKnn.plan import Plan
+from EasyKnn.value import Value
+from EasyKnn.weight import Weight
+
+
+class AsyncPlan:
+    """
+    An asyncio wrapper of a :class:`Plan<EasyKnn.plan.Plan>`. Its
+    :meth:`neighbors<EasyKnn.asyncplan.AsyncPlan.neighbors>` method does not block the event loop: the distances are
+    computed in an executor.
+
+    The queries arriving within ``max_wait`` seconds of each other are computed together, with a single call to
+    :meth:`Plan.neighbors_batch<EasyKnn.plan.Plan.neighbors_batch>`, and each caller then gets its own neighbors. Only
+    the queries asking for the same ``k``, weight, ``use_abs`` and metric are computed together. A batch is computed
+    as soon as it holds ``max_batch_size`` queries, or when the first of its queries waited ``max_wait`` seconds.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to query
+    :param max_batch_size: The largest number of queries computed together
+    :param max_wait: The longest time, in seconds, a query waits for other queries before its batch is computed
+    :param executor: The ``concurrent.futures`` executor computing the batches. If ``None``, the default executor of
+            the event loop is used.
+
+    >>> from EasyKnn import Dataset
+    >>> plan = Plan()
+    >>> dataset = Dataset()
+    >>> dataset.add_values([Value([1, 2]), Value([4, 6]), Value([0, 0])])
+    >>> plan.add_dataset(dataset)
+    >>> async_plan = AsyncPlan(plan, max_batch_size=8)
+    >>> async def main():
+    ...     return await asyncio.gather(async_plan.neighbors(Value([1, 1])), async_plan.neighbors(Value([5, 5])))
+    >>> [neighbors.nearest_neighbor() for neighbors in asyncio.run(main())]
+    [[[1, 2]], [[4, 6]]]
+    >>> async_plan.batches, async_plan.batch_sizes
+    (1, {2: 1})
+    """
+
+    def __init__(self, plan: Plan, max_batch_size: int = 64, max_wait: float = 0.002, executor: Executor = None):
+        if max_batch_size < 1:
+            raise ValueError("The batch size must be at least 1")
+
+        if max_wait < 0:
+            raise ValueError("The wait cannot be negative")
+
+        self._plan = plan
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._executor = executor
+
+        # The weight, the metric and the waiting (value, future) queries of each kind of query, and its timer
+        self._pending = {}
+        self._timers = {}
+
+        # The number of computed batches of each size
+        self._batch_sizes = {}
+
+        # The batches being computed, kept until they end so the event loop does not lose them
+        self._tasks = set()
+
+    @property
+    def plan(self) -> Plan:
+        """
+        The wrapped :class:`Plan<EasyKnn.plan.Plan>`.
+
+        :read-only: True
+        """
+        return self._plan
+
+    @plan.setter
+    def plan(self, *args):
+        raise ReadOnlyAttributeError("The plan attribute is read-only")
+
+    @plan.deleter
+    def plan(self, *args):
+        raise CriticalDeletionError("The plan attribute cannot be deleted")
+
+    @property
+    def batches(self) -> int:
+        """
+        The number of batches computed so far.
+
+        :read-only: True
+        """
+        return sum(self._batch_sizes.values())
+
+    @property
+    def batch_sizes(self) -> Dict[int, int]:
+        """
+        A ``dict`` with the number of batches computed so far for each batch size.
+
+        :read-only: True
+        """
+        return dict(self._batch_sizes)
+
+    @property
+    def average_batch_size(self) -> float:
+        """
+        The average number of queries of the batches computed so far, or ``None`` if no batch was computed.
+
+        :read-only: True
+        """
+        if not self._batch_sizes:
+            return None
+
+        return sum([size * count for size, count in self._batch_sizes.items()]) / self.batches
+
+    async def neighbors(self, value: Value, k: int = 1, weight: Weight = Weight([]), use_abs: bool = True,
+                        metric: Union[str, Metric] = "euclidean") -> Neighbors:
+        """
+        Get the ``k`` nearest neighbors of a value, or the ``k`` farthest if ``k`` is negative, like
+        :meth:`Plan.neighbors_batch<EasyKnn.plan.Plan.neighbors_batch>` does.
+
+        :param value: The :class:`Value<EasyKnn.value.Value>` to get the neighbors
+        :param k: The number of neighbors to get. Default is 1
+        :param weight: The :class:`Weight<EasyKnn.weight.Weight>` to use for the distance calculation
+        :param use_abs: If the absolute value of the distance should be used.
+                    See :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>`.
+        :param metric: The distance to use. See :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>`.
+        :return: A :class:`Neighbors<EasyKnn.neighbors.Neighbors>` object holding only the ``k`` selected points
+        """
+        loop = asyncio.get_running_loop()
+
+        # Two Metric objects may have the same name but not the same distance: only a named metric is batched by name
+        key = (k, tuple(weight.weights), use_abs, metric)
+        metric = get_metric(metric)
+        future = loop.create_future()
+
+        _, _, batch = self._pending.setdefault(key, (weight, metric, []))
+        batch.append((value, future))
+
+        if len(batch) >= self._max_batch_size:
+            self._flush(key)
+
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self._max_wait, self._flush, key)
+
+        return await future
+
+    async def flush(self) -> None:
+        """
+        Compute every waiting batch now, and wait for them.
+
+        :return: ``None``
+        """
+        futures = [future for _, _, batch in self._pending.values() for _, future in batch]
+
+        for key in list(self._pending):
+            self._flush(key)
+
+        if futures:
+            await asyncio.wait(futures)
+
+    def _flush(self, key: tuple) -> None:
+        """
+        Start the computation of the waiting batch of a kind of query.
+
+        :param key: The kind of query
+        :return: ``None``
+        """
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        if key not in self._pending:
+            return
+
+        weight, metric, batch = self._pending.pop(key)
+
+        self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+        task = asyncio.ensure_future(self._compute(key, batch, weight, metric))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _compute(self, key: tuple, batch: List[tuple], weight: Weight, metric: Metric) -> None:
+        """
+        Compute a batch in the executor, and give each query its neighbors.
+
+        :param key: The kind of query of the batch
+        :param batch: The ``(value, future)`` of each query
+        :param weight: The :class:`Weight<EasyKnn.weight.Weight>` of the queries
+        :param metric: The :class:`Metric<EasyKnn.metrics.Metric>` of the queries
+        :return: ``None``
+        """
+        k, _, use_abs, _ = key
+        loop = asyncio.get_running_loop()
+
+        try:
+            results = await loop.run_in_executor(self._executor, self._batch, [value for value, _ in batch], k, weight,
+                                                 use_abs, metric)
+
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (_, future), neighbors in zip(batch, results):
+            # A caller may have stopped waiting
+            if not future.done():
+                future.set_result(neighbors)
+
+    def _batch(self, values: List[Value], k: int, weight: Weight, use_abs: bool, metric: Metric) -> List[Neighbors]:
+        """
+        Compute a batch, in the executor, and create the Neighbors of each query while the Plan is locked.
+        """
+        plan = self._plan
+
+        with plan._lock.read():
+            selections = plan.neighbors_batch(values, k=k, weight=weight, use_abs=use_abs, metric=metric)
+
+            return [Neighbors._from_found(selection, list(plan.datasets),
+                                          plan._full_distances(value.coordinates,
+                                                               kernels.weight_vector(weight, value.dimension),
+                                                               use_abs, metric))
+                    for value, selection in zip(values, selections)]
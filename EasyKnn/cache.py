@@ -0,0 +1,211 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Any
+
+# Returned by DistanceCache.get when a key is not cached, since None could be a cached value
+MISSING = object()
+
+
+class DistanceCache:
+    """
+    A bounded cache of distances, used by :class:`Plan<EasyKnn.plan.Plan>` to memoize the distances computed by
+    :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>`. When the cache is full, a key is evicted to make room for a
+    new one: the least recently used one with the ``"lru"`` policy, or the least frequently used one with the
+    ``"lfu"`` policy (the least recently used one among them).
+
+    The cache can be used by several threads at once.
+
+    :param max_size: The largest number of cached distances. If ``None``, the cache is never full.
+    :param policy: The eviction policy, ``"lru"`` or ``"lfu"``
+
+    >>> cache = DistanceCache(max_size=2)
+    >>> cache.put(1, 0.5)
+    >>> cache.put(2, 1.5)
+    >>> cache.get(1)
+    0.5
+    >>> cache.put(3, 2.5)  # 2 is now the least recently used key
+    >>> 2 in cache, cache.hits, cache.misses, cache.evictions
+    (False, 1, 0, 1)
+    """
+
+    def __init__(self, max_size: int = 100_000, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown cache policy: {policy}")
+
+        if max_size is not None and max_size < 1:
+            raise ValueError("The size of the cache must be at least 1")
+
+        self._max_size = max_size
+        self._policy = policy
+
+        # With the lru policy, the keys are ordered from the least recently used
+        self._values = OrderedDict()
+
+        # With the lfu policy, the number of uses of each key, and the keys of each number of uses, ordered from
+        # the least recently used
+        self._counts = {}
+        self._buckets = {}
+        self._min_count = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        """
+        The largest number of cached distances, or ``None`` if the cache is unbounded.
+
+        :read-only: True
+        """
+        return self._max_size
+
+    @property
+    def policy(self) -> str:
+        """
+        The eviction policy of the cache, ``"lru"`` or ``"lfu"``.
+
+        :read-only: True
+        """
+        return self._policy
+
+    @property
+    def hits(self) -> int:
+        """
+        The number of :meth:`get<EasyKnn.cache.DistanceCache.get>` calls that found their key.
+
+        :read-only: True
+        """
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        """
+        The number of :meth:`get<EasyKnn.cache.DistanceCache.get>` calls that did not find their key.
+
+        :read-only: True
+        """
+        return self._misses
+
+    @property
+    def evictions(self) -> int:
+        """
+        The number of keys removed to make room for new ones.
+
+        :read-only: True
+        """
+        return self._evictions
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Get a cached distance, and count a hit or a miss.
+
+        :param key: The key of the distance
+        :return: The cached distance, or :data:`MISSING<EasyKnn.cache.MISSING>` if the key is not cached
+        """
+        with self._lock:
+            value = self._values.get(key, MISSING)
+
+            if value is MISSING:
+                self._misses += 1
+                return MISSING
+
+            self._hits += 1
+
+            if self._policy == "lru":
+                self._values.move_to_end(key)
+
+            else:
+                self._use(key)
+
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Cache a distance, evicting another one if the cache is full.
+
+        :param key: The key of the distance
+        :param value: The distance
+        :return: ``None``
+        """
+        with self._lock:
+            if key in self._values:
+                self._values[key] = value
+                return
+
+            if self._max_size is not None and len(self._values) >= self._max_size:
+                self._evict()
+
+            self._values[key] = value
+
+            if self._policy == "lfu":
+                self._counts[key] = 1
+                self._buckets.setdefault(1, OrderedDict())[key] = None
+                self._min_count = 1
+
+    def _use(self, key: Hashable) -> None:
+        """
+        Move a key to the next number of uses, with the lfu policy.
+
+        :param key: The used key
+        :return: ``None``
+        """
+        count = self._counts[key]
+
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+            if self._min_count == count:
+                self._min_count = count + 1
+
+        self._counts[key] = count + 1
+        self._buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def _evict(self) -> None:
+        """
+        Remove a key, following the eviction policy.
+
+        :return: ``None``
+        """
+        if self._policy == "lru":
+            self._values.popitem(last=False)
+
+        else:
+            bucket = self._buckets[self._min_count]
+            key, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self._buckets[self._min_count]
+
+            del self._counts[key]
+            del self._values[key]
+
+        self._evictions += 1
+
+    def clear(self) -> None:
+        """
+        Remove every cached distance. The counters are kept.
+
+        :return: ``None``
+        """
+        with self._lock:
+            self._values.clear()
+            self._counts.clear()
+            self._buckets.clear()
+            self._min_count = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._values
+
+    def __getitem__(self, key: Hashable) -> Any:
+        return self._values[key]
+
+    def __repr__(self):
+        return f"DistanceCache({len(self)}/{self._max_size}, {self._policy}, hits={self._hits}, " \
+               f"misses={self._misses}, evictions={self._evictions})"
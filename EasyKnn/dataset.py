@@ -1,9 +1,20 @@
-from typing import List
+import itertools
+import weakref
+from collections.abc import Sequence
+from typing import Iterable, List, Tuple, Union
 
+from EasyKnn import ingest
 from EasyKnn.errors import ReadOnlyAttributeError, ValueAlreadyLinkedError, CriticalDeletionError, \
-    DatasetAlreadyLinkedError
+    DatasetAlreadyLinkedError, NoDimensionError
+from EasyKnn.locks import no_lock
+from EasyKnn.point import Point
+from EasyKnn.stats import RunningStatistics
+from EasyKnn.storage import ColumnarStorage
 from EasyKnn.value import Value
 
+# Each Dataset gets a unique id, used to identify its values without their coordinates
+_dataset_ids = itertools.count()
+
 
 class Dataset:
     """
@@ -11,25 +22,77 @@ class Dataset:
     a :class:`Plan<EasyKnn.plan.Plan>`.
 
     :param display_name: The displayed name of the Dataset
+    :param columnar: If ``True``, the coordinates of the Values are stored in a single contiguous float matrix
+            (a :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>`) instead of a list of
+            :class:`Values<EasyKnn.value.Value>`. Added Values then read their coordinates from the matrix, as floats,
+            and :attr:`data<EasyKnn.dataset.Dataset.data>` creates the Values only when they are read.
+    :param dtype: The storage type of the coordinates, one of the :data:`DTYPES<EasyKnn.storage.DTYPES>`:
+            ``"float64"`` (the default), ``"float32"``, ``"float16"`` or ``"int8"``. A smaller type takes less memory,
+            but keeps the coordinates less precisely: see :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>`.
+            Any other type than ``"float64"`` makes the Dataset columnar.
+
+    >>> dataset = Dataset(columnar=True)
+    >>> dataset.add_values([Value([1, 2, 3]), Value([4, None])])
+    >>> dataset.data
+    [[1.0, 2.0, 3.0], [4.0, None]]
+    >>> dataset.nonify()
+    >>> dataset.data
+    [[1.0, 2.0, 3.0], [4.0, None, None]]
+    >>> dataset.average()
+    [2.5, 2.0, 3.0]
+    >>> dataset.variance(), dataset.bounding_box()
+    ([2.25, 0.0, 0.0], ([1.0, 2.0, 3.0], [4.0, 2.0, 3.0]))
+    >>> compact = Dataset(dtype="float32")
+    >>> compact.add_values([Value([0.1, 2])])
+    >>> compact.data, compact.dtype
+    ([[0.10000000149011612, 2.0]], 'float32')
     """
 
-    def __init__(self, display_name: str = None):
+    def __init__(self, display_name: str = None, columnar: bool = False, dtype: str = "float64"):
         self._data = []
+        self._storage = ColumnarStorage(dtype) if columnar or dtype != "float64" else None
+
+        # The Values of a columnar Dataset still in use, by row, so that reading a row twice gives the same Value
+        self._proxies = weakref.WeakValueDictionary()
+
+        # A matrix copy of the Values of a non-columnar Dataset, built when a vectorized kernel needs it
+        self._columns_cache = None
+
+        # The statistics of the coordinates, computed the first time they are read, then kept up to date
+        self._statistics = None
+
+        # The number of times a Value already in the Dataset changed, so indexes know if new Values were only added
+        self._edits = 0
+
+        # The number of times the Dataset changed, so lazy Neighbors know if their distances are still the ones of
+        # the Dataset
+        self._version = 0
+
         self._dataset_dimension = 0
         self.display_name = display_name
         self._liked_plan = None
-
-        # Only set by Neighbors class.
-        # Should not be set manually.
-        self._average_dist = None
+        self._uid = next(_dataset_ids)
 
     @property
     def data(self) -> List[Value]:
         """
-        A list of all the :class:`Value<EasyKnn.value.Value>` in the Dataset.
+        A list of all the :class:`Value<EasyKnn.value.Value>` in the Dataset. For a columnar Dataset, it is a read-only
+        sequence creating each Value when it is read: a row gives the same Value as long as it is used, and the
+        changes of its coordinates and displayed name are written to the storage.
 
         :read-only: True
+
+        >>> dataset = Dataset(columnar=True)
+        >>> dataset.add_values([Value([1, 2]), Value([3, 4])])
+        >>> dataset.data[0] is dataset.data[0]
+        True
+        >>> dataset.data[1].coordinates = [5, 6]
+        >>> dataset.data
+        [[1.0, 2.0], [5.0, 6.0]]
         """
+        if self._storage is not None:
+            return _ColumnarValues(self)
+
         return self._data
 
     @data.setter
@@ -40,6 +103,41 @@ class Dataset:
     def data(self, *args):
         raise CriticalDeletionError("The data attribute cannot be deleted")
 
+    @property
+    def columnar(self) -> bool:
+        """
+        ``True`` if the coordinates are stored in a :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>`.
+
+        :read-only: True
+        """
+        return self._storage is not None
+
+    @columnar.setter
+    def columnar(self, *args):
+        raise ReadOnlyAttributeError("The columnar attribute is read-only")
+
+    @columnar.deleter
+    def columnar(self, *args):
+        raise CriticalDeletionError("The columnar attribute cannot be deleted")
+
+    @property
+    def dtype(self) -> str:
+        """
+        The storage type of the coordinates. A non-columnar Dataset keeps the numbers of its Values, and is
+        ``"float64"``.
+
+        :read-only: True
+        """
+        return self._storage.dtype if self._storage is not None else "float64"
+
+    @dtype.setter
+    def dtype(self, *args):
+        raise ReadOnlyAttributeError("The dtype attribute is read-only")
+
+    @dtype.deleter
+    def dtype(self, *args):
+        raise CriticalDeletionError("The dtype attribute cannot be deleted")
+
     @property
     def dataset_dimension(self) -> int:
         """
@@ -61,12 +159,19 @@ class Dataset:
     @property
     def average_dist(self) -> float:
         """
-        The average distance of the Dataset to the :class:`Value<EasyKnn.value.Value>`. This attribute is ``None``
-        until :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>` is called.
+        Removed. A query does not write its distances in the Datasets anymore, as queries of several threads would
+        overwrite each other: use
+        :meth:`Neighbors.dataset_average_dist<EasyKnn.neighbors.Neighbors.dataset_average_dist>` to get the average
+        distance of the Dataset to the :class:`Value<EasyKnn.value.Value>` of a given query.
 
-        :read-only: True
+        :exception AttributeError: Always
+
+        >>> Dataset().average_dist
+        Traceback (most recent call last):
+            ...
+        AttributeError: Dataset.average_dist was removed, use Neighbors.dataset_average_dist(dataset) instead
         """
-        return self._average_dist
+        raise AttributeError("Dataset.average_dist was removed, use Neighbors.dataset_average_dist(dataset) instead")
 
     @average_dist.setter
     def average_dist(self, *args):
@@ -76,6 +181,76 @@ class Dataset:
     def average_dist(self, *args):
         raise CriticalDeletionError("The average_dist attribute cannot be deleted")
 
+    @property
+    def statistics(self) -> RunningStatistics:
+        """
+        The :class:`RunningStatistics<EasyKnn.stats.RunningStatistics>` of the coordinates of the Dataset: the count,
+        sum, mean, variance, minimum, maximum and missing count of each dimension. They are computed from all the
+        coordinates the first time they are read, then updated each time a Value is added or changed.
+
+        :read-only: True
+
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([1, 2]), Value([3, None])])
+        >>> dataset.statistics.missing
+        [0, 1]
+        >>> dataset.data[1].coordinates = [5, 4]
+        >>> dataset.statistics.missing, dataset.statistics.sums
+        ([0, 0], [6, 6])
+        """
+        if self._statistics is None:
+            statistics = RunningStatistics(self._column)
+
+            if self._storage is not None:
+                statistics.add_block(self._storage.values(), self._storage.width)
+
+            else:
+                for value in self._data:
+                    statistics.add(value.coordinates)
+
+            self._statistics = statistics
+
+        return self._statistics
+
+    @statistics.setter
+    def statistics(self, *args):
+        raise ReadOnlyAttributeError("The statistics attribute is read-only")
+
+    @statistics.deleter
+    def statistics(self, *args):
+        raise CriticalDeletionError("The statistics attribute cannot be deleted")
+
+    def _column(self, index: int) -> Iterable[Union[int, float, None]]:
+        """
+        Get all the coordinates of a dimension, ``None`` or NaN where a Value has none.
+
+        :param index: The index of the dimension
+        :return: An iterable with one coordinate per Value
+        """
+        if self._storage is not None:
+            return self._storage.column(index)
+
+        return [value.coordinates[index] if index < value.dimension else None for value in self._data]
+
+    def _update_statistics(self, added: Iterable[List[Union[int, float, None]]] = (),
+                           removed: Iterable[List[Union[int, float, None]]] = ()) -> None:
+        """
+        Keep the :attr:`statistics<EasyKnn.dataset.Dataset.statistics>` up to date, if they were computed. It must be
+        called while :meth:`writing<EasyKnn.dataset.Dataset._writing>`.
+
+        :param added: The coordinates of the added Values
+        :param removed: The coordinates of the removed Values
+        :return: ``None``
+        """
+        if self._statistics is None:
+            return
+
+        for coordinates in removed:
+            self._statistics.remove(coordinates)
+
+        for coordinates in added:
+            self._statistics.add(coordinates)
+
     @property
     def linked_plan(self):
         """
@@ -103,10 +278,7 @@ class Dataset:
         :param value: The :class:`Value<EasyKnn.value.Value>` to add to the Dataset
         :return: ``None``
         """
-        self._data.append(value)
-        self._dataset_dimension = self.get_largest_dimension()
-
-        self._update_value_dataset()
+        self.add_values([value])
 
     def add_values(self, values: List[Value]):
         """
@@ -115,32 +287,330 @@ class Dataset:
         :param values: A list containing the :class:`Values<EasyKnn.value.Value>` to add to the Dataset
         :return: ``None``
         """
-        self._data.extend(values)
-        self._dataset_dimension = self.get_largest_dimension()
+        with self._writing():
+            if self._storage is not None:
+                self._store_values(values)
+                return
+
+            # Only the new values are checked, so adding n values one by one stays linear
+            self._update_value_dataset(values)
+
+            self._data.extend(values)
+            self._dataset_dimension = max([self._dataset_dimension] + [value.dimension for value in values])
+            self._update_statistics([value.coordinates for value in values])
 
-        self._update_value_dataset()
+            self._changed()
 
-    def _update_value_dataset(self) -> None:
+    def _value(self, row: int) -> Value:
         """
-        Update the :atr:`Dataset<EasyKnn.value.Value.dataset>` attribute of all the
-        :class:`Values<EasyKnn.value.Value>` in the Dataset
+        Get the :class:`Value<EasyKnn.value.Value>` of a row of a columnar Dataset, created the first time it is read.
 
+        :param row: The index of the Value in the Dataset
+        :return: The Value reading its coordinates from the storage
+        """
+        value = self._proxies.get(row)
+
+        if value is None:
+            value = self._proxies.setdefault(row, Value._from_storage(self, row))
+
+        return value
+
+    def _store_values(self, values: List[Union[Value, List[Union[int, float, None]]]]) -> None:
+        """
+        Copy the coordinates of the :class:`Values<EasyKnn.value.Value>` in the storage of a columnar Dataset, and
+        make each Value read its coordinates from the storage. Lists of coordinates are stored directly, without
+        creating a Value.
+
+        :param values: The :class:`Values<EasyKnn.value.Value>`, or lists of coordinates, to store
         :return: ``None``
         """
-        for value in self._data:
-            if value.dataset is None:
-                value._set_dataset(self)
+        self._update_value_dataset([value for value in values if isinstance(value, Value)], link=False)
+
+        rows = []
+        for value in values:
+            if isinstance(value, Value):
+                rows.append((value.coordinates, value.display_name))
+                continue
+
+            coordinates = list(value)
+            if coordinates == [None] * len(coordinates):
+                raise NoDimensionError("Coordinates cannot be empty or only None values")
+
+            rows.append((coordinates, None))
+
+        indexes = self._storage.extend(rows)
+
+        for value, row in zip(values, indexes):
+            if isinstance(value, Value):
+                if value.dataset is None:
+                    value._set_dataset(self)
 
-            elif value.dataset is not self:
+                value._move_to_storage(row)
+                self._proxies[row] = value
+
+        self._dataset_dimension = max([self._dataset_dimension] + [len(coordinates) for coordinates, _ in rows])
+
+        if self._storage.dtype != "float64":
+            # The statistics are those of the stored coordinates, that a compact storage type rounds
+            self._update_statistics(self._storage.row(row) for row in indexes)
+
+        else:
+            self._update_statistics([coordinates for coordinates, _ in rows])
+        self._changed()
+
+    def _update_value_dataset(self, values: List[Value] = None, link: bool = True) -> None:
+        """
+        Update the :atr:`Dataset<EasyKnn.value.Value.dataset>` attribute of the
+        :class:`Values<EasyKnn.value.Value>` in the Dataset. No Value is linked if one of them is already in another
+        Dataset.
+
+        :param values: The Values to update. If ``None``, all the Values of the Dataset are updated.
+        :param link: If ``False``, the Values are only checked
+        :return: ``None``
+        """
+        if values is None:
+            values = self._data
+
+        for value in values:
+            if value.dataset is not None and value.dataset is not self:
                 raise ValueAlreadyLinkedError("A single value cannot be in two different datasets")
 
+        if link:
+            for value in values:
+                if value.dataset is None:
+                    value._set_dataset(self)
+
+    def extend_stream(self, rows: Iterable[Union[Value, List[Union[int, float, None]]]],
+                      chunk_size: int = 65536) -> int:
+        """
+        Add the :class:`Values<EasyKnn.value.Value>` of any iterable, such as a generator, chunk by chunk. The
+        iterable can also give lists of coordinates: a columnar Dataset then writes them in its storage without
+        creating any Value. The dimension of the Dataset and the links of the Values are updated with each chunk
+        only, so adding ``n`` values takes a time proportional to ``n``. The linked :class:`Plan<EasyKnn.plan.Plan>`
+        can answer queries between two chunks.
+
+        :param rows: An iterable of :class:`Values<EasyKnn.value.Value>` or of lists of coordinates
+        :param chunk_size: The number of values added at once
+        :return: The number of added values
+
+        >>> dataset = Dataset(columnar=True)
+        >>> dataset.extend_stream(([i, i * 2] for i in range(5)), chunk_size=2)
+        5
+        >>> dataset.data[4], dataset.dataset_dimension
+        ([4.0, 8.0], 2)
+        """
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be at least 1")
+
+        iterator = iter(rows)
+        count = 0
+
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+
+            if not chunk:
+                return count
+
+            if self._storage is None:
+                chunk = [row if isinstance(row, Value) else Value(list(row)) for row in chunk]
+
+            self.add_values(chunk)
+            count += len(chunk)
+
+    def _store_matrix(self, block, width: int) -> None:
+        """
+        Add the rows of a row-major block of floats, read from a file, to a columnar Dataset.
+
+        :param block: An ``array('d')`` of rows of ``width`` floats. A NaN is a missing coordinate.
+        :param width: The number of coordinates of each row
+        :return: ``None``
+        """
+        with self._writing():
+            rows = self._storage.extend_matrix(block, width)
+
+            if self._statistics is not None and self._storage.dtype != "float64":
+                # The statistics are those of the stored coordinates
+                self._statistics.add_block(self._storage.values(rows.start), self._storage.width)
+
+            elif self._statistics is not None:
+                self._statistics.add_block(block, width)
+
+            self._dataset_dimension = max(self._dataset_dimension, width)
+            self._changed()
+
+    @classmethod
+    def from_iter(cls, rows: Iterable[Union[Value, List[Union[int, float, None]]]], display_name: str = None,
+                  columnar: bool = True, chunk_size: int = 65536, dtype: str = "float64") -> "Dataset":
+        """
+        Create a Dataset from the :class:`Values<EasyKnn.value.Value>`, or the lists of coordinates, of any iterable.
+        See :meth:`extend_stream<EasyKnn.dataset.Dataset.extend_stream>`.
+
+        :param rows: An iterable of :class:`Values<EasyKnn.value.Value>` or of lists of coordinates
+        :param display_name: The displayed name of the Dataset
+        :param columnar: If the Dataset is :attr:`columnar<EasyKnn.dataset.Dataset.columnar>`
+        :param chunk_size: The number of values added at once
+        :param dtype: The storage type of the coordinates. See :attr:`dtype<EasyKnn.dataset.Dataset.dtype>`.
+        :return: The new Dataset
+
+        >>> Dataset.from_iter([[1, 2], [3, None]], columnar=False).data
+        [[1, 2], [3, None]]
+        """
+        dataset = cls(display_name, columnar=columnar, dtype=dtype)
+        dataset.extend_stream(rows, chunk_size)
+
+        return dataset
+
+    @classmethod
+    def from_csv(cls, path: str, display_name: str = None, columnar: bool = True, delimiter: str = ",",
+                 skip_header: bool = False, name_column: int = None, chunk_size: int = 65536,
+                 dtype: str = "float64") -> "Dataset":
+        """
+        Create a Dataset from a CSV file, read chunk by chunk. Each row is a :class:`Value<EasyKnn.value.Value>`, an
+        empty cell is a missing coordinate, and any other cell is read as a float.
+
+        :param path: The path of the file
+        :param display_name: The displayed name of the Dataset
+        :param columnar: If the Dataset is :attr:`columnar<EasyKnn.dataset.Dataset.columnar>`
+        :param delimiter: The character separating the cells of a row
+        :param skip_header: If ``True``, the first row of the file is skipped
+        :param name_column: The index of the column holding the displayed name of each Value, if any
+        :param chunk_size: The number of values added at once
+        :param dtype: The storage type of the coordinates. See :attr:`dtype<EasyKnn.dataset.Dataset.dtype>`.
+        :return: The new Dataset
+        """
+        return cls.from_iter(ingest.csv_rows(path, delimiter, skip_header, name_column), display_name, columnar,
+                             chunk_size, dtype)
+
+    @classmethod
+    def from_npy(cls, path: str, display_name: str = None, columnar: bool = True,
+                 chunk_size: int = 65536, dtype: str = "float64") -> "Dataset":
+        """
+        Create a Dataset from a 1 or 2 dimensional NPY file, read chunk by chunk (see
+        :func:`ingest.npy_blocks<EasyKnn.ingest.npy_blocks>`). Each row is a :class:`Value<EasyKnn.value.Value>`, and
+        a NaN is a missing coordinate. A columnar Dataset copies the rows in its storage as they are: a row of NaN only
+        is not rejected.
+
+        :param path: The path of the file
+        :param display_name: The displayed name of the Dataset
+        :param columnar: If the Dataset is :attr:`columnar<EasyKnn.dataset.Dataset.columnar>`
+        :param chunk_size: The number of values added at once
+        :param dtype: The storage type of the coordinates. See :attr:`dtype<EasyKnn.dataset.Dataset.dtype>`.
+        :return: The new Dataset
+        """
+        dataset = cls(display_name, columnar=columnar, dtype=dtype)
+
+        for block, width in ingest.npy_blocks(path, chunk_size):
+            if dataset.columnar:
+                dataset._store_matrix(block, width)
+
+            else:
+                dataset.add_values([Value([None if coord != coord else coord for coord in block[base:base + width]])
+                                    for base in range(0, len(block), width)])
+
+        return dataset
+
+    def _writing(self):
+        """
+        Hold the lock of the linked :class:`Plan<EasyKnn.plan.Plan>` as the writer in a ``with`` block, while the
+        Dataset changes. A Dataset that is not linked to a Plan is not locked.
+
+        :return: A context manager
+        """
+        return self._liked_plan._lock.write() if self._liked_plan is not None else no_lock()
+
+    def _reading(self):
+        """
+        Hold the lock of the linked :class:`Plan<EasyKnn.plan.Plan>` as a reader in a ``with`` block. A Dataset that
+        is not linked to a Plan is not locked.
+
+        :return: A context manager
+        """
+        return self._liked_plan._lock.read() if self._liked_plan is not None else no_lock()
+
+    def _changed(self, dimension: int = 0, edited: bool = False) -> None:
+        """
+        Called whenever the coordinates of the Dataset change, to drop anything computed from them. It must be called
+        while :meth:`writing<EasyKnn.dataset.Dataset._writing>`.
+
+        :param dimension: The dimension of a changed Value, that the Dataset dimension must be at least
+        :param edited: ``True`` if a Value already in the Dataset changed, ``False`` if Values were only added
+        :return: ``None``
+        """
+        if edited:
+            self._edits += 1
+
+        self._version += 1
+        self._dataset_dimension = max(self._dataset_dimension, dimension)
+        self._columns_cache = None
+
+        if self._liked_plan is not None:
+            self._liked_plan._dataset_changed(self)
+
+    def _columns(self) -> ColumnarStorage:
+        """
+        Get the coordinates of the Dataset as a :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>`. For a
+        non-columnar Dataset, the matrix is built once, and kept until the Dataset changes.
+
+        :return: The :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>` of the Dataset
+        """
+        if self._storage is not None:
+            return self._storage
+
+        if self._columns_cache is None:
+            columns = ColumnarStorage()
+            columns.extend([(value.coordinates, value.display_name) for value in self._data])
+            self._columns_cache = columns
+
+        return self._columns_cache
+
+    def _to_point(self, row: int, distance: float, dimension: int = 0) -> Point:
+        """
+        Convert the :class:`Value<EasyKnn.value.Value>` at the given row of the Dataset to a
+        :class:`Point<EasyKnn.point.Point>`, without going through :attr:`data<EasyKnn.dataset.Dataset.data>`.
+
+        :param row: The index of the Value in the Dataset
+        :param distance: The distance between the Value and the searched Value
+        :param dimension: The dimension the coordinates of the Point are padded to with ``None``
+        :return: a Point object
+        """
+        return Point._view(self, row, distance, dimension)
+
+    def _row_coordinates(self, row: int) -> List[Union[int, float, None]]:
+        """
+        Get the coordinates of the :class:`Value<EasyKnn.value.Value>` at the given row of the Dataset, without
+        creating it.
+
+        :param row: The index of the Value in the Dataset
+        :return: The coordinates of the Value
+        """
+        if self._storage is not None:
+            return self._storage.row(row)
+
+        return self._data[row].coordinates
+
+    def _display_name(self, row: int) -> Union[str, None]:
+        """
+        Get the displayed name of the :class:`Value<EasyKnn.value.Value>` at the given row of the Dataset, without
+        creating it.
+
+        :param row: The index of the Value in the Dataset
+        :return: The displayed name of the Value
+        """
+        if self._storage is not None:
+            return self._storage.display_name(row)
+
+        return self._data[row].display_name
+
     def get_largest_dimension(self) -> int:
         """
         Get the largest dimension of the Dataset. The largest dimension of all the :class:`Values<EasyKnn.value.Value>`
 
         :return: The largest dimension of the Dataset
         """
-        return max([value.dimension for value in self._data])
+        if self._storage is not None:
+            return self._storage.max_length()
+
+        return max([value.dimension for value in self._data], default=0)
 
     def nonify(self, min_dimension: int = None) -> None:
         """
@@ -161,14 +631,27 @@ class Dataset:
         if min_dimension is None:
             min_dimension = self._dataset_dimension
 
-        for i in range(len(self._data)):
-            coords = self._data[i]
-            nonified_coords = coords.coordinates + [None] * (min_dimension - coords.dimension)
-            self._data[i].coordinates = nonified_coords
+        with self._writing():
+            if self._storage is not None:
+                # Rows are padded virtually, the matrix itself is left untouched, but they are still presented
+                # differently
+                if self._storage.pad(min_dimension):
+                    self._changed(min_dimension, edited=True)
+
+            else:
+                for i in range(len(self._data)):
+                    coords = self._data[i]
+
+                    # Values already long enough are left untouched
+                    if coords.dimension < min_dimension:
+                        nonified_coords = coords.coordinates + [None] * (min_dimension - coords.dimension)
+                        self._data[i].coordinates = nonified_coords
 
     def average(self) -> List[float]:
         """
-        Get the average position of all the values in the Dataset. Nones values will not be counted.
+        Get the average position of all the values in the Dataset. Nones values will not be counted. It is read from
+        the :attr:`statistics<EasyKnn.dataset.Dataset.statistics>` of the Dataset, in a time proportional to its
+        dimension only.
 
         :return: A list containing the average position of all the values in the Dataset
 
@@ -189,21 +672,98 @@ class Dataset:
         >>> dataset.average()
         [1.0, -1.0, 2.0]
         """
+        avg_coords = self.statistics.average()
 
-        avg_coords = []
-        for i in range(self._dataset_dimension):
-            coords = [value.coordinates[i] for value in self._data if value.coordinates[i] is not None]
+        # A dimension without any coordinate has no average
+        return avg_coords + [None] * (self._dataset_dimension - len(avg_coords))
 
-            if not coords:  # If coords is empty, append None, and prevent ZeroDivisionError
-                avg_coords.append(None)
+    def variance(self) -> List[float]:
+        """
+        Get the population variance of each dimension of the Dataset, over its defined coordinates. Read from the
+        :attr:`statistics<EasyKnn.dataset.Dataset.statistics>` of the Dataset.
 
-            else:
-                avg_coords.append(sum(coords) / len(coords))
+        :return: A list with the variance of each dimension, ``0`` for a dimension without any coordinate
+
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([2, 2]), Value([4, None]), Value([6, 8])])
+        >>> dataset.variance()
+        [2.6666666666666665, 9.0]
+        """
+        variances = self.statistics.variance()
 
-        return avg_coords
+        return variances + [0] * (self._dataset_dimension - len(variances))
+
+    def bounding_box(self) -> Tuple[List[Union[int, float, None]], List[Union[int, float, None]]]:
+        """
+        Get the smallest box holding all the values of the Dataset. Read from the
+        :attr:`statistics<EasyKnn.dataset.Dataset.statistics>` of the Dataset.
+
+        :return: A ``(minimums, maximums)`` tuple with the smallest and largest coordinate of each dimension, ``None``
+                for a dimension without any coordinate
+
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([2, 2]), Value([4, None]), Value([6, -8])])
+        >>> dataset.bounding_box()
+        ([2, -8], [6, 2])
+        """
+        minimums, maximums = self.statistics.bounding_box()
+        padding = [None] * (self._dataset_dimension - len(minimums))
+
+        return minimums + padding, maximums + padding
+
+    def centroid(self) -> Value:
+        """
+        Get the :meth:`average<EasyKnn.dataset.Dataset.average>` position of the values of the Dataset as a
+        :class:`Value<EasyKnn.value.Value>`, that can be searched in a :class:`Plan<EasyKnn.plan.Plan>`.
+
+        :exception NoDimensionError: If the Dataset is empty
+        :return: A new Value, not linked to any Dataset
+
+        >>> dataset = Dataset("numbers")
+        >>> dataset.add_values([Value([2, 2]), Value([4, 6])])
+        >>> dataset.centroid()
+        [3.0, 4.0]
+        """
+        return Value(self.average())
+
+    def __len__(self):
+        return len(self._storage) if self._storage is not None else len(self._data)
 
     def __repr__(self):
-        return f"{self.display_name if self.display_name is not None else self._data}"
+        return f"{self.display_name if self.display_name is not None else self.data}"
 
     def __str__(self):
-        return f"{self.display_name if self.display_name is not None else self._data}"
+        return f"{self.display_name if self.display_name is not None else self.data}"
+
+
+class _ColumnarValues(Sequence):
+    """
+    The :attr:`data<EasyKnn.dataset.Dataset.data>` of a columnar :class:`Dataset<EasyKnn.dataset.Dataset>`: a
+    sequence of its :class:`Values<EasyKnn.value.Value>`, each one created when it is read.
+
+    :param dataset: The columnar Dataset
+    """
+
+    def __init__(self, dataset: Dataset):
+        self._dataset = dataset
+
+    def __len__(self):
+        return len(self._dataset)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._dataset._value(row) for row in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("Dataset index out of range")
+
+        return self._dataset._value(index)
+
+    def __eq__(self, other):
+        return list(self) == list(other) if isinstance(other, (list, _ColumnarValues)) else NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
@@ -101,3 +101,24 @@ class CriticalDeletionError(Exception):
     EasyKnn.errors.CriticalDeletionError: The linked_plan attribute cannot be deleted
     """
     pass
+
+
+class StaleNeighborsError(Exception):
+    """Raised when reading all the :attr:`neighbors<EasyKnn.neighbors.Neighbors.neighbors>` of a query asked for ``k``
+    Points, or the :attr:`coordinates<EasyKnn.point.Point.coordinates>` of a Point for the first time, after one of
+    its :class:`Datasets<EasyKnn.dataset.Dataset>` changed.
+
+    >>> from EasyKnn import Value, Dataset, Plan
+    >>> dataset = Dataset()
+    >>> dataset.add_values([Value([1, 1]), Value([2, 2])])
+    >>> plan = Plan()
+    >>> plan.add_dataset(dataset)
+    >>>
+    >>> neighbors = plan.neighbors(Value([0, 0]), k=1)
+    >>> dataset.add_value(Value([3, 3]))
+    >>> neighbors.neighbors
+    Traceback (most recent call last):
+        ...
+    EasyKnn.errors.StaleNeighborsError: The datasets changed since the neighbors were searched
+    """
+    pass
@@ -0,0 +1,446 @@
+import heapq
+import math
+import random
+from array import array
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+from EasyKnn import kernels
+from EasyKnn.errors import CriticalDeletionError
+from EasyKnn.index import Index
+from EasyKnn.weight import Weight
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class HNSWIndex(Index):
+    """
+    An approximate hierarchical navigable small world graph over all the :class:`Values<EasyKnn.value.Value>` of a
+    :class:`Plan<EasyKnn.plan.Plan>`. Each value is a node of the graph, linked to its nearest nodes, and some nodes
+    are also in sparser upper layers. A query walks greedily down the layers from the top, then explores the bottom
+    layer from the nearest nodes found, keeping the ``ef_search`` nearest ones. A larger ``ef_search`` finds more of
+    the true neighbors, and takes longer.
+
+    The graph is built with the weighted euclidean distance of the given :class:`Weight<EasyKnn.weight.Weight>`,
+    while a query walks it with its own weights, so the distances of the returned values are the ones
+    :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>` computes. Missing coordinates are skipped by the distance, on
+    both sides.
+
+    When values are only added to the Datasets of the Plan, the next query inserts the new values in the graph. When
+    a value changes, or the Plan gets wider, the graph is built again.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to index
+    :param M: The number of links of a node in the upper layers. Nodes get ``2 * M`` links in the bottom layer.
+    :param ef_construction: The number of nearest nodes kept while looking for the links of a new node
+    :param ef_search: The number of nearest nodes kept by a query. See
+            :attr:`ef_search<EasyKnn.hnsw.HNSWIndex.ef_search>`.
+    :param weight: The :class:`Weight<EasyKnn.weight.Weight>` of the distance the graph is built with
+    :param seed: The seed of the random layers of the nodes
+
+    >>> from EasyKnn import Plan, Dataset, Value
+    >>> plan = Plan()
+    >>> dataset = Dataset()
+    >>> dataset.add_values([Value([x, y]) for x in range(10) for y in range(10)])
+    >>> plan.add_dataset(dataset)
+    >>> graph = HNSWIndex(plan, M=4)
+    >>> graph.query([2, 7.25], [1, 1], k=2)
+    [(0.25, 0, 27), (0.75, 0, 28)]
+    >>> graph.saved_evaluations > 0
+    True
+    """
+
+    # The weight is saved in the options, and the numpy view and the random generator are only used in memory
+    _UNSAVED = Index._UNSAVED + ("_weight", "_matrix", "_random", "_links")
+
+    def __init__(self, plan: "Plan", M: int = 16, ef_construction: int = 100, ef_search: int = 50,
+                 weight: Weight = Weight([]), seed: int = 0):
+        super().__init__(plan)
+
+        if M < 2:
+            raise ValueError("M must be at least 2")
+
+        if ef_construction < 1:
+            raise ValueError("ef_construction must be at least 1")
+
+        if any([weight_value is not None and weight_value < 0 for weight_value in weight.weights]):
+            raise ValueError("A graph cannot be built with negative weights")
+
+        self._m = M
+        self._ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._weight = weight
+        self._seed = seed
+
+        self._width = 0
+        self._entry = -1
+        self._links = []
+
+        self.build()
+
+    @property
+    def ef_search(self) -> int:
+        """
+        The number of nearest nodes kept by a query, at least ``k``. It can be changed between two queries to trade
+        speed for recall.
+
+        :read-only: False
+        """
+        return self._ef_search
+
+    @ef_search.setter
+    def ef_search(self, value: int):
+        if value < 1:
+            raise ValueError("ef_search must be at least 1")
+
+        self._ef_search = value
+
+    @ef_search.deleter
+    def ef_search(self):
+        raise CriticalDeletionError("The ef_search attribute cannot be deleted")
+
+    def build(self) -> None:
+        if self._entry < 0 or not self._only_added():
+            self._reset()
+
+        self._insert_added()
+        self._stale = False
+
+    def _options(self) -> dict:
+        return {"M": self._m, "ef_construction": self._ef_construction, "ef_search": self._ef_search,
+                "weight": self._weight.weights, "seed": self._seed}
+
+    def _reset(self) -> None:
+        """
+        Drop every node of the graph.
+        """
+        self._width = max([dataset._columns().width for dataset in self._plan.datasets] or [0])
+        self._weights = kernels.weight_vector(self._weight, self._width)
+
+        # The coordinates of the nodes, row-major and padded with NaN, with the dataset index, the row and the top
+        # layer of each node
+        self._coordinates = array("d")
+        self._dataset_indexes = array("q")
+        self._dataset_rows = array("q")
+        self._levels = array("q")
+        self._matrix = None
+
+        # The links of each node, one list per layer
+        self._links = []
+        self._entry = -1
+        self._size = 0
+        self._indexed = []
+
+        self._random = random.Random(self._seed)
+
+    def _insert_added(self) -> None:
+        """
+        Insert the values added since the graph was built.
+        """
+        self._own("_coordinates", "_dataset_indexes", "_dataset_rows", "_levels")
+
+        # A numpy view prevents the coordinates from growing
+        self._matrix = None
+
+        first = len(self._dataset_rows)
+        for dataset_index, storage, start in self._added():
+            padding = array("d", [math.nan]) * (self._width - storage.width)
+
+            buffer = storage.values(start)
+
+            for row in range(start, len(storage)):
+                base = (row - start) * storage.width
+                self._coordinates.extend(buffer[base:base + storage.width])
+                self._coordinates.extend(padding)
+                self._dataset_indexes.append(dataset_index)
+                self._dataset_rows.append(row)
+
+        self._view()
+
+        if not hasattr(self, "_random"):
+            # An index loaded from a file goes on with a generator of its own
+            self._random = random.Random(self._seed + len(self._dataset_rows))
+
+        for node in range(first, len(self._dataset_rows)):
+            self._insert(node)
+
+        self._size = len(self._dataset_rows)
+        self._mark_indexed()
+
+    def _view(self) -> None:
+        """
+        Create the numpy view of the coordinates, used to compute the sums of many nodes at once.
+        """
+        if numpy is not None and len(self._coordinates):
+            self._matrix = numpy.frombuffer(self._coordinates, dtype=numpy.float64).reshape(-1, self._width)
+
+    def _sums(self, prepared: tuple, nodes: List[int]) -> List[float]:
+        """
+        Get the weighted sums of squares between a point and some nodes, over the coordinates defined on both sides.
+
+        :param prepared: The point, as given by :meth:`_prepare<EasyKnn.hnsw.HNSWIndex._prepare>`
+        :param nodes: The nodes to compare
+        :return: A ``list`` with the sum of each node
+        """
+        dimensions, coordinates, weights, query_vector = prepared
+
+        if self._matrix is not None:
+            squares = self._matrix[nodes] - query_vector[0]
+            squares *= squares
+            squares *= query_vector[1]
+            squares[squares != squares] = 0  # NaN != NaN
+
+            return squares.sum(axis=1).tolist()
+
+        sums = []
+        buffer = self._coordinates
+        width = self._width
+
+        for node in nodes:
+            base = node * width
+
+            # A missing coordinate of the point has a weight of 0, so only a missing coordinate of the node gives NaN
+            coord_sum = sum([(coord - point_coord) ** 2 * weight
+                             for coord, point_coord, weight in zip(coordinates, buffer[base:base + width], weights)])
+
+            if coord_sum != coord_sum:  # NaN != NaN
+                coord_sum = 0
+                for i, coord, weight in dimensions:
+                    point_coord = buffer[base + i]
+
+                    if point_coord == point_coord:
+                        coord_sum += (coord - point_coord) ** 2 * weight
+
+            sums.append(coord_sum)
+
+        return sums
+
+    def _prepare(self, point, weights: List[float]) -> tuple:
+        """
+        Get the point argument of :meth:`_sums<EasyKnn.hnsw.HNSWIndex._sums>`.
+
+        :param point: The coordinates of the point, ``None`` or NaN for a missing one
+        :param weights: The weight of each dimension
+        :return: A ``(dimensions, coordinates, weights, query vector)`` tuple
+        """
+        dimensions = [(i, point[i], weights[i]) for i in range(min(self._width, len(point)))
+                      if point[i] is not None and point[i] == point[i]]
+
+        coordinates = [0.0] * self._width
+        scale = [0.0] * self._width
+        for i, coord, weight in dimensions:
+            coordinates[i] = coord
+            scale[i] = weight
+
+        query_vector = None
+        if self._matrix is not None:
+            query_vector = (numpy.array([coord if weight else numpy.nan for coord, weight in zip(coordinates, scale)]),
+                            numpy.array(scale))
+
+        return dimensions, coordinates, scale, query_vector
+
+    def _search_layer(self, prepared: tuple, entries: List[Tuple[float, int]], ef: int,
+                      layer: int) -> List[Tuple[float, int]]:
+        """
+        Explore a layer of the graph from some entry nodes, and keep the ``ef`` nearest nodes found.
+
+        :param prepared: The point, as given by :meth:`_prepare<EasyKnn.hnsw.HNSWIndex._prepare>`
+        :param entries: The ``(sum, node)`` of the entry nodes
+        :param ef: The number of nodes to keep
+        :param layer: The layer to explore
+        :return: The ``(sum, node)`` of the nearest nodes found, in no particular order
+        """
+        links = self._links
+
+        visited = set([node for _, node in entries])
+        candidates = list(entries)
+        heapq.heapify(candidates)
+
+        # The nearest nodes found, as a heap of negated (sum, node), so the farthest one is on top
+        found = [(-coord_sum, node) for coord_sum, node in entries]
+        heapq.heapify(found)
+        while len(found) > ef:
+            heapq.heappop(found)
+
+        while candidates:
+            coord_sum, node = heapq.heappop(candidates)
+
+            if len(found) >= ef and coord_sum > -found[0][0]:
+                break
+
+            neighbors = [neighbor for neighbor in links[node][layer] if neighbor not in visited]
+            if not neighbors:
+                continue
+
+            visited.update(neighbors)
+            self._evaluations += len(neighbors)
+
+            for neighbor_sum, neighbor in zip(self._sums(prepared, neighbors), neighbors):
+                if len(found) < ef:
+                    heapq.heappush(candidates, (neighbor_sum, neighbor))
+                    heapq.heappush(found, (-neighbor_sum, neighbor))
+
+                elif neighbor_sum < -found[0][0]:
+                    heapq.heappush(candidates, (neighbor_sum, neighbor))
+                    heapq.heapreplace(found, (-neighbor_sum, neighbor))
+
+        return [(-coord_sum, node) for coord_sum, node in found]
+
+    def _descend(self, prepared: tuple, bottom: int) -> List[Tuple[float, int]]:
+        """
+        Walk greedily from the entry node down to a layer.
+
+        :param prepared: The point, as given by :meth:`_prepare<EasyKnn.hnsw.HNSWIndex._prepare>`
+        :param bottom: The layer to stop at
+        :return: The ``(sum, node)`` of the nearest node found
+        """
+        entries = [(self._sums(prepared, [self._entry])[0], self._entry)]
+
+        for layer in range(self._levels[self._entry], bottom, -1):
+            entries = [min(self._search_layer(prepared, entries, 1, layer))]
+
+        return entries
+
+    def _select(self, candidates: List[Tuple[float, int]], count: int) -> List[int]:
+        """
+        Choose the links of a node among candidates, with the heuristic of the HNSW paper: a candidate is skipped if
+        it is nearer to an already chosen link than to the node, so the links point to different directions. The
+        nearest skipped candidates then fill the free links.
+
+        :param candidates: The ``(sum, node)`` of the candidates
+        :param count: The number of links to choose
+        :return: The chosen nodes
+        """
+        candidates = sorted(candidates)
+
+        if len(candidates) <= count:
+            return [candidate for _, candidate in candidates]
+
+        if self._matrix is not None:
+            # The sums between all the candidates at once, as matrix products
+            block = self._matrix[[candidate for _, candidate in candidates]]
+            pairs = kernels._expanded_sums(block, block, numpy.array(self._weights)).tolist()
+
+        chosen = []
+        skipped = []
+        for position, (coord_sum, candidate) in enumerate(candidates):
+            if len(chosen) == count:
+                break
+
+            if self._matrix is not None:
+                nearest = min([pairs[position][other] for other, _ in chosen], default=coord_sum)
+
+            else:
+                nearest = min(self._sums(self._prepare(self._point(candidate), self._weights),
+                                         [other for _, other in chosen]), default=coord_sum)
+
+            if nearest < coord_sum:
+                skipped.append(candidate)
+
+            else:
+                chosen.append((position, candidate))
+
+        return [candidate for _, candidate in chosen] + skipped[:count - len(chosen)]
+
+    def _point(self, node: int):
+        """
+        Get the coordinates of a node.
+
+        :param node: The node
+        :return: A slice of the coordinates of the graph
+        """
+        return self._coordinates[node * self._width:(node + 1) * self._width]
+
+    def _insert(self, node: int) -> None:
+        """
+        Link a new node to the graph.
+
+        :param node: The node, whose coordinates are already stored
+        :return: ``None``
+        """
+        level = int(-math.log(1.0 - self._random.random()) / math.log(self._m))
+
+        self._levels.append(level)
+        self._links.append([[] for _ in range(level + 1)])
+
+        if self._entry < 0:
+            self._entry = node
+            return
+
+        prepared = self._prepare(self._point(node), self._weights)
+        top = self._levels[self._entry]
+        entries = self._descend(prepared, level) if top > level else \
+            [(self._sums(prepared, [self._entry])[0], self._entry)]
+
+        for layer in range(min(level, top), -1, -1):
+            entries = self._search_layer(prepared, entries, self._ef_construction, layer)
+            maximum = 2 * self._m if layer == 0 else self._m
+
+            self._links[node][layer] = self._select(entries, self._m)
+
+            for neighbor in self._links[node][layer]:
+                neighbor_links = self._links[neighbor][layer]
+                neighbor_links.append(node)
+
+                if len(neighbor_links) > maximum:
+                    # A full node only keeps its nearest links: the heuristic would cost more than the whole insertion
+                    sums = self._sums(self._prepare(self._point(neighbor), self._weights), neighbor_links)
+                    self._links[neighbor][layer] = [link for _, link in sorted(zip(sums, neighbor_links))[:maximum]]
+
+        if level > top:
+            self._entry = node
+
+    def query(self, query: List[Union[int, float, None]], weights: List[float], k: int,
+              use_abs: bool = True) -> List[Tuple[float, int, int]]:
+        self._evaluations = 0
+
+        if self._entry < 0 or k <= 0:
+            return []
+
+        prepared = self._prepare(query, weights)
+        self._evaluations = 1
+
+        entries = self._descend(prepared, 0)
+        found = heapq.nsmallest(k, [(coord_sum, self._dataset_indexes[node], self._dataset_rows[node])
+                                    for coord_sum, node in self._search_layer(prepared, entries,
+                                                                              max(self._ef_search, k), 0)])
+
+        return [(kernels.finish(coord_sum, use_abs), dataset_index, row) for coord_sum, dataset_index, row in found]
+
+    def _state(self) -> dict:
+        state = super()._state()
+
+        # The links of the nodes are saved one after the other, with the offset of the links of each layer of each
+        # node
+        state["_link_offsets"] = array("q", [0])
+        state["_link_targets"] = array("q")
+        for layers in self._links:
+            for links in layers:
+                state["_link_targets"].extend(links)
+                state["_link_offsets"].append(len(state["_link_targets"]))
+
+        return state
+
+    @classmethod
+    def _restore(cls, plan, options, state):
+        state = dict(state)
+        offsets = state.pop("_link_offsets")
+        targets = state.pop("_link_targets")
+
+        index = super()._restore(plan, options, state)
+        index._weight = Weight(options["weight"])
+        index._matrix = None
+        index._view()
+
+        index._links = []
+        position = 0
+        for level in index._levels:
+            index._links.append([list(targets[offsets[position + layer]:offsets[position + layer + 1]])
+                                 for layer in range(level + 1)])
+            position += level + 1
+
+        return index
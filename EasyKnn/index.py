@@ -0,0 +1,258 @@
+from array import array
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+from EasyKnn.metrics import Metric
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+    from EasyKnn.storage import ColumnarStorage
+
+
+class Index:
+    """
+    Base class of the indexes built by :meth:`Plan.build_index<EasyKnn.plan.Plan.build_index>`. An index answers the
+    ``k`` nearest neighbors of a query without comparing it to every :class:`Value<EasyKnn.value.Value>` of the
+    :class:`Plan<EasyKnn.plan.Plan>`. This object should not be directly created, but only by the Plan.
+
+    When a :class:`Dataset<EasyKnn.dataset.Dataset>` of the Plan changes, the index is marked as stale, and built
+    again by the Plan before its next query.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to index
+    """
+
+    # The attributes that are not part of the built index, and are not saved by Plan.save
+    _UNSAVED = ("_plan", "_stale", "_evaluations", "_pruned")
+
+    def __init__(self, plan: "Plan"):
+        self._plan = plan
+        self._stale = True
+
+        # The number of values in the index, and the number of distances computed and of nodes skipped by the last
+        # query
+        self._size = 0
+        self._evaluations = 0
+        self._pruned = 0
+
+    @property
+    def stale(self) -> bool:
+        """
+        ``True`` if a :class:`Dataset<EasyKnn.dataset.Dataset>` of the Plan changed since the index was built.
+
+        :read-only: True
+        """
+        return self._stale
+
+    @property
+    def evaluations(self) -> int:
+        """
+        The number of distances computed by the last query.
+
+        :read-only: True
+        """
+        return self._evaluations
+
+    @property
+    def saved_evaluations(self) -> int:
+        """
+        The number of distances the last query did not compute, compared with a scan of all the values.
+
+        :read-only: True
+        """
+        return self._size - self._evaluations
+
+    @property
+    def pruned(self) -> int:
+        """
+        The number of nodes (the subtrees of a tree, or the cells of an IVF index) the last query skipped without
+        comparing their values. Always ``0`` for the indexes that do not prune nodes.
+
+        :read-only: True
+        """
+        return self._pruned
+
+    def build(self) -> None:
+        """
+        Build the index from the current :class:`Datasets<EasyKnn.dataset.Dataset>` of the Plan.
+
+        :return: ``None``
+        """
+        raise NotImplementedError
+
+    def supports(self, query: List[Union[int, float, None]], weights: List[float], k: int, metric: Metric) -> bool:
+        """
+        Check if the index can answer a query. When it cannot, the Plan scans all the values instead.
+
+        :param query: The coordinates of the searched :class:`Value<EasyKnn.value.Value>`
+        :param weights: The weight of each dimension of the query
+        :param k: The number of neighbors asked. Negative if the farthest neighbors are asked.
+        :param metric: The :class:`Metric<EasyKnn.metrics.Metric>` of the query
+        :return: ``True`` if the index can answer the query
+        """
+        return k > 0 and metric.name == "euclidean" and all([weight >= 0 for weight in weights])
+
+    def query(self, query: List[Union[int, float, None]], weights: List[float], k: int,
+              use_abs: bool = True) -> List[Tuple[float, int, int]]:
+        """
+        Get the ``k`` nearest values of a query.
+
+        :param query: The coordinates of the searched :class:`Value<EasyKnn.value.Value>`
+        :param weights: The weight of each dimension of the query
+        :param k: The number of neighbors to get
+        :param use_abs: If True, the absolute value of the distances will be used
+        :return: A ``list`` of ``(distance, dataset index, row)`` tuples, from the nearest to the farthest
+        """
+        raise NotImplementedError
+
+    def _options(self) -> dict:
+        """
+        Get the options creating the same index, saved by :meth:`Plan.save<EasyKnn.plan.Plan.save>`. They must be
+        JSON-serializable.
+
+        :return: A ``dict`` of keyword arguments
+        """
+        raise NotImplementedError
+
+    def _state(self) -> dict:
+        """
+        Get the attributes holding the built index, saved by :meth:`Plan.save<EasyKnn.plan.Plan.save>`. Each one is
+        either an ``array`` (of 8 bytes items, or of ``"b"``, ``"B"``, ``"H"`` or ``"f"`` items), or
+        JSON-serializable.
+
+        :return: A ``dict`` of attributes
+        """
+        return {name: value for name, value in vars(self).items() if name not in self._UNSAVED}
+
+    @classmethod
+    def _restore(cls, plan: "Plan", options: dict, state: dict) -> "Index":
+        """
+        Create an index from the attributes saved by :meth:`Plan.save<EasyKnn.plan.Plan.save>`, without building it.
+        The tuples of the saved attributes are restored as lists.
+
+        :param plan: The :class:`Plan<EasyKnn.plan.Plan>` the index was built for
+        :param options: The options given by :meth:`_options<EasyKnn.index.Index._options>`
+        :param state: The attributes given by :meth:`_state<EasyKnn.index.Index._state>`
+        :return: The index
+        """
+        index = cls.__new__(cls)
+        Index.__init__(index, plan)
+
+        vars(index).update(state)
+        index._stale = False
+
+        if "_indexed" in state:
+            # The Datasets of the loaded Plan are new objects
+            index._indexed = [[dataset._uid, indexed, dataset._edits]
+                              for dataset, (_, indexed, _) in zip(plan.datasets, state["_indexed"])]
+
+        return index
+
+    def _mark_indexed(self) -> None:
+        """
+        Remember how many values of each :class:`Dataset<EasyKnn.dataset.Dataset>` are in the index, for the indexes
+        that can add new values without being built again.
+
+        :return: ``None``
+        """
+        self._indexed = [[dataset._uid, len(dataset), dataset._edits] for dataset in self._plan.datasets]
+
+    def _only_added(self) -> bool:
+        """
+        Check if values were only added to the Plan since :meth:`_mark_indexed<EasyKnn.index.Index._mark_indexed>`
+        was called, so that they can be added to the index without building it again.
+
+        :return: ``True`` if no value changed, and the Plan did not get wider than the index
+        """
+        datasets = self._plan.datasets
+
+        if len(datasets) < len(self._indexed):
+            return False
+
+        for dataset, (uid, indexed, edits) in zip(datasets, self._indexed):
+            if dataset._uid != uid or dataset._edits != edits or len(dataset) < indexed:
+                return False
+
+        return max([dataset._columns().width for dataset in datasets] or [0]) <= self._width
+
+    def _added(self) -> List[Tuple[int, "ColumnarStorage", int]]:
+        """
+        Get the values added to the Plan since :meth:`_mark_indexed<EasyKnn.index.Index._mark_indexed>` was called.
+
+        :return: A ``(dataset index, storage, first row)`` tuple for each Dataset, where the rows from ``first row``
+                are not in the index yet
+        """
+        indexed = [entry[1] for entry in self._indexed]
+
+        return [(dataset_index, dataset._columns(), indexed[dataset_index] if dataset_index < len(indexed) else 0)
+                for dataset_index, dataset in enumerate(self._plan.datasets)]
+
+    def _own(self, *names: str) -> None:
+        """
+        Copy the arrays of an index loaded from a memory-mapped file, before values are added to them.
+
+        :param names: The names of the attributes holding the arrays
+        :return: ``None``
+        """
+        for name in names:
+            buffer = getattr(self, name)
+
+            if isinstance(buffer, memoryview):
+                owned = array(buffer.format)
+                owned.frombytes(buffer.cast("B"))
+                setattr(self, name, owned)
+
+    def _sample_points(self, storages: list, sample) -> List[Tuple[float]]:
+        """
+        Copy the sampled values, padded with NaN to the width of the index.
+
+        :param storages: The storages of the Datasets
+        :param sample: The sorted positions of the sampled values, over all the storages
+        :return: A ``list`` with a tuple of floats per sampled value
+        """
+        points = []
+        offset = 0
+        position = 0
+        sample = list(sample)
+
+        for storage in storages:
+            padding = (float("nan"),) * (self._width - storage.width)
+            buffer = storage.values()
+
+            while position < len(sample) and sample[position] < offset + len(storage):
+                start = (sample[position] - offset) * storage.width
+                points.append(tuple(buffer[start:start + storage.width]) + padding)
+                position += 1
+
+            offset += len(storage)
+
+        return points
+
+    def _rows(self) -> Tuple[int, List[Tuple[float]], List[Tuple[int, int]]]:
+        """
+        Copy every value of the Plan, padded with NaN to the same width.
+
+        :return: A ``(width, points, ids)`` tuple. ``points`` holds a tuple of floats per value, and ``ids`` the
+                ``(dataset index, row)`` of each value.
+        """
+        storages = [dataset._columns() for dataset in self._plan.datasets]
+        width = max([storage.width for storage in storages] or [0])
+
+        points = []
+        ids = []
+        for dataset_index, storage in enumerate(storages):
+            padding = (float("nan"),) * (width - storage.width)
+            buffer = storage.values()
+
+            for row in range(len(storage)):
+                start = row * storage.width
+                points.append(tuple(buffer[start:start + storage.width]) + padding)
+                ids.append((dataset_index, row))
+
+        return width, points, ids
+
+    def _changed(self) -> None:
+        """
+        Called by the Plan when one of its :class:`Datasets<EasyKnn.dataset.Dataset>` changes.
+
+        :return: ``None``
+        """
+        self._stale = True
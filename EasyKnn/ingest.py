@@ -0,0 +1,110 @@
+import ast
+import csv
+import struct
+import sys
+from array import array
+from typing import Iterator, List, Union, Tuple
+
+from EasyKnn.value import Value
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The array type code of each NPY type that can be read without numpy
+_NPY_TYPES = {
+    "<f8": "d",
+    "<f4": "f",
+    "<i8": "q",
+    "<i4": "i",
+    "<i2": "h",
+    "|i1": "b",
+    "|u1": "B",
+}
+
+
+def csv_rows(path: str, delimiter: str = ",", skip_header: bool = False,
+             name_column: int = None) -> Iterator[Union[List[Union[float, None]], Value]]:
+    """
+    Read the rows of a CSV file, one at a time. An empty cell is a missing coordinate (``None``), and any other cell
+    is read as a float.
+
+    :param path: The path of the file
+    :param delimiter: The character separating the cells of a row
+    :param skip_header: If ``True``, the first row of the file is skipped
+    :param name_column: The index of the column holding the displayed name of each row. If ``None``, every column is
+            a coordinate.
+    :return: An iterator of coordinates, or of :class:`Values<EasyKnn.value.Value>` if ``name_column`` is given
+    """
+    with open(path, newline="") as file:
+        reader = csv.reader(file, delimiter=delimiter)
+
+        if skip_header:
+            next(reader, None)
+
+        for row in reader:
+            if not row:
+                continue
+
+            if name_column is None:
+                yield [float(cell) if cell.strip() else None for cell in row]
+                continue
+
+            name = row.pop(name_column)
+            yield Value([float(cell) if cell.strip() else None for cell in row], name or None)
+
+
+def npy_blocks(path: str, chunk_size: int = 65536) -> Iterator[Tuple[array, int]]:
+    """
+    Read a 1 or 2 dimensional NPY file, block by block. With numpy, the file is memory-mapped. Without it, only
+    little-endian files in C order of the most common integer and float types can be read.
+
+    :param path: The path of the file
+    :param chunk_size: The number of rows of each block
+    :return: An iterator of ``(block, width)`` tuples, where ``block`` is a row-major ``array('d')`` of up to
+            ``chunk_size`` rows of ``width`` floats
+    """
+    if numpy is not None:
+        matrix = numpy.load(path, mmap_mode="r")
+
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(-1, 1)
+
+        if matrix.ndim != 2:
+            raise ValueError(f"Only 1 or 2 dimensional arrays can be read, not {matrix.ndim}")
+
+        for start in range(0, matrix.shape[0], chunk_size):
+            block = array("d")
+            block.frombytes(numpy.ascontiguousarray(matrix[start:start + chunk_size], dtype=numpy.float64).tobytes())
+            yield block, matrix.shape[1]
+
+        return
+
+    with open(path, "rb") as file:
+        if file.read(6) != b"\x93NUMPY":
+            raise ValueError(f"{path} is not a NPY file")
+
+        major, _ = file.read(2)
+        header_length = struct.unpack("<H" if major == 1 else "<I", file.read(2 if major == 1 else 4))[0]
+        header = ast.literal_eval(file.read(header_length).decode("latin1"))
+
+        if header["fortran_order"] or header["descr"] not in _NPY_TYPES:
+            raise ValueError(f"{path} needs numpy to be read")
+
+        shape = header["shape"]
+        if len(shape) not in (1, 2):
+            raise ValueError(f"Only 1 or 2 dimensional arrays can be read, not {len(shape)}")
+
+        typecode = _NPY_TYPES[header["descr"]]
+        width = shape[1] if len(shape) == 2 else 1
+        itemsize = array(typecode).itemsize
+
+        for start in range(0, shape[0], chunk_size):
+            block = array(typecode)
+            block.frombytes(file.read(min(chunk_size, shape[0] - start) * width * itemsize))
+
+            if sys.byteorder == "big":
+                block.byteswap()
+
+            yield (block if typecode == "d" else array("d", block)), width
@@ -0,0 +1,414 @@
+import heapq
+import random
+from array import array
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+from EasyKnn import kernels
+from EasyKnn.errors import CriticalDeletionError
+from EasyKnn.index import Index
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The number of rows assigned to their cell at once
+_CHUNK = 65536
+
+
+class IVFIndex(Index):
+    """
+    An approximate inverted-file index over all the :class:`Values<EasyKnn.value.Value>` of a
+    :class:`Plan<EasyKnn.plan.Plan>`. The values are clustered with k-means into ``nlist`` cells, and each value is
+    stored in the list of its nearest cell. A query only compares the values of the ``nprobe`` cells whose centroid is
+    the nearest, so some neighbors can be missed: a larger ``nprobe`` finds more of them, and ``nprobe = nlist`` is an
+    exact search.
+
+    Missing coordinates are skipped by the clustering like by the distance: a value is assigned to the nearest cell
+    over its defined coordinates only.
+
+    When values are only added to the Datasets of the Plan, the next query assigns the new values to their nearest
+    cell, without training the cells again. When a value changes, or the Plan gets wider, the cells are trained again.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to index
+    :param nlist: The number of cells
+    :param nprobe: The number of cells searched by a query. See :attr:`nprobe<EasyKnn.ivf.IVFIndex.nprobe>`.
+    :param sample_size: The number of values the cells are trained on, taken at random. If ``None``, all the values
+            are used.
+    :param iterations: The largest number of k-means iterations
+    :param seed: The seed of the random choice of the sample and of the first centroids
+
+    >>> from EasyKnn import Plan, Dataset, Value
+    >>> plan = Plan()
+    >>> dataset = Dataset()
+    >>> dataset.add_values([Value([x, y]) for x in range(10) for y in range(10)])
+    >>> plan.add_dataset(dataset)
+    >>> index = IVFIndex(plan, nlist=4, nprobe=2)
+    >>> index.query([2, 7.25], [1, 1], k=2)
+    [(0.25, 0, 27), (0.75, 0, 28)]
+    >>> index.saved_evaluations > 0
+    True
+    """
+
+    def __init__(self, plan: "Plan", nlist: int = 100, nprobe: int = 8, sample_size: int = None,
+                 iterations: int = 10, seed: int = 0):
+        super().__init__(plan)
+
+        if nlist < 1:
+            raise ValueError("The number of cells must be at least 1")
+
+        if sample_size is not None and sample_size < 1:
+            raise ValueError("The sample size must be at least 1")
+
+        if iterations < 1:
+            raise ValueError("The number of iterations must be at least 1")
+
+        self._nlist = nlist
+        self.nprobe = nprobe
+        self._sample_size = sample_size
+        self._iterations = iterations
+        self._seed = seed
+
+        self._width = 0
+        self._centroids = array("d")
+
+        self.build()
+
+    @property
+    def nprobe(self) -> int:
+        """
+        The number of cells searched by a query. It can be changed between two queries to trade speed for recall.
+
+        :read-only: False
+        """
+        return self._nprobe
+
+    @nprobe.setter
+    def nprobe(self, value: int):
+        if value < 1:
+            raise ValueError("The number of searched cells must be at least 1")
+
+        self._nprobe = value
+
+    @nprobe.deleter
+    def nprobe(self):
+        raise CriticalDeletionError("The nprobe attribute cannot be deleted")
+
+    @property
+    def cells(self) -> int:
+        """
+        The number of trained cells. It is smaller than ``nlist`` when the Plan holds fewer values.
+
+        :read-only: True
+        """
+        return len(self._centroids) // self._width if self._width else 0
+
+    def build(self) -> None:
+        if self._centroids and self._only_added():
+            self._assign()
+
+        else:
+            self.train()
+
+        self._stale = False
+
+    def _options(self) -> dict:
+        return {"nlist": self._nlist, "nprobe": self._nprobe, "sample_size": self._sample_size,
+                "iterations": self._iterations, "seed": self._seed}
+
+    def train(self, sample_size: int = None) -> None:
+        """
+        Train the cells with k-means on a random sample of the values of the Plan, then assign every value to its
+        nearest cell.
+
+        :param sample_size: The number of values the cells are trained on. If ``None``, the ``sample_size`` of the
+                index is used.
+        :return: ``None``
+        """
+        if sample_size is None:
+            sample_size = self._sample_size
+
+        storages = [dataset._columns() for dataset in self._plan.datasets]
+        self._width = max([storage.width for storage in storages] or [0])
+
+        total = sum([len(storage) for storage in storages])
+        generator = random.Random(self._seed)
+
+        if sample_size is None or sample_size >= total:
+            sample = range(total)
+
+        else:
+            sample = sorted(generator.sample(range(total), sample_size))
+
+        points = self._sample_points(storages, sample)
+        self._centroids = _kmeans(points, self._width, min(self._nlist, len(points)), self._iterations, generator)
+
+        self._dataset_indexes = array("q")
+        self._dataset_rows = array("q")
+        self._cells = [array("q") for _ in range(self.cells)]
+        self._size = 0
+        self._indexed = []
+
+        self._assign()
+
+    def _assign(self) -> None:
+        """
+        Assign the values added since the index was built to their nearest cell.
+
+        :return: ``None``
+        """
+        self._own("_centroids", "_dataset_indexes", "_dataset_rows")
+
+        for dataset_index, storage, start in self._added():
+            for chunk in range(start, len(storage), _CHUNK):
+                stop = min(chunk + _CHUNK, len(storage))
+                labels = _nearest_cells(storage, chunk, stop, self._centroids, self._width)
+
+                first_position = len(self._dataset_rows)
+                self._dataset_indexes.extend(array("q", [dataset_index]) * (stop - chunk))
+                self._dataset_rows.extend(range(chunk, stop))
+
+                if numpy is None:
+                    for position, label in enumerate(labels, first_position):
+                        self._cell(label).append(position)
+                    continue
+
+                # We sort the positions by cell, so each cell gets all its new positions at once
+                order = numpy.argsort(labels, kind="stable")
+                offsets = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(labels, minlength=self.cells))])
+                positions = (order + first_position).astype(numpy.int64)
+
+                for label in numpy.flatnonzero(offsets[1:] - offsets[:-1]).tolist():
+                    self._cell(label).frombytes(positions[offsets[label]:offsets[label + 1]].tobytes())
+
+        self._size = len(self._dataset_rows)
+        self._mark_indexed()
+
+    def _cell(self, label: int) -> array:
+        """
+        Get the list of a cell, copied first if it is a view of a memory-mapped file.
+
+        :param label: The index of the cell
+        :return: The ``array('q')`` of the positions of the values of the cell
+        """
+        cell = self._cells[label]
+
+        if isinstance(cell, memoryview):
+            cell = self._cells[label] = array("q", cell)
+
+        return cell
+
+    def query(self, query: List[Union[int, float, None]], weights: List[float], k: int,
+              use_abs: bool = True) -> List[Tuple[float, int, int]]:
+        self._evaluations = 0
+        self._pruned = 0
+
+        if not self._size or k <= 0:
+            return []
+
+        dimensions = [(i, query[i], weights[i]) for i in range(min(self._width, len(query))) if query[i] is not None]
+
+        # We find the nearest cells, then gather the values of each Dataset they hold
+        probed = self._probe(dimensions)
+        self._pruned = len(self._cells) - len(probed)
+
+        if numpy is not None:
+            positions = numpy.concatenate([numpy.frombuffer(self._cells[cell], dtype=numpy.int64)
+                                           for cell in probed])
+            dataset_indexes = numpy.frombuffer(self._dataset_indexes, dtype=numpy.int64)[positions]
+            dataset_rows = numpy.frombuffer(self._dataset_rows, dtype=numpy.int64)[positions]
+
+            candidates = [(dataset_index, dataset_rows[dataset_indexes == dataset_index])
+                          for dataset_index in numpy.unique(dataset_indexes).tolist()]
+
+        else:
+            rows = {}
+            for cell in probed:
+                for position in self._cells[cell]:
+                    rows.setdefault(self._dataset_indexes[position], []).append(self._dataset_rows[position])
+
+            candidates = sorted(rows.items())
+
+        self._evaluations = sum([len(rows) for _, rows in candidates])
+
+        storages = [dataset._columns() for dataset in self._plan.datasets]
+
+        return sorted(kernels.rerank(query, storages, weights, candidates, k, use_abs))
+
+    def _probe(self, dimensions: List[Tuple[int, float, float]]) -> List[int]:
+        """
+        Get the ``nprobe`` cells whose centroid is the nearest to a query.
+
+        :param dimensions: The ``(dimension, coordinate, weight)`` of each defined coordinate of the query
+        :return: The indexes of the cells
+        """
+        if numpy is not None and dimensions:
+            centroids = numpy.frombuffer(self._centroids, dtype=numpy.float64).reshape(-1, self._width)
+            indexes, coords, weights = [numpy.array(column) for column in zip(*dimensions)]
+
+            sums = ((centroids[:, indexes] - coords) ** 2 * weights).sum(axis=1)
+
+            if self._nprobe >= len(sums):
+                return numpy.argsort(sums, kind="stable").tolist()
+
+            probed = numpy.argpartition(sums, self._nprobe - 1)[:self._nprobe]
+            return probed.tolist()
+
+        centroids = self._centroids
+        width = self._width
+        cell_sums = [sum([(query_coord - centroids[cell * width + i]) ** 2 * weight
+                          for i, query_coord, weight in dimensions]) for cell in range(self.cells)]
+
+        return heapq.nsmallest(self._nprobe, range(self.cells), key=cell_sums.__getitem__)
+
+    def _state(self) -> dict:
+        state = super()._state()
+
+        # The lists of the cells are saved one after the other, with the offset of each one
+        cells = state.pop("_cells")
+        state["_cell_offsets"] = array("q", [0])
+        state["_cell_positions"] = array("q")
+        for cell in cells:
+            state["_cell_positions"].extend(cell)
+            state["_cell_offsets"].append(len(state["_cell_positions"]))
+
+        return state
+
+    @classmethod
+    def _restore(cls, plan: "Plan", options: dict, state: dict) -> "Index":
+        state = dict(state)
+        offsets = state.pop("_cell_offsets")
+        positions = state.pop("_cell_positions")
+
+        index = super()._restore(plan, options, state)
+        index._cells = [positions[offsets[cell]:offsets[cell + 1]] for cell in range(len(offsets) - 1)]
+
+        return index
+
+
+def _nearest_cells(storage, start: int, stop: int, centroids: array, width: int) -> List[int]:
+    """
+    Get the nearest cell of each row of a block, over the defined coordinates of the row.
+
+    :param storage: The :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>` holding the rows
+    :param start: The first row of the block
+    :param stop: The row after the last row of the block
+    :param centroids: The row-major centroids of the cells
+    :param width: The number of coordinates of each centroid
+    :return: A ``list`` with the index of the nearest cell of each row
+    """
+    columns = storage.width
+
+    if numpy is not None:
+        matrix = storage.matrix(start, stop)
+        return _numpy_nearest(matrix, numpy.frombuffer(centroids, dtype=numpy.float64).reshape(-1, width)[:, :columns])
+
+    cells = len(centroids) // width
+    labels = []
+
+    buffer = storage.values(start, stop)
+
+    for base in range(0, (stop - start) * columns, columns):
+        coords = [(i, buffer[base + i]) for i in range(columns) if buffer[base + i] == buffer[base + i]]
+        sums = [sum([(coord - centroids[cell * width + i]) ** 2 for i, coord in coords]) for cell in range(cells)]
+        labels.append(sums.index(min(sums)))
+
+    return labels
+
+
+def _numpy_nearest(matrix, centroids) -> list:
+    """
+    Same as :func:`_nearest_cells<EasyKnn.ivf._nearest_cells>`, for a numpy matrix, NaN for the missing
+    coordinates. The sums are expanded as ``|p|² + |c|² - 2 p.c``, where ``|p|²`` is left out since it does not change
+    the nearest cell, and ``|c|²`` is only summed over the defined coordinates of each row.
+
+    :return: A numpy array with the index of the nearest cell of each row
+    """
+    mask = ~numpy.isnan(matrix)
+    zeroed = numpy.where(mask, matrix, 0.0)
+
+    sums = mask.astype(numpy.float64) @ (centroids * centroids).T - 2 * zeroed @ centroids.T
+
+    return sums.argmin(axis=1)
+
+
+def _kmeans(points: List[Tuple[float]], width: int, cells: int, iterations: int,
+            generator: random.Random) -> array:
+    """
+    Cluster points with k-means (Lloyd's algorithm), skipping their missing coordinates. The first centroids are
+    points taken at random, their missing coordinates replaced by the mean of the dimension.
+
+    :param points: A tuple of floats per point, NaN for the missing coordinates
+    :param width: The number of coordinates of each point
+    :param cells: The number of clusters
+    :param iterations: The largest number of iterations
+    :param generator: The random generator choosing the first centroids
+    :return: The row-major centroids, as an ``array('d')``
+    """
+    if not points or not width:
+        return array("d")
+
+    if numpy is not None:
+        matrix = numpy.array(points, dtype=numpy.float64).reshape(-1, width)
+        mask = ~numpy.isnan(matrix)
+        zeroed = numpy.where(mask, matrix, 0.0)
+
+        counts = mask.sum(axis=0)
+        means = numpy.divide(zeroed.sum(axis=0), counts, out=numpy.zeros(width), where=counts > 0)
+
+        centroids = numpy.where(mask, matrix, means)[generator.sample(range(len(points)), cells)]
+
+        for _ in range(iterations):
+            labels = numpy.concatenate([_numpy_nearest(matrix[start:start + _CHUNK], centroids)
+                                        for start in range(0, len(matrix), _CHUNK)])
+
+            sums = numpy.empty((cells, width))
+            totals = numpy.empty((cells, width))
+            for i in range(width):
+                sums[:, i] = numpy.bincount(labels, weights=zeroed[:, i], minlength=cells)
+                totals[:, i] = numpy.bincount(labels, weights=mask[:, i], minlength=cells)
+
+            # A dimension without any coordinate in a cell keeps its previous centroid coordinate
+            updated = numpy.where(totals > 0, sums / numpy.maximum(totals, 1), centroids)
+
+            if numpy.allclose(updated, centroids):
+                centroids = updated
+                break
+
+            centroids = updated
+
+        return array("d", centroids.ravel().tolist())
+
+    means = []
+    for i in range(width):
+        defined = [point[i] for point in points if point[i] == point[i]]
+        means.append(sum(defined) / len(defined) if defined else 0.0)
+
+    centroids = [[coord if coord == coord else mean for coord, mean in zip(points[index], means)]
+                 for index in generator.sample(range(len(points)), cells)]
+
+    for _ in range(iterations):
+        sums = [[0.0] * width for _ in range(cells)]
+        totals = [[0] * width for _ in range(cells)]
+
+        for point in points:
+            coords = [(i, coord) for i, coord in enumerate(point) if coord == coord]
+            distances = [sum([(coord - centroid[i]) ** 2 for i, coord in coords]) for centroid in centroids]
+            cell = distances.index(min(distances))
+
+            for i, coord in coords:
+                sums[cell][i] += coord
+                totals[cell][i] += 1
+
+        updated = [[sums[cell][i] / totals[cell][i] if totals[cell][i] else centroids[cell][i] for i in range(width)]
+                   for cell in range(cells)]
+
+        if updated == centroids:
+            break
+
+        centroids = updated
+
+    return array("d", [coord for centroid in centroids for coord in centroid])
@@ -0,0 +1,244 @@
+import heapq
+from array import array
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+from EasyKnn import kernels
+from EasyKnn.index import Index
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+
+_INFINITY = float("inf")
+
+
+class KDTree(Index):
+    """
+    An exact k-d tree over all the :class:`Values<EasyKnn.value.Value>` of a :class:`Plan<EasyKnn.plan.Plan>`. Each
+    node splits its values in two halves on the dimension where they are the most spread, and keeps the bounding box
+    of its values. A query visits the nodes from the nearest bounding box, and stops once no box can hold a nearer
+    value than the ``k`` already found.
+
+    Missing coordinates are skipped by the distance, so a value missing a dimension can be anywhere on this
+    dimension: a node holding such a value has an unbounded box on this dimension, and is never pruned on it. To
+    keep these nodes few, a node first splits the values missing a dimension from the others.
+
+    The tree is only used with positive weights: a negative weight breaks the pruning, and the Plan scans all the
+    values instead.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to index
+    :param leaf_size: The largest number of values in a leaf of the tree
+
+    >>> from EasyKnn import Plan, Dataset, Value
+    >>> plan = Plan()
+    >>> dataset = Dataset()
+    >>> dataset.add_values([Value([x, y]) for x in range(10) for y in range(10)])
+    >>> plan.add_dataset(dataset)
+    >>> tree = KDTree(plan, leaf_size=4)
+    >>> tree.query([2, 7.25], [1, 1], k=2)
+    [(0.25, 0, 27), (0.75, 0, 28)]
+    >>> tree.saved_evaluations > 0
+    True
+    """
+
+    def __init__(self, plan: "Plan", leaf_size: int = 16):
+        super().__init__(plan)
+
+        if leaf_size < 1:
+            raise ValueError("The leaf size must be at least 1")
+
+        self._leaf_size = leaf_size
+
+        self.build()
+
+    def build(self) -> None:
+        # We copy every row, padded to the same width, in a list of tuples used to build the tree
+        width, points, ids = self._rows()
+        self._width = width
+
+        # Each node is described by the same index in all these lists. The bounding box of a node is stored in
+        # ``_lower`` and ``_upper`` from ``node * width``.
+        self._lower = array("d")
+        self._upper = array("d")
+        self._start = []
+        self._end = []
+        self._children = []
+
+        order = list(range(len(points)))
+        if points:
+            self._build_node(points, order, 0, len(points))
+
+        # The values are then stored in the order of the leaves, so a leaf is a contiguous block
+        self._coordinates = array("d")
+        for index in order:
+            self._coordinates.extend(points[index])
+
+        # The dataset index and the row of each stored value
+        self._dataset_indexes = array("q", [ids[index][0] for index in order])
+        self._dataset_rows = array("q", [ids[index][1] for index in order])
+        self._size = len(order)
+
+        self._stale = False
+
+    def _options(self) -> dict:
+        return {"leaf_size": self._leaf_size}
+
+    def _state(self) -> dict:
+        state = super()._state()
+
+        # The lists of the nodes are saved as arrays, with two children of -1 for a leaf
+        state["_start"] = array("q", self._start)
+        state["_end"] = array("q", self._end)
+        state["_children"] = array("q", [child for children in self._children for child in children or (-1, -1)])
+
+        return state
+
+    @classmethod
+    def _restore(cls, plan: "Plan", options: dict, state: dict) -> "Index":
+        state = dict(state)
+        children = state.pop("_children")
+
+        index = super()._restore(plan, options, state)
+        index._children = [None if children[2 * node] < 0 else (children[2 * node], children[2 * node + 1])
+                           for node in range(len(children) // 2)]
+
+        return index
+
+    def _build_node(self, points: List[Tuple[float]], order: List[int], start: int, end: int) -> int:
+        """
+        Create the node holding ``order[start:end]``, and its children.
+
+        :return: The index of the node
+        """
+        node = len(self._start)
+
+        lower, upper = [], []
+        spreads = []
+        partially_missing = []
+        for i in range(self._width):
+            coords = [points[index][i] for index in order[start:end]]
+            defined = [coord for coord in coords if coord == coord]  # NaN != NaN
+
+            if not defined:
+                lower.append(-_INFINITY)
+                upper.append(_INFINITY)
+                spreads.append(0)
+                continue
+
+            spreads.append(max(defined) - min(defined))
+
+            if len(defined) < len(coords):
+                # A value missing this dimension can be anywhere on it
+                lower.append(-_INFINITY)
+                upper.append(_INFINITY)
+                partially_missing.append(i)
+
+            else:
+                lower.append(min(defined))
+                upper.append(max(defined))
+
+        self._lower.extend(lower)
+        self._upper.extend(upper)
+        self._start.append(start)
+        self._end.append(end)
+        self._children.append(None)
+
+        if end - start <= self._leaf_size:
+            return node
+
+        if partially_missing:
+            # We first separate the values missing a dimension from the others, so the boxes of the children are
+            # bounded on this dimension again
+            axis = partially_missing[0]
+            defined = [index for index in order[start:end] if points[index][axis] == points[index][axis]]
+            missing = [index for index in order[start:end] if points[index][axis] != points[index][axis]]
+
+            order[start:end] = defined + missing
+            middle = start + len(defined)
+
+        elif max(spreads) == 0:
+            return node
+
+        else:
+            axis = spreads.index(max(spreads))
+            order[start:end] = sorted(order[start:end], key=lambda index: points[index][axis])
+            middle = (start + end) // 2
+
+        self._children[node] = (self._build_node(points, order, start, middle),
+                                self._build_node(points, order, middle, end))
+
+        return node
+
+    def _bound(self, node: int, dimensions: List[Tuple[int, float, float]]) -> float:
+        """
+        Get the smallest weighted sum of squares between the query and any value of a node.
+
+        :param node: The index of the node
+        :param dimensions: The ``(dimension, coordinate, weight)`` of each defined coordinate of the query
+        :return: The lower bound of the node
+        """
+        lower, upper = self._lower, self._upper
+        base = node * self._width
+
+        bound = 0
+        for i, query_coord, weight in dimensions:
+            if query_coord < lower[base + i]:
+                bound += (lower[base + i] - query_coord) ** 2 * weight
+
+            elif query_coord > upper[base + i]:
+                bound += (query_coord - upper[base + i]) ** 2 * weight
+
+        return bound
+
+    def query(self, query: List[Union[int, float, None]], weights: List[float], k: int,
+              use_abs: bool = True) -> List[Tuple[float, int, int]]:
+        self._evaluations = 0
+        self._pruned = 0
+
+        if not self._start or k <= 0:
+            return []
+
+        dimensions = [(i, query[i], weights[i]) for i in range(min(self._width, len(query))) if query[i] is not None]
+
+        coordinates = self._coordinates
+        width = self._width
+
+        # The k best values found, as a heap of negated (sum, dataset index, row), so the worst one is on top
+        best = []
+        to_visit = [(self._bound(0, dimensions), 0)]
+
+        while to_visit:
+            bound, node = heapq.heappop(to_visit)
+
+            if len(best) == k and bound > -best[0][0]:
+                # The nearest remaining box is already farther than the k values found
+                self._pruned = len(to_visit) + 1
+                break
+
+            children = self._children[node]
+            if children is not None:
+                for child in children:
+                    heapq.heappush(to_visit, (self._bound(child, dimensions), child))
+                continue
+
+            self._evaluations += self._end[node] - self._start[node]
+
+            for position in range(self._start[node], self._end[node]):
+                base = position * width
+
+                coord_sum = 0
+                for i, query_coord, weight in dimensions:
+                    point_coord = coordinates[base + i]
+
+                    if point_coord == point_coord:
+                        coord_sum += (query_coord - point_coord) ** 2 * weight
+
+                candidate = (-coord_sum, -self._dataset_indexes[position], -self._dataset_rows[position])
+
+                if len(best) < k:
+                    heapq.heappush(best, candidate)
+
+                elif candidate > best[0]:
+                    heapq.heapreplace(best, candidate)
+
+        return sorted([(kernels.finish(-coord_sum, use_abs), -dataset_index, -row)
+                       for coord_sum, dataset_index, row in best])
@@ -0,0 +1,800 @@
+import bisect
+import heapq
+from typing import List, Union, Tuple
+
+from EasyKnn.storage import ColumnarStorage
+from EasyKnn.weight import Weight
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def weight_vector(weight: Weight, dimension: int) -> List[float]:
+    """
+    Expand a :class:`Weight<EasyKnn.weight.Weight>` to one weight per dimension. Undefined weights are set to 1.
+
+    :param weight: The :class:`Weight<EasyKnn.weight.Weight>` to expand
+    :param dimension: The number of dimensions
+    :return: A ``list`` of ``dimension`` weights
+
+    >>> weight_vector(Weight([2, 0.5]), 4)
+    [2, 0.5, 1, 1]
+    """
+    return [weight[i] for i in range(dimension)]
+
+
+def finish(coord_sum: float, use_abs: bool = True) -> float:
+    """
+    Take the square root of a weighted sum of squares, the same way
+    :meth:`Plan._distance<EasyKnn.plan.Plan._distance>` does. A negative sum (caused by negative weights) gives a
+    negative distance, unless ``use_abs`` is ``True``.
+
+    :param coord_sum: The weighted sum of squares
+    :param use_abs: If True, the absolute value of the distance will be returned
+    :return: The distance
+
+    >>> finish(9.0), finish(-9.0), finish(-9.0, use_abs=False)
+    (3.0, 3.0, -3.0)
+    """
+    if coord_sum >= 0:
+        return coord_sum ** 0.5
+
+    return (-coord_sum) ** 0.5 if use_abs else -((-coord_sum) ** 0.5)
+
+
+def distances(query: List[Union[int, float, None]], storage: ColumnarStorage, weights: List[float],
+              use_abs: bool = True, start: int = 0, stop: int = None) -> List[float]:
+    """
+    Get the weighted euclidean distances between a query and a block of rows of a
+    :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>`, in a single pass.
+
+    A dimension is skipped when the query or the row is missing it (``None``, NaN, or past the end of the row).
+    Dimensions of the rows past the length of the query are ignored.
+
+    :param query: The coordinates of the searched :class:`Value<EasyKnn.value.Value>`
+    :param storage: The storage holding the rows
+    :param weights: The weight of each dimension of the query, as given by
+            :func:`weight_vector<EasyKnn.kernels.weight_vector>`
+    :param use_abs: If True, the absolute value of the distances will be returned
+    :param start: The first row of the block
+    :param stop: The row after the last row of the block. If ``None``, the block ends with the storage.
+    :return: A ``list`` with the distance of each row of the block
+
+    >>> storage = ColumnarStorage()
+    >>> storage.extend([([2, 2, 2], None), ([1, None, 5], None)])
+    range(0, 2)
+    >>> distances([1, 2, 2], storage, [1, 1, 1])
+    [1.0, 3.0]
+    >>> distances([None, 2, 2], storage, [1, 1, 1])
+    [0.0, 3.0]
+    """
+    if stop is None:
+        stop = len(storage)
+
+    width = storage.width
+    columns = min(width, len(query))
+
+    if stop <= start:
+        return []
+
+    if numpy is not None:
+        matrix = storage.matrix(start, stop)[:, :columns]
+
+        query_row = numpy.array([numpy.nan if coord is None else coord for coord in query[:columns]],
+                                dtype=numpy.float64)
+
+        squares = matrix - query_row
+        squares *= squares
+        squares *= numpy.array(weights[:columns], dtype=numpy.float64)
+
+        # Missing coordinates are NaN on either side, so they are left out of the sum
+        sums = numpy.nansum(squares, axis=1)
+
+        result = numpy.sqrt(numpy.abs(sums))
+        if not use_abs:
+            result = numpy.where(sums < 0, -result, result)
+
+        return result.tolist()
+
+    buffer = storage.values(start, stop)
+
+    # We keep only the dimensions defined in the query, with their weight
+    dimensions = [(i, query[i], weights[i]) for i in range(columns) if query[i] is not None]
+
+    result = []
+    for base in range(0, (stop - start) * width, width):
+        coord_sum = 0
+        for i, query_coord, weight in dimensions:
+            point_coord = buffer[base + i]
+
+            if point_coord == point_coord:  # NaN != NaN
+                coord_sum += (query_coord - point_coord) ** 2 * weight
+
+        result.append(finish(coord_sum, use_abs))
+
+    return result
+
+
+def rerank(query: List[Union[int, float, None]], storages: List[ColumnarStorage], weights: List[float],
+           candidates: List[Tuple[int, List[int]]], k: int, use_abs: bool = True,
+           metric=None) -> List[Tuple[float, int, int]]:
+    """
+    Get the ``k`` nearest of some candidate rows, with their exact distance. Used by the approximate indexes, once
+    they found the rows that may be the nearest.
+
+    :param query: The coordinates of the searched :class:`Value<EasyKnn.value.Value>`
+    :param storages: The storages holding the rows
+    :param weights: The weight of each dimension of the query. They must not be negative.
+    :param candidates: The ``(storage index, rows)`` of the candidate rows of each storage
+    :param k: The number of rows to get
+    :param use_abs: If True, the absolute value of the distances will be returned
+    :param metric: The :class:`Metric<EasyKnn.metrics.Metric>` to use. If ``None``, the euclidean distance is used.
+    :return: A ``list`` of ``(distance, storage index, row)`` tuples, from the nearest to the farthest
+
+    >>> storage = ColumnarStorage()
+    >>> storage.extend([([0, 0], None), ([3, 4], None), ([1, None], None)])
+    range(0, 3)
+    >>> rerank([0, 0], [storage], [1, 1], [(0, [1, 2])], k=1)
+    [(1.0, 0, 2)]
+    """
+    if metric is not None and metric.name != "euclidean":
+        return _metric_rerank(query, storages, weights, candidates, k, use_abs, metric)
+
+    best = []
+
+    for storage_index, rows in candidates:
+        storage = storages[storage_index]
+        width = storage.width
+        columns = min(width, len(query))
+
+        if not len(rows):
+            continue
+
+        if numpy is not None and columns:
+            block = storage.take(rows)[:, :columns]
+
+            query_row = numpy.array([numpy.nan if coord is None else coord for coord in query[:columns]],
+                                    dtype=numpy.float64)
+
+            squares = block - query_row
+            squares *= squares
+            squares *= numpy.array(weights[:columns], dtype=numpy.float64)
+            sums = numpy.nansum(squares, axis=1)
+
+            if len(sums) > k:
+                # Only the rows up to the k-th smallest sum can be selected, ties included
+                threshold = numpy.partition(sums, k - 1)[k - 1]
+                kept = numpy.flatnonzero(sums <= threshold)
+                sums = sums[kept]
+                rows = numpy.asarray(rows, dtype=numpy.int64)[kept]
+
+            best.extend(zip(sums.tolist(), [storage_index] * len(sums), [int(row) for row in rows]))
+
+        else:
+            dimensions = [(i, query[i], weights[i]) for i in range(columns) if query[i] is not None]
+
+            for row in rows:
+                buffer = storage.values(row, row + 1)
+
+                coord_sum = 0
+                for i, query_coord, weight in dimensions:
+                    point_coord = buffer[i]
+
+                    if point_coord == point_coord:  # NaN != NaN
+                        coord_sum += (query_coord - point_coord) ** 2 * weight
+
+                best.append((coord_sum, storage_index, row))
+
+        best = heapq.nsmallest(k, best)
+
+    return [(finish(coord_sum, use_abs), storage_index, row) for coord_sum, storage_index, row in best]
+
+
+def _metric_rerank(query: List[Union[int, float, None]], storages: List[ColumnarStorage], weights: List[float],
+                   candidates: List[Tuple[int, List[int]]], k: int, use_abs: bool,
+                   metric) -> List[Tuple[float, int, int]]:
+    """
+    Same as :func:`rerank<EasyKnn.kernels.rerank>`, with any :class:`Metric<EasyKnn.metrics.Metric>`.
+
+    :return: A ``list`` of ``(distance, storage index, row)`` tuples
+    """
+    best = []
+
+    for storage_index, rows in candidates:
+        storage = storages[storage_index]
+        width = storage.width
+        columns = min(width, len(query))
+
+        if numpy is not None and columns and len(rows):
+            block = storage.take(rows)[:, :columns]
+            query_row = numpy.array([numpy.nan if coord is None else coord for coord in query[:columns]],
+                                    dtype=numpy.float64)
+
+            found = metric._numpy_block(query_row, block, numpy.array(weights[:columns], dtype=numpy.float64),
+                                        use_abs).tolist()
+
+        else:
+            found = [metric.pair(query[:columns], storage.row(row), weights, use_abs) for row in rows]
+
+        best = heapq.nsmallest(k, best + list(zip(found, [storage_index] * len(found), [int(row) for row in rows])))
+
+    return best
+
+
+def _exact_distance(query: List[Union[int, float, None]], storage: ColumnarStorage, row: int,
+                    weights: List[float], use_abs: bool) -> float:
+    """
+    Compute the distance between a query and a single row, dimension by dimension.
+
+    :param query: The coordinates of the query
+    :param storage: The storage holding the row
+    :param row: The index of the row
+    :param weights: The weight of each dimension of the query
+    :param use_abs: If True, the absolute value of the distance will be returned
+    :return: The distance
+    """
+    buffer = storage.values(row, row + 1)
+
+    coord_sum = 0
+    for i in range(min(storage.width, len(query))):
+        point_coord = buffer[i]
+
+        if query[i] is not None and point_coord == point_coord:
+            coord_sum += (query[i] - point_coord) ** 2 * weights[i]
+
+    return finish(coord_sum, use_abs)
+
+
+def _expanded_sums(queries, matrix, weights):
+    """
+    Get the weighted sums of squares between every query and every row of a block, with the
+    ``|q|² + |p|² - 2 q.p`` expansion, so that the work is done by matrix products.
+
+    When a coordinate is missing (NaN) on either side, its dimension is masked out of all three terms.
+
+    :param queries: A ``(queries, columns)`` numpy array, NaN for the missing coordinates
+    :param matrix: A ``(rows, columns)`` numpy array, NaN for the missing coordinates
+    :param weights: A numpy array with the weight of each column
+    :return: A ``(queries, rows)`` numpy array of weighted sums of squares
+    """
+    query_mask = ~numpy.isnan(queries)
+    point_mask = ~numpy.isnan(matrix)
+    query_zeroed = numpy.where(query_mask, queries, 0.0)
+    point_zeroed = numpy.where(point_mask, matrix, 0.0)
+
+    weighted_queries = query_zeroed * weights
+    cross = weighted_queries @ point_zeroed.T
+
+    if query_mask.all() and point_mask.all():
+        query_norms = (weighted_queries * query_zeroed).sum(axis=1)
+        point_norms = (point_zeroed * point_zeroed) @ weights
+        sums = query_norms[:, None] + point_norms[None, :] - 2 * cross
+
+    else:
+        # Each squared norm is only summed over the dimensions defined on the other side too
+        sums = ((weighted_queries * query_zeroed) @ point_mask.T.astype(numpy.float64)
+                + query_mask.astype(numpy.float64) @ ((point_zeroed * point_zeroed) * weights).T
+                - 2 * cross)
+
+    if (weights >= 0).all():
+        # The expansion can give tiny negative sums by cancellation, while the real sum cannot be negative
+        numpy.maximum(sums, 0.0, out=sums)
+
+    return sums
+
+
+def top_k(queries: List[List[Union[int, float, None]]], storages: List[ColumnarStorage], weights: List[float],
+          k: int, use_abs: bool = True, block_size: int = 1024, metric=None) -> List[List[Tuple[float, int, int]]]:
+    """
+    Get the ``k`` nearest rows of several storages for each query. If ``k`` is negative, the ``k`` farthest rows are
+    returned instead.
+
+    The distances are computed block by block: at most ``block_size`` queries against ``block_size`` rows at once,
+    so the memory used stays bounded whatever the size of the storages. With numpy, each block is computed with the
+    ``|q|² + |p|² - 2 q.p`` expansion, and the distances of the selected rows are then computed again exactly.
+    Other metrics are computed query by query, with their own block kernel.
+
+    :param queries: The coordinates of each query
+    :param storages: The storages holding the rows
+    :param weights: The weight of each dimension, for the longest query
+    :param k: The number of rows to get for each query
+    :param use_abs: If True, the absolute value of the distances will be used
+    :param block_size: The largest number of queries, and of rows, compared at once
+    :param metric: The :class:`Metric<EasyKnn.metrics.Metric>` to use. If ``None``, the euclidean distance is used.
+    :return: For each query, a ``list`` of ``(distance, storage index, row)`` tuples, from the nearest to the farthest
+            (or from the farthest to the nearest if ``k`` is negative)
+
+    >>> storage = ColumnarStorage()
+    >>> storage.extend([([0, 0], None), ([3, 4], None), ([1, None], None)])
+    range(0, 3)
+    >>> top_k([[0, 0], [3, 3]], [storage], [1, 1], k=2)
+    [[(0.0, 0, 0), (1.0, 0, 2)], [(1.0, 0, 1), (2.0, 0, 2)]]
+    >>> top_k([[0, 0]], [storage], [1, 1], k=-1)
+    [[(5.0, 0, 1)]]
+    """
+    if block_size < 1:
+        raise ValueError("The block size must be at least 1")
+
+    farthest = k < 0
+    k = abs(k)
+
+    if k == 0 or not queries:
+        return [[] for _ in queries]
+
+    if metric is not None and metric.name != "euclidean":
+        return [_python_top_k(query, storages, weights, k, farthest, use_abs, block_size, metric.block)
+                for query in queries]
+
+    if numpy is None:
+        return [_python_top_k(query, storages, weights, k, farthest, use_abs, block_size) for query in queries]
+
+    width = max([len(query) for query in queries])
+    weights_array = numpy.array(weights[:width], dtype=numpy.float64)
+
+    results = []
+    for query_start in range(0, len(queries), block_size):
+        chunk = queries[query_start:query_start + block_size]
+        query_matrix = numpy.full((len(chunk), width), numpy.nan)
+        for i, query in enumerate(chunk):
+            query_matrix[i, :len(query)] = [numpy.nan if coord is None else coord for coord in query]
+
+        best_keys = numpy.empty((len(chunk), 0))
+        best_storages = numpy.empty((len(chunk), 0), dtype=numpy.int64)
+        best_rows = numpy.empty((len(chunk), 0), dtype=numpy.int64)
+
+        for storage_index, storage in enumerate(storages):
+            if len(storage) == 0:
+                continue
+
+            columns = min(storage.width, width)
+
+            for start in range(0, len(storage), block_size):
+                block = storage.matrix(start, start + block_size)[:, :columns]
+
+                sums = _expanded_sums(query_matrix[:, :columns], block, weights_array[:columns])
+                block_distances = numpy.sqrt(numpy.abs(sums))
+                if not use_abs:
+                    block_distances = numpy.where(sums < 0, -block_distances, block_distances)
+
+                # The selection always keeps the smallest keys
+                keys = numpy.concatenate([best_keys, -block_distances if farthest else block_distances], axis=1)
+                kept_storages = numpy.concatenate(
+                    [best_storages, numpy.full(block_distances.shape, storage_index, dtype=numpy.int64)], axis=1)
+                kept_rows = numpy.concatenate(
+                    [best_rows, numpy.broadcast_to(numpy.arange(start, start + len(block)), block_distances.shape)],
+                    axis=1)
+
+                if keys.shape[1] > k:
+                    selected = numpy.argpartition(keys, k - 1, axis=1)[:, :k]
+                    keys = numpy.take_along_axis(keys, selected, axis=1)
+                    kept_storages = numpy.take_along_axis(kept_storages, selected, axis=1)
+                    kept_rows = numpy.take_along_axis(kept_rows, selected, axis=1)
+
+                best_keys, best_storages, best_rows = keys, kept_storages, kept_rows
+
+        for query, query_storages, query_rows in zip(chunk, best_storages.tolist(), best_rows.tolist()):
+            selection = [(_exact_distance(query, storages[storage_index], row, weights, use_abs), storage_index, row)
+                         for storage_index, row in zip(query_storages, query_rows)]
+            selection.sort(key=lambda item: (-item[0] if farthest else item[0], item[1], item[2]))
+            results.append(selection)
+
+    return results
+
+
+def _python_top_k(query: List[Union[int, float, None]], storages: List[ColumnarStorage], weights: List[float],
+                  k: int, farthest: bool, use_abs: bool, block_size: int, block=None) -> List[Tuple[float, int, int]]:
+    """
+    Same as :func:`top_k<EasyKnn.kernels.top_k>` for a single query, one block of rows at a time.
+
+    :param block: The function computing the distances of a block, :func:`distances<EasyKnn.kernels.distances>`
+            by default
+
+    :return: A ``list`` of ``(distance, storage index, row)`` tuples
+    """
+    if block is None:
+        block = distances
+
+    best = []
+    for storage_index, storage in enumerate(storages):
+        for start in range(0, len(storage), block_size):
+            block_distances = block(query, storage, weights, use_abs, start, min(start + block_size, len(storage)))
+
+            candidates = [(-distance if farthest else distance, storage_index, row)
+                          for row, distance in enumerate(block_distances, start)]
+            best = heapq.nsmallest(k, best + candidates)
+
+    return [(-key if farthest else key, storage_index, row) for key, storage_index, row in best]
+
+
+def vote(selections: List[List[Tuple[float, int, int]]], labels: int, weighted: bool = False) -> List[int]:
+    """
+    Get the label voted for by the rows selected for each query, where the label of a row is the index of its
+    storage. Each row gives one vote, or ``1 / distance`` if ``weighted`` (the rows at a distance of 0 then get all
+    the votes). A tie goes to the label of the nearest row among the tied labels.
+
+    :param selections: For each query, its selected ``(distance, storage index, row)`` tuples, from the nearest to
+            the farthest, as given by :func:`top_k<EasyKnn.kernels.top_k>`
+    :param labels: The number of storages
+    :param weighted: If ``True``, the votes are weighted by the inverse of the distances
+    :return: For each query, the storage index voted for, or ``None`` if no row was selected
+
+    >>> vote([[(1.0, 0, 0), (2.0, 1, 0), (3.0, 1, 1)], [(1.0, 1, 0), (2.0, 0, 3)]], labels=2)
+    [1, 1]
+    >>> vote([[(1.0, 0, 0), (2.0, 1, 0), (3.0, 1, 1)]], labels=2, weighted=True)
+    [0]
+    """
+    if numpy is None or not any(selections):
+        return [_python_vote(selection, weighted) for selection in selections]
+
+    distances, storage_indexes, _, selected = _selection_arrays(selections)
+    indexes = numpy.arange(len(selections))[:, None]
+
+    votes = numpy.where(selected, _votes(distances, weighted), 0)
+
+    # The votes of each query for each label, summed over its rows
+    scores = numpy.zeros((len(selections), labels))
+    numpy.add.at(scores, (numpy.broadcast_to(indexes, storage_indexes.shape), storage_indexes), votes)
+
+    # The first row (the nearest one) whose label has the best score
+    tied = (scores == scores.max(axis=1, keepdims=True))[indexes, storage_indexes]
+
+    voted = storage_indexes[indexes[:, 0], (tied & selected).argmax(axis=1)].tolist()
+
+    return [label if selected_rows else None for label, selected_rows in zip(voted, selected.any(axis=1).tolist())]
+
+
+def _python_vote(selection: List[Tuple[float, int, int]], weighted: bool) -> Union[int, None]:
+    """
+    Same as :func:`vote<EasyKnn.kernels.vote>` for a single query, with plain Python loops.
+
+    :return: The storage index voted for, or ``None`` if no row was selected
+    """
+    exact = weighted and any([distance == 0 for distance, _, _ in selection])
+
+    scores = {}
+    for distance, storage_index, _ in selection:
+        if not weighted:
+            score = 1
+        elif exact:
+            score = 1 if distance == 0 else 0
+        else:
+            score = 1 / abs(distance)
+
+        scores[storage_index] = scores.get(storage_index, 0) + score
+
+    best = max(scores.values(), default=None)
+
+    for _, storage_index, _ in selection:
+        if scores[storage_index] == best:
+            return storage_index
+
+    return None
+
+
+def _selection_arrays(selections: List[List[Tuple[float, int, int]]]) -> tuple:
+    """
+    Get the selected rows of several queries as numpy arrays, padded to the longest selection.
+
+    :param selections: For each query, its selected ``(distance, storage index, row)`` tuples
+    :return: A ``(distances, storage indexes, rows, selected)`` tuple of ``(queries, longest selection)`` numpy
+            arrays. The distances are absolute, and infinite for the padding, where ``selected`` is ``False``.
+    """
+    lengths = [len(selection) for selection in selections]
+    longest = max(lengths)
+
+    if min(lengths) == longest:
+        found = numpy.array(selections, dtype=numpy.float64).reshape(len(selections), longest, 3)
+        selected = numpy.ones((len(selections), longest), dtype=bool)
+
+    else:
+        found = numpy.zeros((len(selections), longest, 3))
+        selected = numpy.zeros((len(selections), longest), dtype=bool)
+
+        for index, selection in enumerate(selections):
+            if selection:
+                found[index, :len(selection)] = selection
+                selected[index, :len(selection)] = True
+
+    return numpy.where(selected, numpy.abs(found[:, :, 0]), numpy.inf), found[:, :, 1].astype(numpy.int64), \
+        found[:, :, 2].astype(numpy.int64), selected
+
+
+def _votes(distances, weighted: bool):
+    """
+    Get the vote of each selected row.
+
+    :param distances: A ``(queries, rows)`` numpy array of non-negative distances
+    :param weighted: If ``True``, the votes are the inverse of the distances, and only the rows at a distance of 0
+            vote for the queries having such rows
+    :return: A numpy array of votes, of the same shape
+    """
+    if not weighted:
+        return numpy.ones(distances.shape)
+
+    exact = distances == 0
+
+    with numpy.errstate(divide="ignore"):
+        return numpy.where(exact.any(axis=1, keepdims=True), exact.astype(numpy.float64), 1 / distances)
+
+
+def average(selections: List[List[Tuple[float, int, int]]], storages: List[ColumnarStorage], dimension: int,
+            weighted: bool = False) -> List[Union[float, None]]:
+    """
+    Get the average coordinate, in a dimension, of the rows selected for each query. The rows missing this coordinate
+    are skipped. If ``weighted``, each coordinate is weighted by the inverse of the distance of its row, and only
+    the rows at a distance of 0 are averaged if there are some.
+
+    :param selections: For each query, its selected ``(distance, storage index, row)`` tuples, as given by
+            :func:`top_k<EasyKnn.kernels.top_k>`
+    :param storages: The storages holding the rows
+    :param dimension: The index of the averaged dimension
+    :param weighted: If ``True``, the coordinates are weighted by the inverse of the distances
+    :return: For each query, the average coordinate, or ``None`` if no selected row has this coordinate
+
+    >>> storage = ColumnarStorage()
+    >>> storage.extend([([0, 10], None), ([1, 20], None), ([2, None], None)])
+    range(0, 3)
+    >>> average([[(1.0, 0, 0), (3.0, 0, 1), (0.5, 0, 2)]], [storage], dimension=1)
+    [15.0]
+    >>> average([[(1.0, 0, 0), (4.0, 0, 1)]], [storage], dimension=1, weighted=True)
+    [12.0]
+    """
+    if numpy is None or not any(selections):
+        return [_python_average(selection, storages, dimension, weighted) for selection in selections]
+
+    distances, storage_indexes, rows, selected = _selection_arrays(selections)
+
+    # We read the coordinates of the selected rows of each storage at once
+    coordinates = numpy.full(rows.shape, numpy.nan)
+    for storage_index in numpy.unique(storage_indexes[selected]).tolist():
+        storage = storages[storage_index]
+
+        if dimension < storage.width:
+            rows_of_storage = selected & (storage_indexes == storage_index)
+            coordinates[rows_of_storage] = storage.take(rows[rows_of_storage])[:, dimension]
+
+    defined = ~numpy.isnan(coordinates)
+    distances = numpy.where(defined, distances, numpy.inf)
+
+    votes = numpy.where(defined, _votes(distances, weighted), 0)
+    totals = votes.sum(axis=1)
+    sums = (votes * numpy.where(defined, coordinates, 0)).sum(axis=1)
+
+    return [None if total == 0 else value for value, total in zip((sums / numpy.where(totals, totals, 1)).tolist(),
+                                                                  totals.tolist())]
+
+
+def _python_average(selection: List[Tuple[float, int, int]], storages: List[ColumnarStorage], dimension: int,
+                    weighted: bool) -> Union[float, None]:
+    """
+    Same as :func:`average<EasyKnn.kernels.average>` for a single query, with plain Python loops.
+
+    :return: The average coordinate, or ``None`` if no selected row has this coordinate
+    """
+    defined = []
+    for distance, storage_index, row in selection:
+        storage = storages[storage_index]
+
+        if dimension < storage.width:
+            coord = storage.values(row, row + 1)[dimension]
+
+            if coord == coord:
+                defined.append((abs(distance), coord))
+
+    if not defined:
+        return None
+
+    if weighted and any([distance == 0 for distance, _ in defined]):
+        defined = [(distance, coord) for distance, coord in defined if distance == 0]
+        weighted = False
+
+    votes = [1 / distance if weighted else 1 for distance, _ in defined]
+
+    return sum([vote * coord for vote, (_, coord) in zip(votes, defined)]) / sum(votes)
+
+
+def select(distances_lists: List[List[float]], k: int) -> Tuple[List[Tuple[float, int, int]],
+                                                                 List[Tuple[float, int, int]]]:
+    """
+    Select the ``k`` smallest and the ``k`` largest distances of several lists of distances, without sorting them
+    all. Equal distances are ordered like a stable sort of all the lists one after the other would order them.
+
+    :param distances_lists: One ``list`` of distances per storage, with one distance per row
+    :param k: The number of distances to select on each side
+    :return: A ``(nearest, farthest)`` tuple. ``nearest`` holds ``(distance, storage index, row)`` tuples, from the
+            smallest distance, and ``farthest`` the same tuples from the largest distance.
+
+    >>> select([[3.0, 1.0], [2.0, 1.0]], 2)
+    ([(1.0, 0, 1), (1.0, 1, 1)], [(3.0, 0, 0), (2.0, 1, 0)])
+    """
+    if k <= 0:
+        return [], []
+
+    if numpy is None:
+        candidates = [(distance, storage_index, row)
+                      for storage_index, storage_distances in enumerate(distances_lists)
+                      for row, distance in enumerate(storage_distances)]
+
+        # A stable sort orders equal distances by storage, then by row, so the farthest ties are in reverse order
+        nearest = heapq.nsmallest(k, candidates)
+        farthest = heapq.nlargest(k, candidates)
+
+        return nearest, farthest
+
+    offsets = [0]
+    for storage_distances in distances_lists:
+        offsets.append(offsets[-1] + len(storage_distances))
+
+    flat = numpy.concatenate([numpy.asarray(storage_distances, dtype=numpy.float64)
+                              for storage_distances in distances_lists] or [numpy.empty(0)])
+
+    def locate(index):
+        storage_index = bisect.bisect_right(offsets, index) - 1
+        return float(flat[index]), storage_index, index - offsets[storage_index]
+
+    nearest = [locate(index) for index in _smallest(flat, k)]
+
+    # Looking for the smallest negated distances from the end keeps the farthest ties in reverse order
+    farthest = [locate(len(flat) - 1 - index) for index in _smallest(-flat[::-1], k)]
+
+    return nearest, farthest
+
+
+def _smallest(values, k: int) -> List[int]:
+    """
+    Get the indexes of the ``k`` smallest values of a numpy array, ordered by value, then by index.
+
+    :param values: A one-dimensional numpy array
+    :param k: The number of indexes to get
+    :return: A ``list`` of at most ``k`` indexes
+    """
+    if k >= len(values):
+        return numpy.argsort(values, kind="stable").tolist()
+
+    threshold = numpy.partition(values, k - 1)[k - 1]
+
+    # Every value below the threshold is kept, and the ties at the threshold are kept by index
+    below = numpy.flatnonzero(values < threshold)
+    equal = numpy.flatnonzero(values == threshold)[:k - len(below)]
+    chosen = numpy.concatenate([below, equal])
+
+    return chosen[numpy.lexsort((chosen, values[chosen]))].tolist()
+
+
+def abandon_top_k(query: List[Union[int, float, None]], storages: List[ColumnarStorage], weights: List[float],
+                  k: int, order: List[int] = None, blocked: bool = True, block_size: int = 1024,
+                  chunk: int = 8) -> List[Tuple[float, int, int]]:
+    """
+    Get the ``k`` nearest rows of several storages for a query, with the weighted euclidean distance, abandoning a
+    row as soon as its partial sum of squares is larger than the sum of the ``k``-th nearest row found so far. Only
+    valid with positive weights, since the partial sums must only grow.
+
+    The dimensions are summed in the given ``order``. Putting the dimensions that weigh the most in the distance
+    first (the largest weights, or the largest weighted variances) makes the rows abandoned sooner.
+
+    :param query: The coordinates of the query
+    :param storages: The storages holding the rows
+    :param weights: The weight of each dimension of the query
+    :param k: The number of rows to get
+    :param order: The dimensions of the query, in the order they are summed. If ``None``, they are summed in order.
+    :param blocked: If ``True`` and numpy is installed, ``block_size`` rows are compared at once, ``chunk``
+            dimensions at a time, and the abandoned rows are removed from the block between two chunks. Otherwise, the
+            rows are compared one by one, and abandoned dimension by dimension.
+    :param block_size: The number of rows compared at once by the blocked path
+    :param chunk: The number of dimensions summed at once by the blocked path
+    :return: A ``list`` of ``(distance, storage index, row)`` tuples, from the nearest to the farthest
+
+    >>> storage = ColumnarStorage()
+    >>> storage.extend([([0, 0, 0], None), ([3, 4, 0], None), ([1, None, 1], None)])
+    range(0, 3)
+    >>> abandon_top_k([0, 0, 0], [storage], [1, 1, 1], k=2, order=[2, 1, 0])
+    [(0.0, 0, 0), (1.4142135623730951, 0, 2)]
+    """
+    if k <= 0:
+        return []
+
+    if order is None:
+        order = list(range(len(query)))
+
+    dimensions = [(i, query[i], weights[i]) for i in order if i < len(query) and query[i] is not None]
+
+    if blocked and numpy is not None:
+        return _numpy_abandon_top_k(dimensions, storages, k, block_size, chunk)
+
+    # The k best rows found, as a heap of negated (sum, storage index, row), so the worst one is on top
+    best = []
+    bound = float("inf")
+
+    for storage_index, storage in enumerate(storages):
+        buffer = storage.values()
+        width = storage.width
+        storage_dimensions = [dimension for dimension in dimensions if dimension[0] < width]
+
+        for row in range(len(storage)):
+            base = row * width
+
+            coord_sum = 0
+            for i, query_coord, weight in storage_dimensions:
+                point_coord = buffer[base + i]
+
+                if point_coord == point_coord:
+                    coord_sum += (query_coord - point_coord) ** 2 * weight
+
+                    if coord_sum > bound:
+                        break
+
+            else:
+                candidate = (-coord_sum, -storage_index, -row)
+
+                if len(best) < k:
+                    heapq.heappush(best, candidate)
+
+                elif candidate > best[0]:
+                    heapq.heapreplace(best, candidate)
+
+                if len(best) == k:
+                    bound = -best[0][0]
+
+    return sorted([(finish(-coord_sum), -storage_index, -row) for coord_sum, storage_index, row in best])
+
+
+def _numpy_abandon_top_k(dimensions: List[Tuple[int, float, float]], storages: List[ColumnarStorage], k: int,
+                         block_size: int, chunk: int) -> List[Tuple[float, int, int]]:
+    """
+    The blocked path of :func:`abandon_top_k<EasyKnn.kernels.abandon_top_k>`.
+
+    :param dimensions: The ``(dimension, coordinate, weight)`` of each defined coordinate of the query, in order
+    :return: A ``list`` of ``(distance, storage index, row)`` tuples
+    """
+    best_sums = numpy.empty(0)
+    best_storages = numpy.empty(0, dtype=numpy.int64)
+    best_rows = numpy.empty(0, dtype=numpy.int64)
+    bound = numpy.inf
+
+    for storage_index, storage in enumerate(storages):
+        if len(storage) == 0:
+            continue
+
+        width = storage.width
+        storage_dimensions = [dimension for dimension in dimensions if dimension[0] < width]
+
+        chunks = [(numpy.array([i for i, _, _ in storage_dimensions[start:start + chunk]], dtype=numpy.int64),
+                   numpy.array([coord for _, coord, _ in storage_dimensions[start:start + chunk]], dtype=numpy.float64),
+                   numpy.array([weight for _, _, weight in storage_dimensions[start:start + chunk]],
+                               dtype=numpy.float64))
+                  for start in range(0, len(storage_dimensions), chunk)]
+
+        for start in range(0, len(storage), block_size):
+            matrix = storage.matrix(start, start + block_size)
+            rows = numpy.arange(start, min(start + block_size, len(storage)))
+            sums = numpy.zeros(len(rows))
+
+            for columns, query_coords, chunk_weights in chunks:
+                squares = matrix[rows[:, None] - start, columns] - query_coords
+                sums += numpy.nansum(squares * squares * chunk_weights, axis=1)
+
+                # The rows already farther than the k-th nearest one are abandoned
+                kept = sums <= bound
+                rows, sums = rows[kept], sums[kept]
+
+                if not len(rows):
+                    break
+
+            best_sums = numpy.concatenate([best_sums, sums])
+            best_storages = numpy.concatenate([best_storages, numpy.full(len(rows), storage_index, dtype=numpy.int64)])
+            best_rows = numpy.concatenate([best_rows, rows])
+
+            if len(best_sums) > k:
+                # Ordered by sum, then by storage and row, so the ties are kept like a stable sort would
+                selected = numpy.lexsort((best_rows, best_storages, best_sums))[:k]
+                best_sums, best_storages, best_rows = best_sums[selected], best_storages[selected], best_rows[selected]
+
+            if len(best_sums) == k:
+                bound = best_sums.max()
+
+    selection = numpy.lexsort((best_rows, best_storages, best_sums))
+
+    return [(finish(coord_sum), storage_index, row) for coord_sum, storage_index, row
+            in zip(best_sums[selection].tolist(), best_storages[selection].tolist(), best_rows[selection].tolist())]
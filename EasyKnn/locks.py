@@ -0,0 +1,164 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    A lock shared by any number of readers, or held by a single writer. The :class:`Plan<EasyKnn.plan.Plan>` takes
+    it as a reader for each query, and as a writer whenever one of its :class:`Datasets<EasyKnn.dataset.Dataset>`
+    changes, so that queries from several threads never see a Dataset in the middle of a change.
+
+    A waiting writer goes before the readers that arrive after it, so a steady flow of queries cannot starve the
+    writers. A thread can take the lock again while it holds it, and can read while it writes, but it cannot write
+    while it only reads: this would wait forever for its own read to end.
+
+    >>> lock = ReadWriteLock()
+    >>> with lock.read():
+    ...     with lock.read():
+    ...         lock.readers
+    1
+    >>> with lock.write():
+    ...     with lock.read():
+    ...         lock.writing
+    True
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+
+        self._readers = 0
+        self._writer = None
+        self._writes = 0
+        self._waiting_writers = 0
+
+        # The number of times the current thread took the lock as a reader
+        self._local = threading.local()
+
+    @property
+    def readers(self) -> int:
+        """
+        The number of threads holding the lock as readers.
+
+        :read-only: True
+        """
+        return self._readers
+
+    @property
+    def writing(self) -> bool:
+        """
+        ``True`` if a thread holds the lock as the writer.
+
+        :read-only: True
+        """
+        return self._writer is not None
+
+    def acquire_read(self) -> None:
+        """
+        Take the lock as a reader, waiting for the writer to release it.
+
+        :return: ``None``
+        """
+        reads = getattr(self._local, "reads", 0)
+
+        # A thread already reading or writing does not wait
+        if reads or self._writer == threading.get_ident():
+            self._local.reads = reads + 1
+            return
+
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+
+            self._readers += 1
+
+        self._local.reads = 1
+
+    def release_read(self) -> None:
+        """
+        Release the lock taken by :meth:`acquire_read<EasyKnn.locks.ReadWriteLock.acquire_read>`.
+
+        :return: ``None``
+        """
+        self._local.reads -= 1
+
+        if self._local.reads or self._writer == threading.get_ident():
+            return
+
+        with self._condition:
+            self._readers -= 1
+
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        """
+        Take the lock as the writer, waiting for every reader and the current writer to release it.
+
+        :return: ``None``
+        """
+        me = threading.get_ident()
+
+        with self._condition:
+            if self._writer == me:
+                self._writes += 1
+                return
+
+            if getattr(self._local, "reads", 0):
+                raise RuntimeError("A thread reading cannot write before it stops reading")
+
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+
+            finally:
+                self._waiting_writers -= 1
+
+            self._writer = me
+            self._writes = 1
+
+    def release_write(self) -> None:
+        """
+        Release the lock taken by :meth:`acquire_write<EasyKnn.locks.ReadWriteLock.acquire_write>`.
+
+        :return: ``None``
+        """
+        with self._condition:
+            self._writes -= 1
+
+            if not self._writes:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        """
+        Hold the lock as a reader in a ``with`` block.
+        """
+        self.acquire_read()
+        try:
+            yield self
+
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """
+        Hold the lock as the writer in a ``with`` block.
+        """
+        self.acquire_write()
+        try:
+            yield self
+
+        finally:
+            self.release_write()
+
+
+@contextmanager
+def no_lock():
+    """
+    A ``with`` block holding no lock, used by the :class:`Datasets<EasyKnn.dataset.Dataset>` that are not linked to a
+    :class:`Plan<EasyKnn.plan.Plan>`.
+    """
+    yield None
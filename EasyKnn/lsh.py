@@ -0,0 +1,309 @@
+import bisect
+import math
+import random
+from array import array
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+from EasyKnn import kernels
+from EasyKnn.index import Index
+from EasyKnn.metrics import Metric, get_metric
+from EasyKnn.stats import RunningStatistics
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The number of rows hashed at once
+_CHUNK = 65536
+
+# The hashes of a table are mixed into a single 64 bits key
+_MASK = (1 << 64) - 1
+
+
+class LSHIndex(Index):
+    """
+    An approximate locality-sensitive hashing index over all the :class:`Values<EasyKnn.value.Value>` of a
+    :class:`Plan<EasyKnn.plan.Plan>`. Each of the ``tables`` hash tables puts every value in a bucket, given by
+    ``bits`` random projections of its coordinates. Near values are likely to share a bucket in at least one table, so
+    a query only compares the values of its own bucket in each table, with the exact distance of the Plan. More tables
+    find more neighbors, and more bits make smaller buckets.
+
+    - for the ``"cosine"`` metric, each projection gives the sign of a random hyperplane (sign random projections)
+    - for the ``"euclidean"`` metric, each projection cuts a random direction in intervals of ``bucket_width``
+      (p-stable projections)
+
+    A missing coordinate is replaced by the mean of its dimension to be hashed, while the distances skip it, like
+    :meth:`Plan._distance<EasyKnn.plan.Plan._distance>` does. The index is only used with the metric it was built
+    for, and it is built again in a time proportional to the number of values (plus the sort of the buckets) whenever
+    a Dataset of the Plan changes. When the buckets of a query hold fewer than ``k`` values, all the values are
+    compared instead.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to index
+    :param tables: The number of hash tables
+    :param bits: The number of projections of each table
+    :param metric: ``"euclidean"`` or ``"cosine"``, or the :class:`Metric<EasyKnn.metrics.Metric>`
+    :param bucket_width: The width of the intervals of the euclidean projections. If ``None``, four times the square
+            root of the total variance of the values is used.
+    :param seed: The seed of the random projections
+
+    >>> from EasyKnn import Plan, Dataset, Value
+    >>> plan = Plan()
+    >>> dataset = Dataset()
+    >>> dataset.add_values([Value([x, y]) for x in range(10) for y in range(10)])
+    >>> plan.add_dataset(dataset)
+    >>> index = LSHIndex(plan, tables=4, bits=6)
+    >>> index.query([2, 7.25], [1, 1], k=2)
+    [(0.25, 0, 27), (0.75, 0, 28)]
+    >>> index.saved_evaluations > 0
+    True
+    """
+
+    # The metric is saved in the options
+    _UNSAVED = Index._UNSAVED + ("_metric",)
+
+    def __init__(self, plan: "Plan", tables: int = 8, bits: int = 12, metric: Union[str, Metric] = "euclidean",
+                 bucket_width: float = None, seed: int = 0):
+        super().__init__(plan)
+
+        if tables < 1 or bits < 1:
+            raise ValueError("An LSH index needs at least 1 table of 1 bit")
+
+        self._metric = get_metric(metric)
+
+        if self._metric.name not in ("euclidean", "cosine"):
+            raise ValueError(f"An LSH index cannot be built for {self._metric.name}")
+
+        if bucket_width is not None and bucket_width <= 0:
+            raise ValueError("The bucket width must be positive")
+
+        self._tables = tables
+        self._bits = bits
+        self._bucket_width = bucket_width
+        self._seed = seed
+
+        self.build()
+
+    def build(self) -> None:
+        storages = [dataset._columns() for dataset in self._plan.datasets]
+        statistics = RunningStatistics.combine([dataset.statistics for dataset in self._plan.datasets])
+
+        self._width = max([storage.width for storage in storages] or [0])
+
+        # A missing coordinate is hashed as the mean of its dimension
+        self._fill = [0.0 if mean is None else mean for mean in statistics.average()]
+        self._fill += [0.0] * (self._width - len(self._fill))
+
+        width = self._bucket_width
+        if width is None:
+            # The standard deviation of the projections is the square root of the total variance
+            width = 4 * math.sqrt(sum(statistics.variance())) or 1.0
+        self._width_used = width
+
+        generator = random.Random(self._seed)
+        projections = self._tables * self._bits
+
+        # The random directions, one row of the matrix per projection, the random offsets of the euclidean
+        # projections, and the odd multipliers mixing the hashes of a table into a key
+        self._projections = array("d", [generator.gauss(0, 1) for _ in range(projections * self._width)])
+        self._offsets = array("d", [generator.uniform(0, width) for _ in range(projections)])
+        self._multipliers = array("q", [_signed(generator.getrandbits(64) | 1) for _ in range(self._bits)])
+
+        keys = [array("q") for _ in range(self._tables)]
+        self._dataset_indexes = array("q")
+        self._dataset_rows = array("q")
+
+        for dataset_index, storage in enumerate(storages):
+            for start in range(0, len(storage), _CHUNK):
+                stop = min(start + _CHUNK, len(storage))
+
+                for table, table_keys in enumerate(self._hash_rows(storage, start, stop)):
+                    keys[table].extend(table_keys)
+
+                self._dataset_indexes.extend(array("q", [dataset_index]) * (stop - start))
+                self._dataset_rows.extend(range(start, stop))
+
+        self._size = len(self._dataset_rows)
+        self._store_buckets(keys)
+
+        self._stale = False
+
+    def _options(self) -> dict:
+        return {"tables": self._tables, "bits": self._bits, "metric": self._metric.name,
+                "bucket_width": self._bucket_width, "seed": self._seed}
+
+    @classmethod
+    def _restore(cls, plan, options, state):
+        index = super()._restore(plan, options, state)
+        index._metric = get_metric(options["metric"])
+
+        return index
+
+    def supports(self, query: List[Union[int, float, None]], weights: List[float], k: int, metric: Metric) -> bool:
+        return k > 0 and metric.name == self._metric.name and all([weight >= 0 for weight in weights])
+
+    def _store_buckets(self, keys: List[array]) -> None:
+        """
+        Sort the values of each table by key, so that the values of a bucket are contiguous.
+
+        :param keys: The key of each value, for each table
+        :return: ``None``
+        """
+        # For each table, the sorted keys of its buckets start at ``_table_starts[table]`` in ``_bucket_keys``. The
+        # values of a bucket are ``_positions[_bucket_offsets[bucket]:_bucket_offsets[bucket + 1]]``.
+        self._table_starts = array("q", [0])
+        self._bucket_keys = array("q")
+        self._bucket_offsets = array("q", [0])
+        self._positions = array("q")
+
+        for table_keys in keys:
+            if numpy is not None:
+                table_keys = numpy.frombuffer(table_keys, dtype=numpy.int64)
+                order = numpy.argsort(table_keys, kind="stable")
+                unique, counts = numpy.unique(table_keys[order], return_counts=True)
+
+                self._bucket_keys.frombytes(unique.tobytes())
+                self._bucket_offsets.frombytes((numpy.cumsum(counts) + len(self._positions)).tobytes())
+                self._positions.frombytes(order.astype(numpy.int64).tobytes())
+
+            else:
+                order = sorted(range(len(table_keys)), key=table_keys.__getitem__)
+
+                for position in order:
+                    if not self._bucket_keys or len(self._bucket_keys) == self._table_starts[-1] or \
+                            self._bucket_keys[-1] != table_keys[position]:
+                        self._bucket_keys.append(table_keys[position])
+                        self._bucket_offsets.append(len(self._positions))
+
+                    self._positions.append(position)
+                    self._bucket_offsets[-1] = len(self._positions)
+
+            self._table_starts.append(len(self._bucket_keys))
+
+    def _hash_rows(self, storage, start: int, stop: int) -> List[array]:
+        """
+        Get the key of each row of a block, in each table.
+
+        :param storage: The :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>` holding the rows
+        :param start: The first row of the block
+        :param stop: The row after the last row of the block
+        :return: For each table, an ``array('q')`` with the key of each row
+        """
+        columns = storage.width
+
+        # The dimensions past the width of the storage are missing, so they are filled too
+        if numpy is not None:
+            matrix = numpy.tile(numpy.array(self._fill, dtype=numpy.float64), (stop - start, 1))
+            matrix[:, :columns] = storage.matrix(start, stop)
+            matrix = numpy.where(numpy.isnan(matrix), numpy.array(self._fill, dtype=numpy.float64), matrix)
+
+            projections = numpy.frombuffer(self._projections, dtype=numpy.float64).reshape(-1, self._width)
+            return [array("q", keys.tobytes()) for keys in self._numpy_keys(matrix @ projections.T)]
+
+        keys = [array("q") for _ in range(self._tables)]
+        buffer = storage.values(start, stop)
+
+        for base in range(0, (stop - start) * columns, columns):
+            point = [coord if coord == coord else fill
+                     for coord, fill in zip(buffer[base:base + columns], self._fill)] + self._fill[columns:]
+
+            for table, key in enumerate(self._keys(point)):
+                keys[table].append(key)
+
+        return keys
+
+    def _numpy_keys(self, projected) -> list:
+        """
+        Same as :meth:`_keys<EasyKnn.lsh.LSHIndex._keys>`, for a ``(rows, projections)`` numpy array of projections.
+
+        :return: A numpy array of keys for each table
+        """
+        if self._metric.name == "cosine":
+            hashes = (projected >= 0).astype(numpy.int64)
+
+        else:
+            hashes = numpy.floor((projected + numpy.frombuffer(self._offsets, dtype=numpy.float64))
+                                 / self._width_used).astype(numpy.int64)
+
+        multipliers = numpy.frombuffer(self._multipliers, dtype=numpy.int64)
+
+        # The products wrap around 64 bits, like the Python version
+        with numpy.errstate(over="ignore"):
+            return [(hashes[:, table * self._bits:(table + 1) * self._bits] * multipliers).sum(axis=1)
+                    for table in range(self._tables)]
+
+    def _keys(self, point: List[float]) -> List[int]:
+        """
+        Get the key of a point in each table.
+
+        :param point: The coordinates of the point, without any missing one
+        :return: A ``list`` with the key of the point in each table
+        """
+        projections = self._projections
+        width = self._width
+
+        keys = []
+        for table in range(self._tables):
+            key = 0
+
+            for bit in range(self._bits):
+                projection = table * self._bits + bit
+                base = projection * width
+                projected = sum([coord * projections[base + i] for i, coord in enumerate(point)])
+
+                if self._metric.name == "cosine":
+                    hashed = 1 if projected >= 0 else 0
+
+                else:
+                    hashed = math.floor((projected + self._offsets[projection]) / self._width_used)
+
+                key += hashed * self._multipliers[bit]
+
+            keys.append(_signed(key & _MASK))
+
+        return keys
+
+    def query(self, query: List[Union[int, float, None]], weights: List[float], k: int,
+              use_abs: bool = True) -> List[Tuple[float, int, int]]:
+        self._evaluations = 0
+
+        if not self._size or k <= 0:
+            return []
+
+        point = [query[i] if i < len(query) and query[i] is not None else self._fill[i] for i in range(self._width)]
+
+        # We gather the values of the bucket of the query in each table
+        positions = set()
+        for table, key in enumerate(self._keys(point)):
+            start, stop = self._table_starts[table], self._table_starts[table + 1]
+            bucket = bisect.bisect_left(self._bucket_keys, key, start, stop)
+
+            if bucket < stop and self._bucket_keys[bucket] == key:
+                positions.update(self._positions[self._bucket_offsets[bucket]:self._bucket_offsets[bucket + 1]])
+
+        # We compare all the values instead when the buckets do not hold enough of them
+        if len(positions) < k:
+            positions = range(self._size)
+
+        rows = {}
+        for position in sorted(positions):
+            rows.setdefault(self._dataset_indexes[position], []).append(self._dataset_rows[position])
+
+        self._evaluations = len(positions)
+
+        storages = [dataset._columns() for dataset in self._plan.datasets]
+
+        return sorted(kernels.rerank(query, storages, weights, sorted(rows.items()), k, use_abs, self._metric))
+
+
+def _signed(value: int) -> int:
+    """
+    Read an unsigned 64 bits integer as a signed one, the way numpy wraps its int64 products.
+
+    :param value: An integer between ``0`` and ``2 ** 64 - 1``
+    :return: The same 64 bits, as a signed integer
+    """
+    return value - (1 << 64) if value >= 1 << 63 else value
@@ -0,0 +1,341 @@
+from typing import List, Union
+
+from EasyKnn import kernels
+from EasyKnn.storage import ColumnarStorage
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Metric:
+    """
+    Base class of the distances :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>` can use. A metric compares two
+    lists of coordinates dimension by dimension, with the same rules as the default euclidean distance:
+
+    - a dimension missing (``None``) in either list is skipped
+    - each dimension is multiplied by its weight, and an undefined weight is 1
+    - a negative result (caused by negative weights) is made positive if ``use_abs`` is ``True``
+
+    :attr:`is_metric` tells if the distance is a true metric (the triangle inequality holds) when there are no
+    missing coordinates and no negative weights. Indexes that prune with the triangle inequality need it.
+    """
+
+    #: The name of the metric, as given to :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>`
+    name = None
+
+    #: ``True`` if the triangle inequality holds for this distance
+    is_metric = False
+
+    def pair(self, query: List[Union[int, float, None]], point: List[Union[int, float, None]],
+             weights: List[float], use_abs: bool = True) -> float:
+        """
+        Get the distance between two lists of coordinates. Only the dimensions of both lists are compared.
+
+        :param query: The coordinates of the searched :class:`Value<EasyKnn.value.Value>`
+        :param point: The coordinates of the compared :class:`Value<EasyKnn.value.Value>`
+        :param weights: The weight of each dimension of the query
+        :param use_abs: If True, the absolute value of the distance will be returned
+        :return: The distance
+        """
+        raise NotImplementedError
+
+    def _numpy_block(self, query, matrix, weights, use_abs: bool):
+        """
+        Same as :meth:`pair<EasyKnn.metrics.Metric.pair>`, for every row of a matrix at once.
+
+        :param query: A numpy array of coordinates, NaN for the missing ones
+        :param matrix: A ``(rows, columns)`` numpy array, NaN for the missing coordinates
+        :param weights: A numpy array with the weight of each column
+        :param use_abs: If True, the absolute value of the distances will be returned
+        :return: A numpy array with the distance of each row
+        """
+        raise NotImplementedError
+
+    def block(self, query: List[Union[int, float, None]], storage: ColumnarStorage, weights: List[float],
+              use_abs: bool = True, start: int = 0, stop: int = None) -> List[float]:
+        """
+        Get the distances between a query and a block of rows of a
+        :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>`, like
+        :func:`kernels.distances<EasyKnn.kernels.distances>` does for the euclidean distance.
+
+        :param query: The coordinates of the searched :class:`Value<EasyKnn.value.Value>`
+        :param storage: The storage holding the rows
+        :param weights: The weight of each dimension of the query
+        :param use_abs: If True, the absolute value of the distances will be returned
+        :param start: The first row of the block
+        :param stop: The row after the last row of the block. If ``None``, the block ends with the storage.
+        :return: A ``list`` with the distance of each row of the block
+        """
+        if stop is None:
+            stop = len(storage)
+
+        if stop <= start:
+            return []
+
+        width = storage.width
+        columns = min(width, len(query))
+
+        if numpy is not None:
+            matrix = storage.matrix(start, stop)[:, :columns]
+            query_row = numpy.array([numpy.nan if coord is None else coord for coord in query[:columns]],
+                                    dtype=numpy.float64)
+
+            return self._numpy_block(query_row, matrix, numpy.array(weights[:columns], dtype=numpy.float64),
+                                     use_abs).tolist()
+
+        buffer = storage.values(start, stop)
+        query = query[:columns]
+
+        return [self.pair(query, [None if coord != coord else coord for coord in buffer[base:base + columns]],
+                          weights, use_abs)
+                for base in range(0, (stop - start) * width, width)]
+
+    @staticmethod
+    def _signed(result: float, use_abs: bool) -> float:
+        """
+        Apply ``use_abs`` to a distance.
+        """
+        return abs(result) if use_abs else result
+
+    def __repr__(self):
+        return self.name
+
+
+class Euclidean(Metric):
+    """
+    The weighted euclidean distance, ``sqrt(sum(w * (q - p) ** 2))``. This is the default distance of the
+    :class:`Plan<EasyKnn.plan.Plan>`.
+
+    >>> Euclidean().pair([1, 2, None], [4, 6, 1], [1, 1, 1])
+    5.0
+    """
+
+    name = "euclidean"
+    is_metric = True
+
+    def pair(self, query, point, weights, use_abs=True):
+        coord_sum = 0
+        for i, (query_coord, point_coord) in enumerate(zip(query, point)):
+            if query_coord is not None and point_coord is not None:
+                coord_sum += (query_coord - point_coord) ** 2 * weights[i]
+
+        return kernels.finish(coord_sum, use_abs)
+
+    def block(self, query, storage, weights, use_abs=True, start=0, stop=None):
+        return kernels.distances(query, storage, weights, use_abs, start, stop)
+
+
+class Minkowski(Metric):
+    """
+    The weighted Minkowski distance of order ``p``, ``sum(w * |q - p| ** p) ** (1 / p)``. It is a true metric when
+    ``p`` is at least 1.
+
+    :param p: The order of the distance
+
+    >>> Minkowski(3).pair([0, 0], [3, 3], [1, 1])
+    3.7797631496846193
+    """
+
+    def __init__(self, p: float = 2):
+        if p <= 0:
+            raise ValueError("The order of a Minkowski distance must be positive")
+
+        self.p = p
+        self.name = f"minkowski({p})"
+        self.is_metric = p >= 1
+
+    def _root(self, coord_sum, use_abs):
+        result = abs(coord_sum) ** (1 / self.p)
+        return result if coord_sum >= 0 or use_abs else -result
+
+    def pair(self, query, point, weights, use_abs=True):
+        coord_sum = 0
+        for i, (query_coord, point_coord) in enumerate(zip(query, point)):
+            if query_coord is not None and point_coord is not None:
+                coord_sum += abs(query_coord - point_coord) ** self.p * weights[i]
+
+        return self._root(coord_sum, use_abs)
+
+    def _numpy_block(self, query, matrix, weights, use_abs):
+        sums = numpy.nansum(numpy.abs(matrix - query) ** self.p * weights, axis=1)
+
+        result = numpy.abs(sums) ** (1 / self.p)
+        return result if use_abs else numpy.where(sums < 0, -result, result)
+
+
+class Manhattan(Metric):
+    """
+    The weighted Manhattan distance, ``sum(w * |q - p|)``.
+
+    >>> Manhattan().pair([1, 2, None], [4, 6, 1], [1, 1, 1])
+    7
+    """
+
+    name = "manhattan"
+    is_metric = True
+
+    def pair(self, query, point, weights, use_abs=True):
+        coord_sum = 0
+        for i, (query_coord, point_coord) in enumerate(zip(query, point)):
+            if query_coord is not None and point_coord is not None:
+                coord_sum += abs(query_coord - point_coord) * weights[i]
+
+        return self._signed(coord_sum, use_abs)
+
+    def _numpy_block(self, query, matrix, weights, use_abs):
+        sums = numpy.nansum(numpy.abs(matrix - query) * weights, axis=1)
+        return numpy.abs(sums) if use_abs else sums
+
+
+class Chebyshev(Metric):
+    """
+    The weighted Chebyshev distance, ``max(w * |q - p|)``. It is 0 when no dimension can be compared.
+
+    >>> Chebyshev().pair([1, 2, None], [4, 6, 1], [1, 1, 1])
+    4
+    """
+
+    name = "chebyshev"
+    is_metric = True
+
+    def pair(self, query, point, weights, use_abs=True):
+        terms = [abs(query_coord - point_coord) * weights[i]
+                 for i, (query_coord, point_coord) in enumerate(zip(query, point))
+                 if query_coord is not None and point_coord is not None]
+
+        return self._signed(max(terms) if terms else 0, use_abs)
+
+    def _numpy_block(self, query, matrix, weights, use_abs):
+        terms = numpy.abs(matrix - query) * weights
+        missing = numpy.isnan(terms)
+
+        result = numpy.where(missing, -numpy.inf, terms).max(axis=1, initial=-numpy.inf)
+        result = numpy.where(missing.all(axis=1), 0.0, result)
+
+        return numpy.abs(result) if use_abs else result
+
+
+class Hamming(Metric):
+    """
+    The weighted Hamming distance, the sum of the weights of the dimensions where the coordinates differ.
+
+    >>> Hamming().pair([1, 2, None, 4], [1, 3, 1, 5], [1, 1, 1, 0.5])
+    1.5
+    """
+
+    name = "hamming"
+    is_metric = True
+
+    def pair(self, query, point, weights, use_abs=True):
+        coord_sum = 0
+        for i, (query_coord, point_coord) in enumerate(zip(query, point)):
+            if query_coord is not None and point_coord is not None and query_coord != point_coord:
+                coord_sum += weights[i]
+
+        return self._signed(coord_sum, use_abs)
+
+    def _numpy_block(self, query, matrix, weights, use_abs):
+        differences = matrix - query
+
+        # NaN != 0 is True, so the missing dimensions are removed explicitly
+        differ = (differences != 0) & ~numpy.isnan(differences)
+        sums = (differ * weights).sum(axis=1)
+
+        return numpy.abs(sums) if use_abs else sums
+
+
+class Cosine(Metric):
+    """
+    The weighted cosine distance, ``1 - sum(w * q * p) / sqrt(sum(w * q ** 2) * sum(w * p ** 2))``, computed on the
+    dimensions defined in both lists. It is 1 when either list is null on these dimensions. It is not a true metric.
+
+    >>> Cosine().pair([1, 0, None], [0, 1, 1], [1, 1, 1])
+    1.0
+    >>> Cosine().pair([1, 1], [2, 2], [1, 1])
+    0.0
+    """
+
+    name = "cosine"
+    is_metric = False
+
+    def pair(self, query, point, weights, use_abs=True):
+        dot = query_norm = point_norm = 0
+        for i, (query_coord, point_coord) in enumerate(zip(query, point)):
+            if query_coord is not None and point_coord is not None:
+                dot += query_coord * point_coord * weights[i]
+                query_norm += query_coord ** 2 * weights[i]
+                point_norm += point_coord ** 2 * weights[i]
+
+        denominator = (abs(query_norm) * abs(point_norm)) ** 0.5
+        if denominator == 0:
+            return 1.0
+
+        return self._signed(1 - dot / denominator, use_abs)
+
+    def _numpy_block(self, query, matrix, weights, use_abs):
+        defined = ~numpy.isnan(matrix - query)
+        query_zeroed = numpy.where(defined, query, 0.0)
+        point_zeroed = numpy.where(defined, matrix, 0.0)
+
+        dot = (query_zeroed * point_zeroed * weights).sum(axis=1)
+        denominator = numpy.sqrt(numpy.abs((query_zeroed ** 2 * weights).sum(axis=1))
+                                 * numpy.abs((point_zeroed ** 2 * weights).sum(axis=1)))
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            result = numpy.where(denominator == 0, 1.0, 1 - dot / denominator)
+
+        return numpy.abs(result) if use_abs else result
+
+
+#: The metrics that can be given by name to :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>`
+METRICS = {
+    "euclidean": Euclidean(),
+    "manhattan": Manhattan(),
+    "chebyshev": Chebyshev(),
+    "cosine": Cosine(),
+    "hamming": Hamming(),
+}
+
+
+def get_metric(metric: Union[str, Metric]) -> Metric:
+    """
+    Get a :class:`Metric<EasyKnn.metrics.Metric>` from its name, or return the given Metric. A Minkowski distance is
+    named with its order, ``"minkowski:<p>"`` (or ``"minkowski(<p>)"``, its :attr:`name<EasyKnn.metrics.Metric.name>`):
+    ``"minkowski"`` alone is refused, rather than silently using an order of 2.
+
+    :param metric: The name of the metric, or a :class:`Metric<EasyKnn.metrics.Metric>`
+    :return: The :class:`Metric<EasyKnn.metrics.Metric>`
+
+    >>> get_metric("manhattan")
+    manhattan
+    >>> get_metric(Minkowski(3))
+    minkowski(3)
+    >>> get_metric("minkowski:3"), get_metric("minkowski(1.5)")
+    (minkowski(3), minkowski(1.5))
+    >>> get_metric("minkowski")
+    Traceback (most recent call last):
+    ...
+    ValueError: A Minkowski distance needs its order, like "minkowski:3" or Minkowski(3)
+    """
+    if isinstance(metric, Metric):
+        return metric
+
+    if metric in METRICS:
+        return METRICS[metric]
+
+    if metric == "minkowski":
+        raise ValueError('A Minkowski distance needs its order, like "minkowski:3" or Minkowski(3)')
+
+    for prefix, suffix in (("minkowski:", ""), ("minkowski(", ")")):
+        if metric.startswith(prefix) and metric.endswith(suffix):
+            try:
+                p = float(metric[len(prefix):len(metric) - len(suffix)])
+            except ValueError:
+                break
+
+            # An integer order is named like Minkowski(3) names it
+            return Minkowski(int(p) if p.is_integer() else p)
+
+    raise ValueError(f"Unknown metric: {metric}")
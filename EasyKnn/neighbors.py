@@ -1,8 +1,11 @@
-from typing import List
+from contextlib import ExitStack, contextmanager
+from typing import Callable, List, Union
 
-from EasyKnn.errors import ReadOnlyAttributeError, CriticalDeletionError
+from EasyKnn import kernels
+from EasyKnn.errors import ReadOnlyAttributeError, CriticalDeletionError, StaleNeighborsError
 from EasyKnn.dataset import Dataset
 from EasyKnn.point import Point
+from EasyKnn.profiling import QueryStats, stage
 
 
 class Neighbors:
@@ -11,17 +14,155 @@ class Neighbors:
     It is used to store the neighbors and distances of a given :class:`Value<EasyKnn.value.Value>`.
 
     :param neighbors: A list of :class:`Points<EasyKnn.point.Point>`, representing the neighbors of the value.
+    :param stats: The :class:`QueryStats<EasyKnn.profiling.QueryStats>` of a profiled query, or ``None``
     """
-    def __init__(self, neighbors: List[Point]):
+    def __init__(self, neighbors: List[Point], stats: QueryStats = None):
 
         self._neighbors = neighbors
+        self._stats = stats
 
         self._dataset_neighbors = []
+        self._dataset_averages = {}
 
-        self._average_dist = sum([neighbor.distance for neighbor in self.neighbors]) / len(self.neighbors)
+        # A Plan without any Value gives no neighbors, and no average distance
+        self._average_dist = sum([neighbor.distance for neighbor in self.neighbors]) / len(self.neighbors) \
+            if self.neighbors else None
+
+        # Only used when the Neighbors are created by _from_distances or _from_found
+        self._datasets = None
+        self._distances = None
+        self._versions = None
+        self._nearest = None
+        self._farthest = None
+        self._full_distances = None
 
         self._process_data()
 
+    @classmethod
+    def _from_distances(cls, datasets: List[Dataset], distances: List[List[float]], k: int,
+                        dimension: int = 0, stats: QueryStats = None) -> "Neighbors":
+        """
+        Create a Neighbors object from the raw distances of every :class:`Dataset<EasyKnn.dataset.Dataset>`, keeping
+        only the ``k`` nearest and the ``k`` farthest :class:`Points<EasyKnn.point.Point>`. The full sorted list of
+        :attr:`neighbors<EasyKnn.neighbors.Neighbors.neighbors>` is only created if it is read, or if
+        :meth:`nearest_neighbor<EasyKnn.neighbors.Neighbors.nearest_neighbor>` is asked for more than ``k`` Points.
+        This methode should only be called by the Plan class.
+
+        :param datasets: The Datasets of the Plan
+        :param distances: For each Dataset, the distance of each of its Values, in order
+        :param k: The number of Points to create on each side
+        :param dimension: The dimension the coordinates of the Points are padded to
+        :param stats: The :class:`QueryStats<EasyKnn.profiling.QueryStats>` of a profiled query, or ``None``
+        :return: a Neighbors object
+        """
+        neighbors = cls.__new__(cls)
+
+        neighbors._neighbors = None
+        neighbors._stats = stats
+        neighbors._datasets = datasets
+        neighbors._distances = distances
+        neighbors._dimension = dimension
+        neighbors._full_distances = None
+
+        # The distances are only the ones of the Datasets as long as they do not change
+        neighbors._versions = [dataset._version for dataset in datasets]
+
+        with stage(stats, "ranking"):
+            neighbors._rank(distances)
+
+        with stage(stats, "selection"):
+            nearest, farthest = kernels.select(distances, k)
+
+        with stage(stats, "points"):
+            neighbors._nearest = [datasets[index]._to_point(row, distance, dimension)
+                                  for distance, index, row in nearest]
+            neighbors._farthest = [datasets[index]._to_point(row, distance, dimension)
+                                   for distance, index, row in farthest]
+
+        return neighbors
+
+    @classmethod
+    def _from_found(cls, points: List[Point], datasets: List[Dataset],
+                    full_distances: Callable[[], List[List[float]]], stats: QueryStats = None) -> "Neighbors":
+        """
+        Create a Neighbors object from the :class:`Points<EasyKnn.point.Point>` found by an engine comparing only some
+        of the values: an index, the pool or an early-abandoning scan. The Datasets are ranked like
+        :meth:`_from_distances<EasyKnn.neighbors.Neighbors._from_distances>` ranks them, from the distances of all
+        their values, computed the first time the ranking or the average distance is read. This methode should only be
+        called by the Plan class.
+
+        :param points: The found Points
+        :param datasets: The Datasets of the Plan
+        :param full_distances: A function giving, for each Dataset, the distance of each of its Values, in order
+        :param stats: The :class:`QueryStats<EasyKnn.profiling.QueryStats>` of a profiled query, or ``None``
+        :return: a Neighbors object
+        """
+        neighbors = cls.__new__(cls)
+
+        neighbors._stats = stats
+        neighbors._datasets = datasets
+        neighbors._distances = None
+        neighbors._versions = [dataset._version for dataset in datasets]
+        neighbors._nearest = None
+        neighbors._farthest = None
+        neighbors._full_distances = full_distances
+
+        with stage(stats, "sorting"):
+            neighbors._neighbors = sorted(points, key=lambda x: x.distance)
+
+        return neighbors
+
+    def _rank(self, distances: List[List[float]]) -> None:
+        """
+        Rank the :class:`Datasets<EasyKnn.dataset.Dataset>` by the average distance of their values, and get the
+        average distance of all the values.
+
+        :param distances: For each Dataset, the distance of each of its Values
+        :return: ``None``
+        """
+        # A Plan without any Value gives no average distance, like __init__
+        count = sum([len(dataset_distances) for dataset_distances in distances])
+        self._average_dist = sum([sum(dataset_distances) for dataset_distances in distances]) / count \
+            if count else None
+
+        # Same ranking as _process_data, but from the sum of the distances of each dataset
+        averages = {}
+        for dataset, dataset_distances in zip(self._datasets, distances):
+            if dataset_distances:
+                averages[dataset] = sum(dataset_distances) / len(dataset_distances)
+
+        self._dataset_averages = averages
+        self._dataset_neighbors = sorted(averages, key=lambda x: averages[x])
+
+    @contextmanager
+    def _reading(self):
+        """
+        Hold the lock of the Plan as a reader in a ``with`` block, while the Neighbors read their Datasets again.
+
+        :exception StaleNeighborsError: If one of the Datasets changed since the query
+        """
+        with ExitStack() as locks:
+            for dataset in self._datasets:
+                locks.enter_context(dataset._reading())
+
+            if [dataset._version for dataset in self._datasets] != self._versions:
+                raise StaleNeighborsError("The datasets changed since the neighbors were searched")
+
+            yield
+
+    def _ranked(self) -> None:
+        """
+        Rank the Datasets of the Neighbors created by :meth:`_from_found<EasyKnn.neighbors.Neighbors._from_found>`,
+        the first time the ranking is needed.
+
+        :return: ``None``
+        """
+        if self._full_distances is not None:
+            with stage(self._stats, "ranking"), self._reading():
+                self._rank(self._full_distances())
+
+            self._full_distances = None
+
     @property
     def neighbors(self) -> List[Point]:
         """
@@ -29,7 +170,20 @@ class Neighbors:
         :class:`Datasets<EasyKnn.dataset.Dataset>` from the :class:`Plan<EasyKnn.plan.Plan>`.
 
         :read-only: True
+        :exception StaleNeighborsError: If the query asked for ``k`` Points, and one of the Datasets changed before the
+                   other Points were first read
         """
+        if self._neighbors is None:
+            # We create all the Points the first time they are needed, already sorted by the distance. The rows are
+            # copied while the Datasets cannot change.
+            with stage(self._stats, "points"), self._reading():
+                points = [dataset._to_point(row, distance, self._dimension)
+                          for dataset, dataset_distances in zip(self._datasets, self._distances)
+                          for row, distance in enumerate(dataset_distances)]
+
+            with stage(self._stats, "sorting"):
+                self._neighbors = sorted(points, key=lambda x: x.distance)
+
         return self._neighbors
 
     @neighbors.setter
@@ -46,7 +200,10 @@ class Neighbors:
         A ``list`` of all the :class:`Datasets<EasyKnn.dataset.Dataset>` used in the :class:`Plan<EasyKnn.plan.Plan>`.
 
         :read-only: True
+        :exception StaleNeighborsError: If the query only compared some of the values, and one of the Datasets changed
+                   before the ranking was first read
         """
+        self._ranked()
         return self._dataset_neighbors
 
     @dataset_neighbors.setter
@@ -57,6 +214,25 @@ class Neighbors:
     def dataset_neighbors(self, *args):
         raise CriticalDeletionError("The dataset_neighbors attribute cannot be deleted")
 
+    @property
+    def stats(self) -> QueryStats:
+        """
+        The :class:`QueryStats<EasyKnn.profiling.QueryStats>` of the query, with the time spent in each of its stages
+        and the counters of its work, or ``None`` if the query was not profiled. See the ``profile`` parameter of
+        :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>`.
+
+        :read-only: True
+        """
+        return self._stats
+
+    @stats.setter
+    def stats(self, *args):
+        raise ReadOnlyAttributeError("The stats attribute is read-only")
+
+    @stats.deleter
+    def stats(self, *args):
+        raise CriticalDeletionError("The stats attribute cannot be deleted")
+
     @property
     def average_dist(self) -> float:
         """
@@ -64,7 +240,10 @@ class Neighbors:
         :class:`Value<EasyKnn.value.Value>`.
 
         :read-only: True
+        :exception StaleNeighborsError: If the query only compared some of the values, and one of the Datasets changed
+                   before the average distance was first read
         """
+        self._ranked()
         return self._average_dist
 
     @average_dist.setter
@@ -75,6 +254,28 @@ class Neighbors:
     def average_dist(self, *args):
         raise CriticalDeletionError("The average_dist attribute cannot be deleted")
 
+    def dataset_average_dist(self, dataset: Dataset) -> Union[float, None]:
+        """
+        Get the average distance between the :class:`Points<EasyKnn.point.Point>` of a
+        :class:`Dataset<EasyKnn.dataset.Dataset>` and the :class:`Value<EasyKnn.value.Value>`, used to rank the
+        :attr:`dataset_neighbors<EasyKnn.neighbors.Neighbors.dataset_neighbors>`.
+
+        :param dataset: A Dataset of the :class:`Plan<EasyKnn.plan.Plan>`
+        :return: The average distance, or ``None`` if the Dataset has no Value
+        :exception StaleNeighborsError: If the query only compared some of the values, and one of the Datasets changed
+                   before the ranking was first read
+
+        >>> from EasyKnn import Plan, Value
+        >>> plan = Plan()
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([1, 0]), Value([3, 0])])
+        >>> plan.add_dataset(dataset)
+        >>> plan.neighbors(Value([0, 0])).dataset_average_dist(dataset)
+        2.0
+        """
+        self._ranked()
+        return self._dataset_averages.get(dataset)
+
     def _process_data(self) -> None:
         """
         Process the data of all the :attr:`Plan.datasets<EasyKnn.plan.Plan.Datasets>`, in order to obtain the nearest datasets.
@@ -84,27 +285,33 @@ class Neighbors:
         """
 
         # We start by ranking the datasets by the average distance of the neighbors
-        count = {}
+        with stage(self._stats, "ranking"):
+            count = {}
+            points = {}
 
-        for neighbor in self.neighbors:
+            for neighbor in self.neighbors:
 
-            if neighbor.dataset in count:
-                count[neighbor.dataset] += neighbor.distance
+                if neighbor.dataset in count:
+                    count[neighbor.dataset] += neighbor.distance
+                    points[neighbor.dataset] += 1
 
-            else:
-                count[neighbor.dataset] = neighbor.distance
+                else:
+                    count[neighbor.dataset] = neighbor.distance
+                    points[neighbor.dataset] = 1
 
-        # We save each average distance in each dataset
-        for dataset in count:
-            dataset._average_dist = count[dataset] / len(dataset.data)
+            # We keep the average distance of each dataset in the Neighbors: several queries may run at once
+            for dataset in count:
+                count[dataset] = count[dataset] / points[dataset]
 
-        #  We sort the datasets by the average distance
+            # We sort the datasets by the average distance
 
-        self._dataset_neighbors = sorted(count.keys(), key=lambda x: x.average_dist)
+            self._dataset_averages = count
+            self._dataset_neighbors = sorted(count.keys(), key=lambda x: count[x])
 
         # We now sort the values by the distance
 
-        self._neighbors = sorted(self.neighbors, key=lambda x: x.distance)
+        with stage(self._stats, "sorting"):
+            self._neighbors = sorted(self.neighbors, key=lambda x: x.distance)
 
     def nearest_neighbor(self, k: int = 1) -> List[Point]:
         """
@@ -114,6 +321,14 @@ class Neighbors:
         :param k: The number of neighbors to get. Default is 1
         :return: The ``k`` nearest :class:`Points<EasyKnn.point.Point>` of the :class:`Value<EasyKnn.value.Value>`.
         """
+        if self._neighbors is None:
+            # Only the nearest and farthest Points have been created yet, they may be enough
+            if 0 <= k <= len(self._nearest):
+                return self._nearest[:k]
+
+            elif k < 0 and -k <= len(self._farthest):
+                return self._farthest[:-k]
+
         if k >= 0:
 
             return self.neighbors[:k]
@@ -0,0 +1,266 @@
+import multiprocessing
+import threading
+from array import array
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+from EasyKnn import kernels
+from EasyKnn.metrics import Metric
+from EasyKnn.storage import ColumnarStorage, DTYPES
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+
+# The shared memory blocks a worker process is attached to, by name, with the publication of each one
+_attached = {}
+
+
+class _SharedStorage(ColumnarStorage):
+    """
+    A read-only view over rows of a storage copied in shared memory. It has everything the kernels read from a
+    :class:`ColumnarStorage<EasyKnn.storage.ColumnarStorage>`.
+    """
+
+    def __init__(self, buffer: memoryview, width: int, count: int, dtype: str, lows: List[float],
+                 highs: List[float]):
+        super().__init__(dtype)
+
+        self._buffer = buffer
+        self._width = width
+        self._count = count
+        self._lows = array("d", lows)
+        self._highs = array("d", highs)
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def _attach(name: str, publication: int):
+    """
+    Attach the worker process to a shared memory block, once. The blocks of any other publication are closed.
+
+    :param name: The name of the block
+    :param publication: The number of the publication of the block, by the
+            :meth:`ProcessPool.publish<EasyKnn.parallel.ProcessPool.publish>` of the pool
+    :return: The ``SharedMemory`` object
+    """
+    from multiprocessing import shared_memory
+
+    if name not in _attached:
+        for other in [other for other, (other_publication, _) in _attached.items()
+                      if other_publication != publication]:
+            try:
+                _attached.pop(other)[1].close()
+            except BufferError:  # pragma: no cover - a view is still alive, the block is closed with the worker
+                pass
+
+        block = shared_memory.SharedMemory(name=name)
+
+        try:
+            # The main process owns the block: the worker must not unlink it when it exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(block._name, "shared_memory")
+        except (ImportError, AttributeError, KeyError):  # pragma: no cover
+            pass
+
+        _attached[name] = (publication, block)
+
+    return _attached[name][1]
+
+
+def _attached_blocks(_=None) -> int:
+    """
+    Get the number of shared memory blocks a worker process is attached to.
+
+    :return: The number of blocks
+    """
+    return len(_attached)
+
+
+def _search_shard(task: Tuple) -> List[Tuple[float, int, int]]:
+    """
+    Find the ``k`` nearest rows of a shard, in a worker process.
+
+    :param task: The ``(publication, block name, (width, dtype, lows, highs), dataset index, start, stop, query,
+            weights, k, use_abs, metric, block_size)`` of the shard
+    :return: A ``list`` of ``(distance, dataset index, row)`` tuples
+    """
+    publication, name, (width, dtype, lows, highs), dataset_index, start, stop, query, weights, k, use_abs, metric, \
+        block_size = task
+
+    itemsize = array(DTYPES[dtype]).itemsize
+    buffer = memoryview(_attach(name, publication).buf)[start * width * itemsize:stop * width * itemsize].cast(DTYPES[dtype])
+    storage = _SharedStorage(buffer, width, stop - start, dtype, lows, highs)
+
+    found = kernels.top_k([query], [storage], weights, k, use_abs=use_abs, block_size=block_size, metric=metric)[0]
+
+    return [(distance, dataset_index, start + row) for distance, _, row in found]
+
+
+class ProcessPool:
+    """
+    A pool of worker processes searching the :class:`Datasets<EasyKnn.dataset.Dataset>` of a
+    :class:`Plan<EasyKnn.plan.Plan>` in parallel, used by :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>` with
+    ``engine="process"``. This object should not be directly created, but only by
+    :meth:`Plan.start_pool<EasyKnn.plan.Plan.start_pool>`.
+
+    The coordinates of each Dataset are copied once in a shared memory block, that every worker reads without any
+    copy. A query is then split in shards of at most ``shard_size`` values, each worker returns the ``k`` nearest
+    values of its shards, and these are merged. When a Dataset of the Plan changes, the blocks are copied again
+    before the next query.
+
+    Shared memory needs Python 3.8 or newer.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to search
+    :param processes: The number of worker processes. If ``None``, one per CPU.
+    :param shard_size: The largest number of values searched by a worker at once
+    """
+
+    def __init__(self, plan: "Plan", processes: int = None, shard_size: int = 65536):
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            raise RuntimeError("A process pool needs Python 3.8 or newer")
+
+        if shard_size < 1:
+            raise ValueError("The shard size must be at least 1")
+
+        self._plan = plan
+        self._shard_size = shard_size
+        self._blocks = []
+        self._publication = 0
+        self._stale = True
+
+        # The number of queries reading the blocks of each publication, and the blocks of the older publications still
+        # read by a query: they are only released when their last query ends
+        self._readers = {}
+        self._retired = {}
+
+        # Held while the blocks are published, or taken and given back by a query
+        self._lock = threading.RLock()
+
+        self._pool = multiprocessing.Pool(processes)
+
+    @property
+    def stale(self) -> bool:
+        """
+        ``True`` if a :class:`Dataset<EasyKnn.dataset.Dataset>` of the Plan changed since the blocks were copied.
+
+        :read-only: True
+        """
+        return self._stale
+
+    def publish(self) -> None:
+        """
+        Copy the coordinates of every :class:`Dataset<EasyKnn.dataset.Dataset>` of the Plan in new shared memory
+        blocks, and release the previous ones once no query reads them anymore.
+
+        :return: ``None``
+        """
+        from multiprocessing import shared_memory
+
+        with self._lock:
+            if self._readers.get(self._publication):
+                self._retired[self._publication] = self._blocks
+            else:
+                self._release(self._blocks)
+
+            self._blocks = []
+            self._publication += 1
+
+            for dataset in self._plan.datasets:
+                storage = dataset._columns()
+                data = memoryview(storage.buffer).cast("B")
+
+                block = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+                block.buf[:len(data)] = data
+
+                # The workers close the blocks of an older publication when they see a block of this one
+                layout = (storage.width, storage.dtype, storage._lows.tolist(), storage._highs.tolist())
+                self._blocks.append((block, layout, len(storage)))
+
+            self._stale = False
+
+    @staticmethod
+    def _release(blocks: List[tuple]) -> None:
+        """
+        Close and remove shared memory blocks.
+
+        :param blocks: The ``(block, layout, count)`` of each block
+        :return: ``None``
+        """
+        for block, _, _ in blocks:
+            block.close()
+            block.unlink()
+
+    def query(self, query: List[Union[int, float, None]], weights: List[float], k: int, use_abs: bool = True,
+              metric: Metric = None, block_size: int = 1024) -> List[Tuple[float, int, int]]:
+        """
+        Get the ``k`` nearest values of a query, or the ``k`` farthest if ``k`` is negative.
+
+        :param query: The coordinates of the searched :class:`Value<EasyKnn.value.Value>`
+        :param weights: The weight of each dimension of the query
+        :param k: The number of values to get
+        :param use_abs: If True, the absolute value of the distances will be used
+        :param metric: The :class:`Metric<EasyKnn.metrics.Metric>` to use. If ``None``, the euclidean distance is used.
+        :param block_size: The number of values compared at once by a worker
+        :return: A ``list`` of ``(distance, dataset index, row)`` tuples, from the nearest to the farthest (or from the
+                farthest to the nearest if ``k`` is negative)
+        """
+        # The lock is only held to take the blocks: the queries of several threads are computed at the same time
+        with self._lock:
+            if self._stale:
+                self.publish()
+
+            publication, blocks = self._publication, self._blocks
+            self._readers[publication] = self._readers.get(publication, 0) + 1
+
+        try:
+            tasks = [(publication, block.name, layout, dataset_index, start, min(start + self._shard_size, count),
+                      query, weights, k, use_abs, metric, block_size)
+                     for dataset_index, (block, layout, count) in enumerate(blocks)
+                     for start in range(0, count, self._shard_size)]
+
+            found = [item for shard in self._pool.map(_search_shard, tasks) for item in shard]
+
+        finally:
+            with self._lock:
+                self._readers[publication] -= 1
+
+                if not self._readers[publication]:
+                    del self._readers[publication]
+                    self._release(self._retired.pop(publication, []))
+
+        # Merged like kernels.top_k orders its results
+        found.sort(key=lambda item: (-item[0] if k < 0 else item[0], item[1], item[2]))
+
+        return found[:abs(k)]
+
+    def close(self) -> None:
+        """
+        Stop the worker processes, and release the shared memory blocks.
+
+        :return: ``None``
+        """
+        self._pool.close()
+        self._pool.join()
+
+        with self._lock:
+            for blocks in [self._blocks] + list(self._retired.values()):
+                self._release(blocks)
+
+            self._blocks = []
+            self._retired = {}
+
+    def _changed(self) -> None:
+        """
+        Called by the Plan when one of its :class:`Datasets<EasyKnn.dataset.Dataset>` changes.
+
+        :return: ``None``
+        """
+        self._stale = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,215 @@
+import json
+import struct
+import sys
+from array import array
+from mmap import mmap as memory_map, ACCESS_READ
+from typing import Union, TYPE_CHECKING
+
+from EasyKnn.dataset import Dataset
+from EasyKnn.storage import ColumnarStorage
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+
+#: The first bytes of a file written by :func:`save<EasyKnn.persistence.save>`
+MAGIC = b"EASYKNN\x00"
+
+#: The version of the layout written by :func:`save<EasyKnn.persistence.save>`. Only a file of this version can be
+#: loaded.
+FORMAT_VERSION = 1
+
+# The typecodes of the arrays of less than 8 bytes items that can be saved, whose size is the same on every platform
+_SMALL_TYPECODES = ("b", "B", "H", "f")
+
+# The magic bytes, the version of the layout, and the length of the JSON description that follows
+_HEADER = struct.Struct("<8sIQ")
+
+
+def _align(offset: int) -> int:
+    """
+    Round an offset up to a multiple of 8 bytes, so that every array of the file is aligned.
+    """
+    return -(-offset // 8) * 8
+
+
+class _Sections:
+    """
+    The arrays written after the description of a file, each one starting on a multiple of 8 bytes.
+    """
+
+    def __init__(self):
+        self.buffers = []
+        self.size = 0
+
+    def add(self, buffer: Union[array, memoryview]) -> dict:
+        """
+        Add an array to the file.
+
+        :param buffer: The array, of floats or integers of 8 bytes, or of one of the smaller typecodes
+        :return: The description of the array
+        """
+        view = memoryview(buffer)
+
+        if view.itemsize != 8 and view.format not in _SMALL_TYPECODES:
+            raise ValueError(f"Arrays of {view.format} items cannot be saved")
+
+        # Integers of 8 bytes are always loaded as int64, whatever the size of a C long is
+        typecode = view.format if view.itemsize != 8 else "d" if view.format == "d" else "q"
+
+        data = view.cast("B")
+        offset = _align(self.size)
+
+        self.buffers.append((offset, data))
+        self.size = offset + len(data)
+
+        return {"offset": offset, "typecode": typecode, "count": len(data) // view.itemsize}
+
+
+def save(plan: "Plan", path: str) -> None:
+    """
+    Write a :class:`Plan<EasyKnn.plan.Plan>` to a file. See :meth:`Plan.save<EasyKnn.plan.Plan.save>`.
+
+    The file starts with :data:`MAGIC<EasyKnn.persistence.MAGIC>`, the layout version and the length of a JSON
+    description of the Plan: its cache options, the display name, size, width and storage type of each Dataset (with
+    the range of each column of an int8 matrix) and the displayed name of each Value, and the options of its index.
+    The arrays follow, in native byte order and aligned on 8 bytes: for each Dataset, its row-major matrix of the
+    storage type (a missing coordinate is a NaN, or ``-128`` in an int8 matrix) and the int64 length of each row, then
+    the arrays of the index. The nodes, cells and links of every index are saved as arrays: only its options and
+    scalars, and the lists of one item per dimension or per Dataset, are saved in the JSON description.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to save
+    :param path: The path of the file
+    :return: ``None``
+    """
+    from EasyKnn.plan import INDEXES
+
+    sections = _Sections()
+
+    datasets = []
+    for dataset in plan.datasets:
+        storage = dataset._columns()
+        lengths = storage._lengths
+
+        if lengths.itemsize != 8:
+            lengths = array("q", lengths)
+
+        names = storage._names
+        datasets.append({
+            "display_name": dataset.display_name,
+            "rows": len(storage),
+            "width": storage.width,
+            "dimension": dataset.dataset_dimension,
+            "dtype": storage.dtype,
+            "ranges": [storage._lows.tolist(), storage._highs.tolist()] if storage.dtype == "int8" else None,
+            "min_length": storage._min_length,
+            "matrix": sections.add(storage.buffer),
+            "lengths": sections.add(lengths),
+            "names": names if any([name is not None for name in names]) else None,
+        })
+
+    index = None
+    if plan.index is not None:
+        # Only one of the threads finding the index stale builds it again, like the queries do
+        if plan.index.stale:
+            with plan._build_lock:
+                if plan.index.stale:
+                    plan.index.build()
+
+        state = {}
+        for name, value in plan.index._state().items():
+            state[name] = {"section": sections.add(value)} if isinstance(value, (array, memoryview)) else value
+
+        index = {
+            "kind": [kind for kind, index_class in INDEXES.items() if type(plan.index) is index_class][0],
+            "options": plan.index._options(),
+            "state": state,
+        }
+
+    description = json.dumps({
+        "byteorder": sys.byteorder,
+        "cache_size": plan.memoized.max_size,
+        "cache_policy": plan.memoized.policy,
+        "datasets": datasets,
+        "index": index,
+    }).encode("utf-8")
+
+    start = _align(_HEADER.size + len(description))
+
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(description)))
+        file.write(description)
+
+        for offset, data in sections.buffers:
+            file.write(b"\x00" * (start + offset - file.tell()))
+            file.write(data)
+
+
+def load(plan_class: type, path: str, mmap: bool = True) -> "Plan":
+    """
+    Read a :class:`Plan<EasyKnn.plan.Plan>` written by :func:`save<EasyKnn.persistence.save>`. See
+    :meth:`Plan.load<EasyKnn.plan.Plan.load>`.
+
+    :param plan_class: The class of the Plan to create
+    :param path: The path of the file
+    :param mmap: If ``True``, the arrays are read-only views of the memory-mapped file. If ``False``, the file is
+            read in memory.
+    :return: The loaded :class:`Plan<EasyKnn.plan.Plan>`
+    """
+    from EasyKnn.plan import INDEXES
+
+    with open(path, "rb") as file:
+        if mmap:
+            source = memoryview(memory_map(file.fileno(), 0, access=ACCESS_READ))
+
+        else:
+            source = memoryview(file.read())
+
+    if len(source) < _HEADER.size:
+        raise ValueError(f"{path} is not a saved Plan")
+
+    magic, version, length = _HEADER.unpack(source[:_HEADER.size])
+
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a saved Plan")
+
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} was saved with another layout (version {version})")
+
+    description = json.loads(bytes(source[_HEADER.size:_HEADER.size + length]).decode("utf-8"))
+
+    if description["byteorder"] != sys.byteorder:
+        raise ValueError(f"{path} was saved on a {description['byteorder']}-endian machine")
+
+    start = _align(_HEADER.size + length)
+
+    def section(entry: dict) -> memoryview:
+        offset = start + entry["offset"]
+        itemsize = array(entry["typecode"]).itemsize
+        return source[offset:offset + entry["count"] * itemsize].cast(entry["typecode"])
+
+    datasets = []
+    for entry in description["datasets"]:
+        dtype = entry["dtype"]
+        dataset = Dataset(entry["display_name"], dtype=dtype)
+
+        names = entry["names"] if entry["names"] is not None else [None] * entry["rows"]
+        lows, highs = entry["ranges"] or (None, None)
+        dataset._storage = ColumnarStorage._from_buffers(section(entry["matrix"]), entry["width"],
+                                                         section(entry["lengths"]), names, dtype, lows, highs,
+                                                         entry["min_length"])
+        dataset._dataset_dimension = entry["dimension"]
+
+        datasets.append(dataset)
+
+    plan = plan_class(cache_size=description["cache_size"], cache_policy=description["cache_policy"])
+    plan.add_datasets(datasets)
+
+    index = description["index"]
+    if index is not None:
+        state = {name: section(value["section"]) if isinstance(value, dict) and "section" in value else value
+                 for name, value in index["state"].items()}
+
+        with plan._lock.write():
+            plan._index = INDEXES[index["kind"]]._restore(plan, index["options"], state)
+
+    return plan
@@ -1,19 +1,83 @@
-from typing import List
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Union, Tuple
 
+from EasyKnn import kernels, persistence
+from EasyKnn.cache import DistanceCache, MISSING
 from EasyKnn.errors import ReadOnlyAttributeError, CriticalDeletionError
+from EasyKnn.hnsw import HNSWIndex
+from EasyKnn.index import Index
+from EasyKnn.ivf import IVFIndex
+from EasyKnn.kdtree import KDTree
+from EasyKnn.locks import ReadWriteLock
+from EasyKnn.lsh import LSHIndex
+from EasyKnn.metrics import Metric, get_metric
+from EasyKnn.vptree import VPTree
 from EasyKnn.neighbors import Neighbors
+from EasyKnn.parallel import ProcessPool
+from EasyKnn.point import Point
+from EasyKnn.pq import PQIndex
+from EasyKnn.profiling import QueryStats, stage
+from EasyKnn.stats import RunningStatistics
 from EasyKnn.value import Value
 from EasyKnn.dataset import Dataset
 from EasyKnn.weight import Weight
 
+# The indexes that can be built with Plan.build_index
+INDEXES = {
+    "kdtree": KDTree,
+    "vptree": VPTree,
+    "ivf": IVFIndex,
+    "hnsw": HNSWIndex,
+    "lsh": LSHIndex,
+    "pq": PQIndex,
+}
+
 
 class Plan:
     """
     In a Plan, all :class:`Values<EasyKnn.value.Value` will be represented in an X-dimensional space as a point.
+
+    :param cache_size: The largest number of distances memoized by the Plan. If ``None``, the memoized distances are
+            never evicted.
+    :param cache_policy: How memoized distances are evicted when the cache is full: ``"lru"`` evicts the least recently
+            used one, ``"lfu"`` the least frequently used one.
+
+    A query can be profiled: its :class:`Neighbors<EasyKnn.neighbors.Neighbors>` then holds the
+    :class:`QueryStats<EasyKnn.profiling.QueryStats>` of the query, with the time spent in each stage and the counters
+    of its work. Every query is profiled while the Plan has a stats hook (see
+    :meth:`add_stats_hook<EasyKnn.plan.Plan.add_stats_hook>`), to aggregate them into a metrics system.
+
+    A Plan can be queried by several threads at once. Queries hold the lock of the Plan as readers, so they run
+    together, while a change of a :class:`Dataset<EasyKnn.dataset.Dataset>` of the Plan (adding Values, setting
+    coordinates, nonifying) holds it as the writer, and waits for the running queries to end. A query never changes
+    the Datasets.
     """
-    def __init__(self):
+    def __init__(self, cache_size: int = 100_000, cache_policy: str = "lru"):
         self._datasets = []
-        self._memoized = {}
+
+        # Held by the queries as readers, and by the changes of the datasets as the writer
+        self._lock = ReadWriteLock()
+
+        # Held while the index is built again by a query
+        self._build_lock = threading.Lock()
+
+        self._memoized = DistanceCache(cache_size, cache_policy)
+        self._index = None
+        self._pool = None
+
+        # Called with the QueryStats of each query
+        self._stats_hooks = []
+
+        # Each query is interned to a small integer, used in the keys of the memoized distances. The generation
+        # changes whenever a dataset changes, so that distances memoized before are not used anymore.
+        self._contexts = DistanceCache(1024)
+        self._context_ids = itertools.count(1)
+        self._generation = 0
+
+        # The variance of each dimension, and the generation it was computed for
+        self._variances = None
 
     @property
     def datasets(self) -> List[Dataset]:
@@ -33,10 +97,11 @@ class Plan:
         raise CriticalDeletionError("The datasets attribute cannot be deleted")
 
     @property
-    def memoized(self) -> dict:
+    def memoized(self) -> DistanceCache:
         """
-        A dictionary containing all the memoized distances of the Plan during the execution of
-        the :meth:`neighbors<EasyKnn.plan.Plan.neighbors>` method.
+        The :class:`DistanceCache<EasyKnn.cache.DistanceCache>` containing all the memoized distances of the Plan
+        during the execution of the :meth:`neighbors<EasyKnn.plan.Plan.neighbors>` method, with its hit, miss and
+        eviction counters.
 
         :read-only: True
         """
@@ -50,6 +115,42 @@ class Plan:
     def memoized(self, *args):
         raise CriticalDeletionError("The memoized attribute cannot be deleted")
 
+    @property
+    def index(self) -> Index:
+        """
+        The :class:`Index<EasyKnn.index.Index>` built by :meth:`build_index<EasyKnn.plan.Plan.build_index>`, or
+        ``None``.
+
+        :read-only: True
+        """
+        return self._index
+
+    @index.setter
+    def index(self, *args):
+        raise ReadOnlyAttributeError("The index attribute is read-only")
+
+    @index.deleter
+    def index(self, *args):
+        raise CriticalDeletionError("The index attribute cannot be deleted")
+
+    @property
+    def pool(self) -> ProcessPool:
+        """
+        The :class:`ProcessPool<EasyKnn.parallel.ProcessPool>` started by
+        :meth:`start_pool<EasyKnn.plan.Plan.start_pool>`, or ``None``.
+
+        :read-only: True
+        """
+        return self._pool
+
+    @pool.setter
+    def pool(self, *args):
+        raise ReadOnlyAttributeError("The pool attribute is read-only")
+
+    @pool.deleter
+    def pool(self, *args):
+        raise CriticalDeletionError("The pool attribute cannot be deleted")
+
     def add_dataset(self, dataset: Dataset):
         """
         Add a single :class:`Dataset<EasyKnn.dataset.Dataset>` to the Plan
@@ -65,11 +166,13 @@ class Plan:
         [[[1, 2, 3], [4, 5, 6]]]
         """
 
-        # We will add the plan to the dataset.
-        # An error will be raised if the dataset is already linked to a plan
-        dataset.linked_plan = self
+        with self._lock.write():
+            # We will add the plan to the dataset.
+            # An error will be raised if the dataset is already linked to a plan
+            dataset.linked_plan = self
 
-        self._datasets.append(dataset)
+            self._datasets.append(dataset)
+            self._dataset_changed(dataset)
 
     def add_datasets(self, datasets: List[Dataset]):
         """
@@ -91,10 +194,180 @@ class Plan:
         # We will add the plan to each dataset.
         # An error will be raised if any dataset is already linked to a plan
 
-        for dataset in datasets:
-            dataset.linked_plan = self
+        with self._lock.write():
+            for dataset in datasets:
+                dataset.linked_plan = self
+
+            self._datasets.extend(datasets)
+
+            for dataset in datasets:
+                self._dataset_changed(dataset)
+
+    def _dataset_changed(self, dataset: Dataset) -> None:
+        """
+        Called when a :class:`Dataset<EasyKnn.dataset.Dataset>` of the Plan is added, or when its values change, while
+        the lock of the Plan is held as the writer.
+
+        :param dataset: The Dataset that changed
+        :return: ``None``
+        """
+        self._generation += 1
+
+        if self._index is not None:
+            self._index._changed()
+
+        if self._pool is not None:
+            self._pool._changed()
+
+    def build_index(self, kind: str, **options) -> Index:
+        """
+        Build an :class:`Index<EasyKnn.index.Index>` over all the values of the Plan, used by
+        :meth:`neighbors<EasyKnn.plan.Plan.neighbors>` with ``engine="index"``. The index is built again before the
+        next query whenever a :class:`Dataset<EasyKnn.dataset.Dataset>` of the Plan changes.
+
+        :param kind: The kind of index to build. ``"kdtree"`` builds a :class:`KDTree<EasyKnn.kdtree.KDTree>`,
+                ``"vptree"`` a :class:`VPTree<EasyKnn.vptree.VPTree>`, ``"ivf"`` an approximate
+                :class:`IVFIndex<EasyKnn.ivf.IVFIndex>`, ``"hnsw"`` an approximate
+                :class:`HNSWIndex<EasyKnn.hnsw.HNSWIndex>`, ``"lsh"`` an approximate
+                :class:`LSHIndex<EasyKnn.lsh.LSHIndex>`, and ``"pq"`` an approximate and compressed
+                :class:`PQIndex<EasyKnn.pq.PQIndex>`.
+        :param options: The options of the index, such as ``leaf_size``, ``nlist`` and ``nprobe``, ``M`` and
+                ``ef_search``, ``tables``, ``bits`` and ``metric``, or ``subvectors`` and ``rerank``
+        :return: The built :class:`Index<EasyKnn.index.Index>`
+
+        >>> plan = Plan()
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([1, 2]), Value([4, 6]), Value([0, 0])])
+        >>> plan.add_dataset(dataset)
+        >>> _ = plan.build_index("kdtree", leaf_size=2)
+        >>> plan.neighbors(Value([5, 5]), engine="index", k=1).nearest_neighbor()
+        [[4, 6]]
+        >>> dataset.add_value(Value([5, 5]))
+        >>> plan.neighbors(Value([5, 5]), engine="index", k=1).nearest_neighbor()
+        [[5, 5]]
+        """
+        if kind not in INDEXES:
+            raise ValueError(f"Unknown index: {kind}")
+
+        with self._lock.write():
+            self._index = INDEXES[kind](self, **options)
+            return self._index
+
+    def drop_index(self) -> None:
+        """
+        Remove the :attr:`index<EasyKnn.plan.Plan.index>` of the Plan.
+
+        :return: ``None``
+        """
+        with self._lock.write():
+            self._index = None
+
+    def start_pool(self, processes: int = None, shard_size: int = 65536) -> ProcessPool:
+        """
+        Start a :class:`ProcessPool<EasyKnn.parallel.ProcessPool>` of worker processes, used by
+        :meth:`neighbors<EasyKnn.plan.Plan.neighbors>` with ``engine="process"``. The values of the Plan are copied in
+        shared memory once, and again before the next query whenever a :class:`Dataset<EasyKnn.dataset.Dataset>` of
+        the Plan changes. A running pool is stopped first.
+
+        :param processes: The number of worker processes. If ``None``, one per CPU.
+        :param shard_size: The largest number of values searched by a worker at once. A large Dataset is split in
+                several shards, so its values are searched by several workers.
+        :return: The started :class:`ProcessPool<EasyKnn.parallel.ProcessPool>`
+        """
+        self.stop_pool()
 
-        self._datasets.extend(datasets)
+        with self._lock.write():
+            self._pool = ProcessPool(self, processes, shard_size)
+            return self._pool
+
+    def stop_pool(self) -> None:
+        """
+        Stop the :attr:`pool<EasyKnn.plan.Plan.pool>` of the Plan, and release its shared memory.
+
+        :return: ``None``
+        """
+        with self._lock.write():
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def save(self, path: str) -> None:
+        """
+        Save the Plan to a file: the coordinates of its :class:`Datasets<EasyKnn.dataset.Dataset>`, the displayed names
+        of their :class:`Values<EasyKnn.value.Value>`, and its :attr:`index<EasyKnn.plan.Plan.index>`. The memoized
+        distances and the :attr:`pool<EasyKnn.plan.Plan.pool>` are not saved. The layout of the file is described by
+        :func:`persistence.save<EasyKnn.persistence.save>`.
+
+        :param path: The path of the file
+        :return: ``None``
+
+        >>> import os, tempfile
+        >>> plan = Plan()
+        >>> dataset = Dataset("cats")
+        >>> dataset.add_values([Value([1, 2], "Tom"), Value([4, None, 6])])
+        >>> plan.add_dataset(dataset)
+        >>> _ = plan.build_index("kdtree")
+        >>> path = os.path.join(tempfile.mkdtemp(), "plan.knn")
+        >>> plan.save(path)
+        >>> loaded = Plan.load(path)
+        >>> loaded.datasets, loaded.datasets[0].data[0].display_name
+        ([cats], 'Tom')
+        >>> loaded.neighbors(Value([4, 5, 6]), engine="index", k=1).nearest_neighbor()
+        [[4.0, None, 6.0]]
+        """
+        with self._lock.read():
+            persistence.save(self, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "Plan":
+        """
+        Load a Plan saved by :meth:`save<EasyKnn.plan.Plan.save>`. Its :class:`Datasets<EasyKnn.dataset.Dataset>` are
+        :attr:`columnar<EasyKnn.dataset.Dataset.columnar>`, and its index is loaded without being built again.
+
+        With ``mmap``, the coordinates and the index are read-only views of the memory-mapped file, so loading is
+        almost instant, and processes loading the same file share a single copy of it in memory. A Dataset copies its
+        coordinates the first time it changes.
+
+        :param path: The path of the file
+        :param mmap: If ``True``, the file is memory-mapped. If ``False``, it is read in memory.
+        :return: The loaded Plan
+        """
+        return persistence.load(cls, path, mmap)
+
+    def add_stats_hook(self, hook: Callable[[QueryStats], None]) -> None:
+        """
+        Call a function with the :class:`QueryStats<EasyKnn.profiling.QueryStats>` of each query of
+        :meth:`neighbors<EasyKnn.plan.Plan.neighbors>`, once it is answered. While the Plan has a hook, every query is
+        profiled. The hook is called by the thread of the query, so it must be thread-safe if the Plan is queried by
+        several threads. A :class:`StatsCollector<EasyKnn.profiling.StatsCollector>` adds up the stats of the queries.
+
+        :param hook: The function, given the QueryStats
+        :return: ``None``
+
+        >>> from EasyKnn.profiling import StatsCollector
+        >>> plan = Plan()
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([1, 2]), Value([4, 6]), Value([0, 0])])
+        >>> plan.add_dataset(dataset)
+        >>> collector = StatsCollector()
+        >>> plan.add_stats_hook(collector)
+        >>> _ = plan.neighbors(Value([1, 1]), k=1)
+        >>> _ = plan.neighbors(Value([1, 1]), k=1)
+        >>> totals = collector.totals()
+        >>> totals["queries"], totals["candidates"], totals["memo_hits"], totals["memo_misses"]
+        (2, 6, 3, 3)
+        >>> plan.remove_stats_hook(collector)
+        """
+        self._stats_hooks.append(hook)
+
+    def remove_stats_hook(self, hook: Callable[[QueryStats], None]) -> None:
+        """
+        Stop calling a function added by :meth:`add_stats_hook<EasyKnn.plan.Plan.add_stats_hook>`.
+
+        :param hook: The function
+        :return: ``None``
+        """
+        self._stats_hooks.remove(hook)
 
     def clear_cache(self):
         """
@@ -103,9 +376,46 @@ class Plan:
 
         :return: ``None``
         """
-        self._memoized = {}
+        self._memoized.clear()
+        self._contexts.clear()
+
+    def _context(self, coordinates: Tuple, weights: List[float], use_abs: bool, metric: Metric) -> int:
+        """
+        Intern everything a memoized distance depends on, apart from the point, to a small integer.
+
+        :param coordinates: The coordinates of the query, as a tuple, or the key of a Value of the Plan given by
+                :meth:`_value_key<EasyKnn.plan.Plan._value_key>`
+        :param weights: The weight of each dimension of the query
+        :param use_abs: The ``use_abs`` of the query
+        :param metric: The :class:`Metric<EasyKnn.metrics.Metric>` of the query
+        :return: The integer of the query
+        """
+        key = (self._generation, coordinates, tuple(weights), use_abs, metric.name)
+
+        context = self._contexts.get(key)
+        if context is MISSING:
+            context = next(self._context_ids)
+            self._contexts.put(key, context)
+
+        return context
+
+    def _value_key(self, value: Value) -> Union[int, Tuple]:
+        """
+        Get what identifies a :class:`Value<EasyKnn.value.Value>` in the keys of the memoized distances. A Value of a
+        columnar :class:`Dataset<EasyKnn.dataset.Dataset>` of the Plan is identified by its Dataset and row, like
+        :meth:`neighbors<EasyKnn.plan.Plan.neighbors>` does, since any change of its coordinates changes the
+        generation of the Plan. Any other Value is identified by its coordinates.
 
-    def _distance(self, value: Value, point: Value, weights: Weight, memoize: bool = True, use_abs=True) -> float:
+        :param value: The Value
+        :return: An integer for a row of the Plan, or the coordinates of the Value as a tuple
+        """
+        if value._row is not None and value.dataset._liked_plan is self:
+            return value.dataset._uid << 32 | value._row
+
+        return tuple(value.coordinates)
+
+    def _distance(self, value: Value, point: Value, weights: Weight, memoize: bool = True, use_abs=True,
+                  key: int = None, metric: Metric = None) -> float:
         """
         Get the distance between two :class:`Values<EasyKnn.value.Value>`.
 
@@ -122,6 +432,12 @@ class Plan:
                 of the plan.
         :param use_abs: If True, the absolute value of the distance will be returned. If False, a negative value could
                 be returned if the Weight is negative.
+        :param key: The key of the distance in the :attr:`Cache<EasyKnn.plan.Plan.memoized>`. Given by the
+                :meth:`neighbors<EasyKnn.plan.Plan.neighbors>` method. Otherwise, the first value is interned like the
+                query of ``neighbors``, and the second one is identified by its row if it is a value of a columnar
+                Dataset of the Plan, so that the distances memoized by ``neighbors`` are found.
+        :param metric: The :class:`Metric<EasyKnn.metrics.Metric>` to use. If ``None``, the euclidean distance is
+                computed.
 
         :return: The distance between the two values
 
@@ -136,80 +452,535 @@ class Plan:
         >>> point = Value([2, 2, 2])
         >>> plan._distance(value, point, Weight([1, 1, 1]))
         0.0
+
+        >>> plan._distance(value, point, Weight([1, 1, 1]))
+        0.0
+        >>> plan.memoized.hits, plan.memoized.misses
+        (1, 2)
         """
 
         coord_sum = 0
 
-        tupled = (tuple(value.coordinates), tuple(point.coordinates))
+        if metric is None:
+            metric = get_metric("euclidean")
 
-        if tupled in self._memoized and memoize is True:
-            # We will use the memoized value if it is available
-            return self._memoized[tupled]
+        if memoize is True:
+            if key is None:
+                context = self._context(self._value_key(value), kernels.weight_vector(weights, value.dimension),
+                                        use_abs, metric)
+                point_key = self._value_key(point)
 
-        else:
-            for i in range(len(value.coordinates)):
-                value_coord = value.coordinates[i]
-                point_coord = point.coordinates[i]
+                # Same key as the one given by neighbors for a row of the Plan
+                key = context << 64 | point_key if isinstance(point_key, int) else (context, point_key)
 
-                if value_coord is None or point_coord is None:
-                    # We will ignore this step, since the value is not defined in this dimension.
-                    pass
+            memoized = self._memoized.get(key)
 
-                else:
-                    # We will add the square of the difference between the two coordinates
-                    coord_sum += (value_coord - point_coord) ** 2 * weights[i]  # Euclidean distance, multiplied by the weight.
-                                                                                # If weight[i] is not defined, 1 will nbe returned
+            if memoized is not MISSING:
+                # We will use the memoized value if it is available
+                return memoized
 
-            # we take the square root of the sum of the squares.
-            # this work for any number of dimensions
-            result = coord_sum ** 0.5
-
-            # If a weight or a value is negative, the distance will be complex. We will return a non-complex value.
-            if isinstance(result, complex):
-                # We will return the absolute value of the distance.
-
-                # Despite the use_abs parameter, we will always use the absolute value of the distance.
-                # In fact, use_abs determines if the distance should always be positive or not.
-                # A negative distance is considered as nearest than 0 by the algorithm,
-                # even if it's not mathematically true.
-                result = abs(result) * -1 if not use_abs else abs(result)
+        if metric.name != "euclidean":
+            result = metric.pair(value.coordinates, point.coordinates, weights, use_abs)
 
             if memoize is True:
-                self._memoized[tupled] = result
+                self._memoized.put(key, result)
 
             return result
 
+        # The coordinates of a value of a columnar Dataset are read from its storage, so we only read them once
+        value_coords = value.coordinates
+        point_coords = point.coordinates
+
+        for i in range(len(value_coords)):
+            value_coord = value_coords[i]
+
+            # A point shorter than the value is padded virtually with None
+            point_coord = point_coords[i] if i < len(point_coords) else None
+
+            if value_coord is None or point_coord is None:
+                # We will ignore this step, since the value is not defined in this dimension.
+                pass
+
+            else:
+                # We will add the square of the difference between the two coordinates
+                coord_sum += (value_coord - point_coord) ** 2 * weights[i]  # Euclidean distance, multiplied by the weight.
+                                                                            # If weight[i] is not defined, 1 will nbe returned
+
+        # we take the square root of the sum of the squares.
+        # this work for any number of dimensions
+        result = coord_sum ** 0.5
+
+        # If a weight or a value is negative, the distance will be complex. We will return a non-complex value.
+        if isinstance(result, complex):
+            # We will return the absolute value of the distance.
+
+            # Despite the use_abs parameter, we will always use the absolute value of the distance.
+            # In fact, use_abs determines if the distance should always be positive or not.
+            # A negative distance is considered as nearest than 0 by the algorithm,
+            # even if it's not mathematically true.
+            result = abs(result) * -1 if not use_abs else abs(result)
+
+        if memoize is True:
+            self._memoized.put(key, result)
+
+        return result
+
     def neighbors(self, value: Value, memoize: bool = True,
                   nonify: bool = True, weight: Weight = Weight([]),
-                  use_abs: bool = True) -> Neighbors:
+                  use_abs: bool = True, engine: str = "python", k: int = None,
+                  metric: Union[str, Metric] = "euclidean", early_abandon: bool = False,
+                  dimension_order: str = None, profile: bool = False) -> Neighbors:
         """
         Get the k nearest neighbors of a value
 
         :param value: The :class:`Value<EasyKnn.value.Value>` to get the neighbors
         :param memoize: If you want to memoize the distances between the :class:`Value<EasyKnn.value.Value>`.
-                    This will make the algorithm faster,but will use more memory.
-        :param nonify: If all dataset should be :meth:`nonified<EasyKnn.dataset.Dataset.nonify>` to the same dimension
-                    as the given :class:`Value<EasyKnn.value.Value>`.
+                    This will make the algorithm faster,but will use more memory. Only used by the ``"python"`` engine.
+        :param nonify: If the returned :class:`Points<EasyKnn.point.Point>` shorter than the given
+                    :class:`Value<EasyKnn.value.Value>` should be padded with ``None`` to its dimension, like
+                    :meth:`Dataset.nonify<EasyKnn.dataset.Dataset.nonify>` does. The Datasets themselves are not
+                    changed: whatever ``nonify`` is, a dimension missing from a shorter point is skipped by the
+                    distance, like a ``None``.
         :param weight: The :class:`Weight<EasyKnn.weight.Weight>` to use for the distance calculation. By default, each
                     dimension will have a weight set to 1.
         :param use_abs: If the absolute value of the distance should be used. Useless with the default weight,
                     but if negatives weights are used, this can be useful. Disabling this will make the algorithm
                     considering a distance of -7 nearest than 0 for example. Enabling it will make the algorithm
                     considering a distance of -7 equal to 7, and so further than 0.
+        :param engine: How the distances are computed. ``"python"`` computes them one by one with
+                    :meth:`_distance<EasyKnn.plan.Plan._distance>`. ``"vector"`` computes the distances of a whole
+                    dataset at once with :func:`kernels.distances<EasyKnn.kernels.distances>`, using numpy if it is
+                    installed. Both give the same distances. ``"index"`` asks the
+                    :attr:`index<EasyKnn.plan.Plan.index>` of the Plan for the ``k`` nearest points only: the
+                    returned Neighbors only hold these points, and its average distance and dataset ranking are
+                    computed from them. If the index cannot answer (negative ``k``, negative weights or another
+                    metric), the ``"vector"`` engine is used instead. ``"process"`` splits the values of the Plan
+                    in shards searched in parallel by the :attr:`pool<EasyKnn.plan.Plan.pool>` of the Plan, started
+                    with :meth:`start_pool<EasyKnn.plan.Plan.start_pool>`: like with the ``"index"`` engine, the
+                    returned Neighbors only hold the ``k`` nearest points, or the ``k`` farthest if ``k`` is negative.
+        :param k: If given, only the ``k`` nearest and the ``k`` farthest :class:`Points<EasyKnn.point.Point>` are
+                    created and sorted. The other Points are only created if
+                    :attr:`Neighbors.neighbors<EasyKnn.neighbors.Neighbors.neighbors>` is read, or if
+                    :meth:`Neighbors.nearest_neighbor<EasyKnn.neighbors.Neighbors.nearest_neighbor>` needs them.
+        :param metric: The distance to use, either a :class:`Metric<EasyKnn.metrics.Metric>` or the name of one of
+                    the :data:`METRICS<EasyKnn.metrics.METRICS>`: ``"euclidean"`` (the default), ``"manhattan"``,
+                    ``"chebyshev"``, ``"cosine"`` or ``"hamming"``. A Minkowski distance of order ``p`` is named
+                    ``"minkowski:<p>"``, or given as a :class:`Minkowski(p)<EasyKnn.metrics.Minkowski>`.
+        :param early_abandon: If ``True`` and ``k`` is given, only the ``k`` nearest points are looked for, and a
+                    point is abandoned as soon as its partial distance is larger than the ``k``-th nearest distance
+                    found so far (see :func:`kernels.abandon_top_k<EasyKnn.kernels.abandon_top_k>`). Like with the
+                    ``"index"`` engine, the returned Neighbors only hold these points. The ``"python"`` engine
+                    abandons point by point, the ``"vector"`` engine block by block. Only used with the euclidean
+                    metric, a positive ``k`` and no negative weight: the full scan is done otherwise.
+        :param dimension_order: With ``early_abandon``, the order the dimensions are summed in: ``None`` (in
+                    order), ``"weight"`` (the largest weights first) or ``"variance"`` (the largest weighted variances
+                    first). Summing the dimensions that weigh the most first makes the points abandoned sooner.
+        :param profile: If ``True``, the time spent in each stage of the query and the counters of its work are
+                    recorded in the :attr:`stats<EasyKnn.neighbors.Neighbors.stats>` of the returned Neighbors. The
+                    query is always profiled while the Plan has a stats hook (see
+                    :meth:`add_stats_hook<EasyKnn.plan.Plan.add_stats_hook>`).
         :return: A :class:`Neighbors<EasyKnn.neighbors.Neighbors>` object containing the nearest neighbors and datasets
+
+        >>> plan = Plan()
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([1, 2, 3]), Value([4, None, 6])])
+        >>> plan.add_dataset(dataset)
+        >>> [point.distance for point in plan.neighbors(Value([1, 2, 2]), engine="vector").neighbors]
+        [1.0, 5.0]
+        >>> plan.neighbors(Value([4, 1, 6]), k=1).nearest_neighbor()
+        [[4, None, 6]]
+        >>> [point.distance for point in plan.neighbors(Value([1, 2, 2]), metric="manhattan").neighbors]
+        [1, 7]
+        >>> plan.neighbors(Value([1, 2, 3, 4]), k=1).nearest_neighbor(), dataset.data[0]
+        ([[1, 2, 3, None]], [1, 2, 3])
+        >>> stats = plan.neighbors(Value([1, 2, 2]), engine="vector", profile=True).stats
+        >>> stats.candidates, stats.evaluations, sorted(stats.timings)
+        (2, 2, ['distances', 'points', 'ranking', 'sorting', 'wait'])
         """
 
-        points = []
+        metric = get_metric(metric)
+
+        if engine not in ("python", "vector", "index", "process"):
+            raise ValueError(f"Unknown engine: {engine}")
+
+        if engine == "index" and (self._index is None or k is None):
+            raise ValueError("The index engine needs an index built with build_index, and k")
+
+        if engine == "process" and (self._pool is None or k is None):
+            raise ValueError("The process engine needs a pool started with start_pool, and k")
+
+        # Shorter points are padded virtually: only the returned Points present the padded coordinates
+        dimension = value.dimension if nonify else 0
+
+        # The hooks may be removed by another thread meanwhile
+        hooks = list(self._stats_hooks)
+        stats = QueryStats(engine) if profile or hooks else None
+
+        with stage(stats, "wait"):
+            self._lock.acquire_read()
+
+        try:
+            neighbors = self._search(value, memoize, weight, use_abs, engine, k, metric, early_abandon,
+                                     dimension_order, dimension, stats)
+        finally:
+            self._lock.release_read()
+
+        for hook in hooks:
+            hook(stats)
+
+        return neighbors
+
+    def _search(self, value: Value, memoize: bool, weight: Weight, use_abs: bool, engine: str, k: int,
+                metric: Metric, early_abandon: bool, dimension_order: str, dimension: int,
+                stats: QueryStats = None) -> Neighbors:
+        """
+        Get the neighbors of a value, once the lock of the Plan is held as a reader. The parameters are the ones of
+        :meth:`neighbors<EasyKnn.plan.Plan.neighbors>`, ``dimension`` is the one the Points are padded to, and
+        ``stats`` the :class:`QueryStats<EasyKnn.profiling.QueryStats>` of a profiled query.
+
+        :return: A :class:`Neighbors<EasyKnn.neighbors.Neighbors>` object
+        """
+        if engine == "index":
+            query = value.coordinates
+            weights = kernels.weight_vector(weight, len(query))
+
+            if self._index.supports(query, weights, k, metric):
+                if self._index.stale:
+                    with stage(stats, "build"):
+                        # Only one of the queries finding the index stale builds it again
+                        with self._build_lock:
+                            if self._index.stale:
+                                self._index.build()
+
+                with stage(stats, "distances"):
+                    found = self._index.query(query, weights, k, use_abs=use_abs)
+
+                if stats is not None:
+                    # Read right after the query, so a query of another thread on the same index may have changed
+                    # them meanwhile
+                    stats.candidates = stats.evaluations = self._index.evaluations
+                    stats.pruned = self._index.pruned
+
+                return self._found_neighbors(found, dimension, stats, query, weights, use_abs, metric)
+
+            engine = "vector"
+
+            if stats is not None:
+                stats.engine = engine
+
+        # All the values are compared by the other engines
+        if stats is not None:
+            stats.candidates = stats.evaluations = sum([len(dataset) for dataset in self.datasets])
+
+        if engine == "process":
+            query = value.coordinates
+            weights = kernels.weight_vector(weight, len(query))
+
+            with stage(stats, "distances"):
+                found = self._pool.query(query, weights, k, use_abs=use_abs, metric=metric)
+
+            return self._found_neighbors(found, dimension, stats, query, weights, use_abs, metric)
+
+        if early_abandon and k is not None and k > 0 and metric.name == "euclidean":
+            query = value.coordinates
+            weights = kernels.weight_vector(weight, len(query))
+
+            if all([weight_value >= 0 for weight_value in weights]):
+                with stage(stats, "distances"):
+                    found = kernels.abandon_top_k(query, [dataset._columns() for dataset in self.datasets], weights,
+                                                  k, order=self._dimension_order(weights, dimension_order),
+                                                  blocked=engine == "vector")
+
+                return self._found_neighbors(found, dimension, stats, query, weights, use_abs, metric)
+
+        if engine == "vector":
+            query = value.coordinates
+            weights = kernels.weight_vector(weight, len(query))
+
+            with stage(stats, "distances"):
+                distances = [metric.block(query, dataset._columns(), weights, use_abs=use_abs)
+                             for dataset in self.datasets]
+
+        else:
+            if stats is not None and memoize:
+                # Counted from the cache of the Plan, so the queries of other threads meanwhile are counted too
+                hits, misses = self._memoized.hits, self._memoized.misses
+
+            with stage(stats, "distances"):
+                # The key of a memoized distance is the integer of the query, followed by the id of the point
+                context = self._context(self._value_key(value), kernels.weight_vector(weight, value.dimension),
+                                        use_abs, metric) << 64 if memoize else None
+
+                distances = [[self._distance(value, point, weight, memoize, use_abs=use_abs,
+                                             key=context | dataset._uid << 32 | row if memoize else None,
+                                             metric=metric)
+                              for row, point in enumerate(dataset.data)]
+                             for dataset in self.datasets]
+
+            if stats is not None and memoize:
+                stats.memo_hits = self._memoized.hits - hits
+                stats.memo_misses = self._memoized.misses - misses
+                stats.evaluations -= stats.memo_hits
+
+        if k is not None:
+            return Neighbors._from_distances(self.datasets, distances, abs(k), dimension, stats)
+
+        with stage(stats, "points"):
+            points = []
+            for dataset, dataset_distances in zip(self.datasets, distances):
+                for row, distance in enumerate(dataset_distances):
+                    points.append(dataset._to_point(row, distance, dimension))
+
+        return Neighbors(points, stats)
+
+    def _found_neighbors(self, found: List[Tuple[float, int, int]], dimension: int, stats: QueryStats,
+                         query: List[Union[int, float, None]], weights: List[float], use_abs: bool,
+                         metric: Metric) -> Neighbors:
+        """
+        Create the Neighbors of the points found by an index, the pool or an early-abandoning scan.
+
+        :param found: A ``list`` of ``(distance, dataset index, row)`` tuples
+        :param dimension: The dimension the coordinates of the Points are padded to
+        :param stats: The :class:`QueryStats<EasyKnn.profiling.QueryStats>` of a profiled query
+        :param query: The coordinates of the query, and the other parameters of its distance, used to rank the Datasets
+        :return: A :class:`Neighbors<EasyKnn.neighbors.Neighbors>` object holding these points only
+        """
+        with stage(stats, "points"):
+            points = [self.datasets[dataset_index]._to_point(row, distance, dimension)
+                      for distance, dataset_index, row in found]
+
+        return Neighbors._from_found(points, list(self.datasets), self._full_distances(query, weights, use_abs, metric),
+                                     stats)
+
+    def _full_distances(self, query: List[Union[int, float, None]], weights: List[float], use_abs: bool,
+                        metric: Metric) -> Callable[[], List[List[float]]]:
+        """
+        Get a function computing the distances between a query and all the values of the Plan, with which the
+        Neighbors of an engine comparing only some of the values rank the Datasets, if they are asked to.
+
+        :return: A function giving, for each Dataset, the distance of each of its Values
+        """
+        datasets = list(self.datasets)
+
+        return lambda: [list(metric.block(query, dataset._columns(), weights, use_abs=use_abs))
+                        for dataset in datasets]
+
+    def _dimension_order(self, weights: List[float], dimension_order: str = None) -> List[int]:
+        """
+        Get the order the dimensions of a query should be summed in by an early-abandoning scan.
+
+        :param weights: The weight of each dimension of the query
+        :param dimension_order: ``None``, ``"weight"`` or ``"variance"``. See :meth:`neighbors<EasyKnn.plan.Plan.neighbors>`.
+        :return: The dimensions of the query, in order
+        """
+        dimensions = list(range(len(weights)))
+
+        if dimension_order is None:
+            return dimensions
+
+        elif dimension_order == "weight":
+            return sorted(dimensions, key=lambda i: -weights[i])
+
+        elif dimension_order == "variance":
+            if self._variances is None or self._variances[0] != self._generation:
+                self._variances = (self._generation, self._compute_variances())
+
+            variances = self._variances[1]
+            return sorted(dimensions, key=lambda i: -weights[i] * (variances[i] if i < len(variances) else 0))
+
+        raise ValueError(f"Unknown dimension order: {dimension_order}")
+
+    def _compute_variances(self) -> List[float]:
+        """
+        Get the variance of each dimension, over the defined coordinates of all the values of the Plan. It is combined
+        from the :attr:`statistics<EasyKnn.dataset.Dataset.statistics>` of each Dataset, without reading the values.
+
+        :return: A ``list`` with the variance of each dimension
+        """
+        return RunningStatistics.combine([dataset.statistics for dataset in self.datasets]).variance()
+
+    def neighbors_batch(self, values: List[Value], k: int = 1, weight: Weight = Weight([]),
+                        use_abs: bool = True, block_size: int = 1024,
+                        metric: Union[str, Metric] = "euclidean", threads: int = None) -> List[List[Point]]:
+        """
+        Get the ``k`` nearest neighbors of several values at once. If ``k`` is negative, the ``k`` farthest neighbors
+        are returned instead, like :meth:`Neighbors.nearest_neighbor<EasyKnn.neighbors.Neighbors.nearest_neighbor>`.
+
+        The distances between all the values and all the points of the Plan are computed block by block with
+        :func:`kernels.top_k<EasyKnn.kernels.top_k>`, and only the selected points are created. The datasets are
+        not :meth:`nonified<EasyKnn.dataset.Dataset.nonify>`: a dimension missing from a point is skipped, like a
+        ``None``.
+
+        :param values: The :class:`Values<EasyKnn.value.Value>` to get the neighbors
+        :param k: The number of neighbors to get for each value. Default is 1
+        :param weight: The :class:`Weight<EasyKnn.weight.Weight>` to use for the distance calculation. By default, each
+                    dimension will have a weight set to 1.
+        :param use_abs: If the absolute value of the distance should be used.
+                    See :meth:`neighbors<EasyKnn.plan.Plan.neighbors>`.
+        :param block_size: The largest number of values, and of points, compared at once. A higher block size is
+                    faster, but uses more memory: a block holds ``block_size * block_size`` distances.
+        :param metric: The distance to use. See :meth:`neighbors<EasyKnn.plan.Plan.neighbors>`.
+        :param threads: If given, the values are split in this number of parts, searched at once by a
+                    ``ThreadPoolExecutor``. numpy releases the GIL while it computes the distances, so the parts
+                    run in parallel when numpy is installed.
+        :return: For each value, a ``list`` of its ``k`` nearest :class:`Points<EasyKnn.point.Point>`, from the
+                    nearest to the farthest
+
+        >>> plan = Plan()
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([1, 2]), Value([4, 6]), Value([0, 0])])
+        >>> plan.add_dataset(dataset)
+        >>> plan.neighbors_batch([Value([1, 1]), Value([5, 5])], k=2)
+        [[[1, 2], [0, 0]], [[4, 6], [1, 2]]]
+        >>> plan.neighbors_batch([Value([1, 1]), Value([5, 5])], k=1, threads=2)
+        [[[1, 2]], [[4, 6]]]
+        """
+
+        if not values:
+            return []
+
+        queries = [value.coordinates for value in values]
+        weights = kernels.weight_vector(weight, max([len(query) for query in queries]))
+
+        with self._lock.read():
+            selections = self._top_k(queries, weights, k, use_abs, block_size, get_metric(metric), threads)
+
+            return [[self.datasets[dataset_index]._to_point(row, distance)
+                     for distance, dataset_index, row in selection]
+                    for selection in selections]
+
+    def _top_k(self, queries: List[List[Union[int, float, None]]], weights: List[float], k: int, use_abs: bool,
+               block_size: int, metric: Metric, threads: int = None) -> List[List[Tuple[float, int, int]]]:
+        """
+        Get the ``k`` nearest values of several queries with :func:`kernels.top_k<EasyKnn.kernels.top_k>`, once the
+        lock of the Plan is held as a reader. The parameters are the ones of
+        :meth:`neighbors_batch<EasyKnn.plan.Plan.neighbors_batch>`.
+
+        :return: For each query, a ``list`` of ``(distance, dataset index, row)`` tuples
+        """
+        storages = [dataset._columns() for dataset in self.datasets]
+
+        def search(part):
+            return kernels.top_k(part, storages, weights, k, use_abs=use_abs, block_size=block_size, metric=metric)
+
+        if threads is None or threads < 2 or len(queries) < 2:
+            return search(queries)
+
+        size = -(-len(queries) // threads)
+
+        # The read lock is held by the calling thread for all the parts
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            parts = executor.map(search, [queries[start:start + size] for start in range(0, len(queries), size)])
+
+            return [selection for part in parts for selection in part]
+
+    def predict(self, values: List[Value], k: int = 5, vote: str = "majority", weight: Weight = Weight([]),
+                block_size: int = 1024, metric: Union[str, Metric] = "euclidean",
+                threads: int = None) -> List[Dataset]:
+        """
+        Classify several values at once: each value gets the :class:`Dataset<EasyKnn.dataset.Dataset>` its ``k``
+        nearest points vote for. Only the ``k`` nearest points of each value are looked for, with
+        :func:`kernels.top_k<EasyKnn.kernels.top_k>`, and the votes are counted with
+        :func:`kernels.vote<EasyKnn.kernels.vote>`, without creating any :class:`Point<EasyKnn.point.Point>` or
+        :class:`Neighbors<EasyKnn.neighbors.Neighbors>`.
+
+        Unlike :meth:`Neighbors.nearest_dataset<EasyKnn.neighbors.Neighbors.nearest_dataset>`, which ranks the
+        Datasets by the average distance of all their points, only the ``k`` nearest points vote.
+
+        :param values: The :class:`Values<EasyKnn.value.Value>` to classify
+        :param k: The number of nearest points voting for each value
+        :param vote: ``"majority"``: each point gives one vote to its Dataset. ``"distance"``: each point gives
+                    ``1 / distance`` votes, and the points at a distance of 0 get all the votes. A tie goes to the
+                    Dataset of the nearest point among the tied ones.
+        :param weight: The :class:`Weight<EasyKnn.weight.Weight>` to use for the distance calculation
+        :param block_size: The largest number of values, and of points, compared at once.
+                    See :meth:`neighbors_batch<EasyKnn.plan.Plan.neighbors_batch>`.
+        :param metric: The distance to use. See :meth:`neighbors<EasyKnn.plan.Plan.neighbors>`.
+        :param threads: The number of threads searching parts of the values at once.
+                    See :meth:`neighbors_batch<EasyKnn.plan.Plan.neighbors_batch>`.
+        :return: For each value, the Dataset voted for, or ``None`` if the Plan has no value
+
+        >>> plan = Plan()
+        >>> cats, dogs = Dataset(display_name="cats"), Dataset(display_name="dogs")
+        >>> cats.add_values([Value([1, 1]), Value([2, 1]), Value([8, 8])])
+        >>> dogs.add_values([Value([7, 8]), Value([8, 7]), Value([3, 2])])
+        >>> plan.add_datasets([cats, dogs])
+        >>> plan.predict([Value([1, 2]), Value([7, 7]), Value([2.9, 2])], k=3)
+        [cats, dogs, cats]
+        >>> plan.predict([Value([1, 2]), Value([7, 7]), Value([2.9, 2])], k=3, vote="distance")
+        [cats, dogs, dogs]
+        """
+        if vote not in ("majority", "distance"):
+            raise ValueError(f"Unknown vote: {vote}")
+
+        if k < 1:
+            raise ValueError("k must be at least 1")
+
+        if not values:
+            return []
+
+        queries = [value.coordinates for value in values]
+        weights = kernels.weight_vector(weight, max([len(query) for query in queries]))
+
+        with self._lock.read():
+            selections = self._top_k(queries, weights, k, True, block_size, get_metric(metric), threads)
+            voted = kernels.vote(selections, len(self.datasets), weighted=vote == "distance")
+
+            return [None if dataset_index is None else self.datasets[dataset_index] for dataset_index in voted]
+
+    def regress(self, values: List[Value], dimension: int, k: int = 5, vote: str = "mean",
+                weight: Weight = Weight([]), block_size: int = 1024, metric: Union[str, Metric] = "euclidean",
+                threads: int = None) -> List[Union[float, None]]:
+        """
+        Estimate a coordinate of several values at once, from the same coordinate of their ``k`` nearest points.
+        The estimated dimension is not used by the distances, so the values may leave it to ``None``. Like
+        :meth:`predict<EasyKnn.plan.Plan.predict>`, no :class:`Point<EasyKnn.point.Point>` is created: the
+        coordinates are averaged with :func:`kernels.average<EasyKnn.kernels.average>`.
+
+        :param values: The :class:`Values<EasyKnn.value.Value>` to estimate the coordinate of
+        :param dimension: The index of the estimated dimension
+        :param k: The number of nearest points averaged for each value. The points missing the coordinate are
+                    skipped from the average, but are still counted in the ``k`` nearest points.
+        :param vote: ``"mean"``: the coordinates of the points are averaged. ``"distance"``: each coordinate is
+                    weighted by ``1 / distance``, and only the points at a distance of 0 are averaged if there are
+                    some.
+        :param weight: The :class:`Weight<EasyKnn.weight.Weight>` to use for the distance calculation
+        :param block_size: The largest number of values, and of points, compared at once.
+                    See :meth:`neighbors_batch<EasyKnn.plan.Plan.neighbors_batch>`.
+        :param metric: The distance to use. See :meth:`neighbors<EasyKnn.plan.Plan.neighbors>`.
+        :param threads: The number of threads searching parts of the values at once.
+                    See :meth:`neighbors_batch<EasyKnn.plan.Plan.neighbors_batch>`.
+        :return: For each value, the estimated coordinate, or ``None`` if none of its ``k`` nearest points has it
+
+        >>> plan = Plan()
+        >>> dataset = Dataset()
+        >>> dataset.add_values([Value([1, 1, 10]), Value([2, 1, 20]), Value([8, 8, 80]), Value([8, 9, None])])
+        >>> plan.add_dataset(dataset)
+        >>> plan.regress([Value([1, 2]), Value([8, 8.5, 0])], dimension=2, k=2)
+        [15.0, 80.0]
+        >>> plan.regress([Value([1, 1])], dimension=2, k=2, vote="distance")
+        [10.0]
+        """
+        if vote not in ("mean", "distance"):
+            raise ValueError(f"Unknown vote: {vote}")
+
+        if k < 1:
+            raise ValueError("k must be at least 1")
+
+        if dimension < 0:
+            raise ValueError("The dimension must not be negative")
 
-        if nonify:
-            for dataset in self.datasets:
-                dataset.nonify(value.dimension)
+        if not values:
+            return []
 
-        values = [value for dataset in self.datasets for value in dataset.data]
+        queries = [value.coordinates for value in values]
+        weights = kernels.weight_vector(weight, max([len(query) for query in queries] + [dimension + 1]))
 
-        for point in values:
-            distance = self._distance(value, point, weight, memoize, use_abs=use_abs)
+        # The estimated dimension is skipped by the distances
+        weights[dimension] = 0
 
-            points.append(point._to_point(distance))
+        with self._lock.read():
+            selections = self._top_k(queries, weights, k, True, block_size, get_metric(metric), threads)
 
-        return Neighbors(points)
+            return kernels.average(selections, [dataset._columns() for dataset in self.datasets], dimension,
+                                   weighted=vote == "distance")
@@ -1,7 +1,7 @@
 from typing import Union, List
 from typing import TYPE_CHECKING
 
-from EasyKnn.errors import NoDimensionError, ReadOnlyAttributeError, CriticalDeletionError
+from EasyKnn.errors import NoDimensionError, ReadOnlyAttributeError, CriticalDeletionError, StaleNeighborsError
 
 if TYPE_CHECKING:
     from EasyKnn.dataset import Dataset
@@ -19,8 +19,16 @@ class Point:
     :param display_name: the displayed name of the Point. If ``None``, the coordinates will be displayed.
 
     :exception NoDimensionError: If the coordinates are empty or only ``None`` values
+
+    A Point returned by a :class:`Plan<EasyKnn.plan.Plan>` is a view on a row of its Dataset: it only holds the
+    Dataset, the row and the distance, and reads its coordinates from the Dataset the first time they are accessed.
+    If the Dataset changed since the query, they are not read, and a
+    :class:`StaleNeighborsError<EasyKnn.errors.StaleNeighborsError>` is raised.
     """
 
+    # Points are created by the thousand for each query: without a __dict__, each one takes several times less memory
+    __slots__ = ("_coordinates", "_distance", "_dataset", "_row", "_dimension", "_version", "display_name")
+
     def __init__(self, coordinates: List[Union[int, float, None]],
                  distance: float, dataset: "Dataset", display_name: Union[str, None]):
 
@@ -36,14 +44,58 @@ class Point:
         self._distance = distance
         self._dataset = dataset
 
+        # The Point already holds its coordinates, it is not a view on a row of the Dataset
+        self._row = None
+
+    @classmethod
+    def _view(cls, dataset: "Dataset", row: int, distance: float, dimension: int = 0) -> "Point":
+        """
+        Create a Point reading its coordinates from a row of a :class:`Dataset<EasyKnn.dataset.Dataset>` only when
+        they are accessed. It must be called while the linked :class:`Plan<EasyKnn.plan.Plan>` is locked, as the
+        Point is only valid for the current version of the Dataset. This methode should only be called by the
+        ``Dataset`` class.
+
+        :param dataset: The Dataset holding the Value
+        :param row: The index of the Value in the Dataset
+        :param distance: The distance between the Value and the searched Value
+        :param dimension: The dimension the coordinates are padded to with ``None``
+        :return: a Point object
+        """
+        point = cls.__new__(cls)
+
+        point._coordinates = None
+        point._distance = distance
+        point._dataset = dataset
+        point._row = row
+        point._dimension = dimension
+        point._version = dataset._version
+        point.display_name = dataset._display_name(row)
+
+        return point
+
     # We do not allow the modification and the deletion of the coordinates
     @property
     def coordinates(self) -> List[Union[int, float, None]]:
         """
-        The coordinates of the Point.
+        The coordinates of the Point. The coordinates of a Point returned by a :class:`Plan<EasyKnn.plan.Plan>` are
+        read from its Dataset the first time they are accessed.
 
         :read-only: True
+        :exception StaleNeighborsError: If the Dataset changed between the query and the first access
         """
+        if self._coordinates is None:
+            with self._dataset._reading():
+                # Read now, the row could be the one of a Value changed or added after the query
+                if self._dataset._version != self._version:
+                    raise StaleNeighborsError("The dataset changed since the point was found")
+
+                coordinates = list(self._dataset._row_coordinates(self._row))
+
+            if len(coordinates) < self._dimension:
+                coordinates.extend([None] * (self._dimension - len(coordinates)))
+
+            self._coordinates = coordinates
+
         return self._coordinates
 
     @coordinates.setter
@@ -0,0 +1,410 @@
+import bisect
+import heapq
+import random
+from array import array
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+from EasyKnn import kernels
+from EasyKnn.errors import CriticalDeletionError
+from EasyKnn.index import Index
+from EasyKnn.ivf import _kmeans, _numpy_nearest
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The number of rows encoded at once
+_CHUNK = 65536
+
+
+class PQIndex(Index):
+    """
+    An approximate product-quantization index over all the :class:`Values<EasyKnn.value.Value>` of a
+    :class:`Plan<EasyKnn.plan.Plan>`, holding the values as a few bytes each instead of their coordinates. The
+    dimensions are split into ``subvectors`` contiguous groups, and a codebook of ``2 ** bits`` centroids is trained
+    with k-means for each group. A value is then stored as the index of the nearest centroid of each of its groups, one
+    byte per group.
+
+    A query computes, for each group, the distance of its coordinates to every centroid once, and the distance to a
+    value is the sum of the distances of its centroids (asymmetric distance computation): the query itself is not
+    quantized. With ``rerank``, the ``rerank`` nearest values found this way are compared again with their exact
+    coordinates, and the ``k`` nearest of them are returned with their exact distance. To keep the full-precision
+    coordinates on disk, save the Plan and load it again with :meth:`Plan.load<EasyKnn.plan.Plan.load>` and
+    ``mmap=True``: only the reranked values are then read.
+
+    Missing coordinates are skipped like by :meth:`Plan._distance<EasyKnn.plan.Plan._distance>`: the missing
+    coordinates of the query are left out of the distance tables, and the values with missing coordinates keep a bit
+    mask of their defined ones, so that only those are summed.
+
+    When values are only added to the Datasets of the Plan, the next query encodes the new values with the trained
+    codebooks. When a value changes, or the Plan gets wider, the codebooks are trained again.
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to index
+    :param subvectors: The number of groups of dimensions, at most the number of dimensions of the Plan
+    :param bits: The number of bits of the index of a centroid, from 1 to 8
+    :param rerank: The number of values compared again with their exact coordinates. See
+            :attr:`rerank<EasyKnn.pq.PQIndex.rerank>`.
+    :param sample_size: The number of values the codebooks are trained on, taken at random. If ``None``, all the
+            values are used.
+    :param iterations: The largest number of k-means iterations
+    :param seed: The seed of the random choice of the sample and of the first centroids
+
+    >>> from EasyKnn import Plan, Dataset, Value
+    >>> plan = Plan()
+    >>> dataset = Dataset()
+    >>> dataset.add_values([Value([x, y]) for x in range(10) for y in range(10)])
+    >>> plan.add_dataset(dataset)
+    >>> index = PQIndex(plan, subvectors=2, bits=3, rerank=10)
+    >>> index.query([2, 7.25], [1, 1], k=2)
+    [(0.25, 0, 27), (0.75, 0, 28)]
+    >>> index.saved_evaluations
+    90
+    """
+
+    def __init__(self, plan: "Plan", subvectors: int = 8, bits: int = 8, rerank: int = 0, sample_size: int = None,
+                 iterations: int = 10, seed: int = 0):
+        super().__init__(plan)
+
+        if subvectors < 1:
+            raise ValueError("The number of subvectors must be at least 1")
+
+        if not 1 <= bits <= 8:
+            raise ValueError("The number of bits of a code must be between 1 and 8")
+
+        if sample_size is not None and sample_size < 1:
+            raise ValueError("The sample size must be at least 1")
+
+        if iterations < 1:
+            raise ValueError("The number of iterations must be at least 1")
+
+        self._subvectors = subvectors
+        self._bits = bits
+        self.rerank = rerank
+        self._sample_size = sample_size
+        self._iterations = iterations
+        self._seed = seed
+
+        self._width = 0
+        self._codebooks = array("d")
+
+        self.build()
+
+    @property
+    def rerank(self) -> int:
+        """
+        The number of values a query compares again with their exact coordinates, ``0`` to return the approximate
+        distances. It can be changed between two queries to trade speed for recall.
+
+        :read-only: False
+        """
+        return self._rerank
+
+    @rerank.setter
+    def rerank(self, value: int):
+        if value < 0:
+            raise ValueError("The number of reranked values cannot be negative")
+
+        self._rerank = value
+
+    @rerank.deleter
+    def rerank(self):
+        raise CriticalDeletionError("The rerank attribute cannot be deleted")
+
+    @property
+    def code_size(self) -> int:
+        """
+        The number of bytes holding the codes of a value.
+
+        :read-only: True
+        """
+        return len(self._bounds) - 1
+
+    def build(self) -> None:
+        if self._codebooks and self._only_added():
+            self._encode()
+
+        else:
+            self.train()
+
+        self._stale = False
+
+    def _options(self) -> dict:
+        return {"subvectors": self._subvectors, "bits": self._bits, "rerank": self._rerank,
+                "sample_size": self._sample_size, "iterations": self._iterations, "seed": self._seed}
+
+    def train(self, sample_size: int = None) -> None:
+        """
+        Train the codebook of each group of dimensions with k-means on a random sample of the values of the Plan,
+        then encode every value.
+
+        :param sample_size: The number of values the codebooks are trained on. If ``None``, the ``sample_size`` of
+                the index is used.
+        :return: ``None``
+        """
+        if sample_size is None:
+            sample_size = self._sample_size
+
+        storages = [dataset._columns() for dataset in self._plan.datasets]
+        self._width = max([storage.width for storage in storages] or [0])
+
+        total = sum([len(storage) for storage in storages])
+        generator = random.Random(self._seed)
+
+        if sample_size is None or sample_size >= total:
+            sample = range(total)
+
+        else:
+            sample = sorted(generator.sample(range(total), sample_size))
+
+        points = self._sample_points(storages, sample)
+
+        # The groups split the dimensions as evenly as possible
+        groups = min(self._subvectors, self._width) if points else 0
+        self._bounds = [group * self._width // groups for group in range(groups + 1)] if groups else [0]
+
+        self._codebooks = array("d")
+        self._codebook_starts = []
+        for start, stop in zip(self._bounds, self._bounds[1:]):
+            self._codebook_starts.append(len(self._codebooks))
+            self._codebooks.extend(_kmeans([point[start:stop] for point in points], stop - start,
+                                           min(2 ** self._bits, len(points)), self._iterations, generator))
+
+        # The position of a value in the codes is found from the runs of consecutive rows of a Dataset, saved as
+        # (first position, dataset index, first row)
+        self._runs = array("q")
+        self._codes = array("B")
+
+        # The positions of the values with missing coordinates, and the bit mask of their defined coordinates
+        self._masked = array("q")
+        self._masks = array("B")
+
+        self._size = 0
+        self._indexed = []
+
+        self._encode()
+
+    def _codebook(self, group: int) -> Tuple[array, int, int]:
+        """
+        Get the codebook of a group of dimensions.
+
+        :param group: The index of the group
+        :return: A ``(centroids, first dimension, width)`` tuple, where ``centroids`` holds the row-major centroids
+        """
+        start, stop = self._bounds[group], self._bounds[group + 1]
+        width = stop - start
+        end = self._codebook_starts[group + 1] if group + 1 < len(self._codebook_starts) else len(self._codebooks)
+
+        return self._codebooks[self._codebook_starts[group]:end], start, width
+
+    def _encode(self) -> None:
+        """
+        Encode the values added since the index was built.
+
+        :return: ``None``
+        """
+        self._own("_runs", "_codes", "_masked", "_masks")
+
+        groups = self.code_size
+        mask_size = (self._width + 7) // 8
+        codebooks = [self._codebook(group) for group in range(groups)]
+
+        for dataset_index, storage, start in self._added():
+            if start < len(storage):
+                self._runs.extend([self._size, dataset_index, start])
+
+            for chunk in range(start, len(storage), _CHUNK):
+                stop = min(chunk + _CHUNK, len(storage))
+                columns = storage.width
+
+                if numpy is not None:
+                    # The dimensions past the width of the storage are missing
+                    matrix = numpy.full((stop - chunk, self._width), numpy.nan)
+                    matrix[:, :columns] = storage.matrix(chunk, stop)
+
+                    codes = numpy.empty((stop - chunk, groups), dtype=numpy.uint8)
+                    for group, (centroids, first, width) in enumerate(codebooks):
+                        codes[:, group] = _numpy_nearest(matrix[:, first:first + width],
+                                                         numpy.frombuffer(centroids, dtype=numpy.float64)
+                                                         .reshape(-1, width))
+
+                    self._codes.frombytes(codes.tobytes())
+
+                    defined = ~numpy.isnan(matrix)
+                    masked = numpy.flatnonzero(~defined.all(axis=1))
+                    self._masked.frombytes((masked + self._size).astype(numpy.int64).tobytes())
+                    self._masks.frombytes(numpy.packbits(defined[masked], axis=1).tobytes())
+
+                    self._size += stop - chunk
+                    continue
+
+                buffer = storage.values(chunk, stop)
+
+                for base in range(0, (stop - chunk) * columns, columns):
+                    point = list(buffer[base:base + columns]) + [float("nan")] * (self._width - columns)
+
+                    for codebook in codebooks:
+                        self._codes.append(_nearest(codebook, point))
+
+                    if any([coord != coord for coord in point]):  # NaN != NaN
+                        mask = [0] * mask_size
+                        for i, coord in enumerate(point):
+                            if coord == coord:
+                                mask[i // 8] |= 128 >> (i % 8)
+
+                        self._masked.append(self._size)
+                        self._masks.extend(mask)
+
+                    self._size += 1
+
+        self._mark_indexed()
+
+    def _locate(self, position: int) -> Tuple[int, int]:
+        """
+        Get the value at a position of the codes.
+
+        :param position: The position
+        :return: The ``(dataset index, row)`` of the value
+        """
+        run = bisect.bisect_right(self._runs[0::3], position) - 1
+
+        return self._runs[run * 3 + 1], self._runs[run * 3 + 2] + position - self._runs[run * 3]
+
+    def query(self, query: List[Union[int, float, None]], weights: List[float], k: int,
+              use_abs: bool = True) -> List[Tuple[float, int, int]]:
+        self._evaluations = 0
+
+        if not self._size or k <= 0:
+            return []
+
+        dimensions = [(i, query[i], weights[i]) for i in range(min(self._width, len(query))) if query[i] is not None]
+        count = max(k, self._rerank) if self._rerank else k
+
+        if numpy is not None:
+            nearest = self._numpy_nearest_positions(dimensions, count)
+
+        else:
+            nearest = self._nearest_positions(dimensions, count)
+
+        if not self._rerank:
+            return sorted([(kernels.finish(coord_sum, use_abs),) + self._locate(position)
+                           for coord_sum, position in nearest])
+
+        rows = {}
+        for _, position in nearest:
+            dataset_index, row = self._locate(position)
+            rows.setdefault(dataset_index, []).append(row)
+
+        self._evaluations = len(nearest)
+
+        storages = [dataset._columns() for dataset in self._plan.datasets]
+
+        return sorted(kernels.rerank(query, storages, weights, sorted(rows.items()), k, use_abs))
+
+    def _tables(self, dimensions: List[Tuple[int, float, float]]) -> Tuple[list, dict]:
+        """
+        Get the distance tables of a query.
+
+        :param dimensions: The ``(dimension, coordinate, weight)`` of each defined coordinate of the query
+        :return: A ``(tables, dimension tables)`` tuple. ``tables`` holds, for each group, the weighted sum of
+                squares between the query and each centroid of the group. ``dimension tables`` holds the same sum for
+                each defined dimension of the query alone, by dimension.
+        """
+        dimension_tables = {}
+
+        for group in range(self.code_size):
+            centroids, first, width = self._codebook(group)
+
+            for i, coord, weight in dimensions:
+                if first <= i < first + width:
+                    dimension_tables[i] = [(coord - centroids[centroid * width + i - first]) ** 2 * weight
+                                           for centroid in range(len(centroids) // width)]
+
+        tables = []
+        for group in range(self.code_size):
+            centroids, first, width = self._codebook(group)
+            columns = [dimension_tables[i] for i in range(first, first + width) if i in dimension_tables]
+            tables.append([sum(sums) for sums in zip(*columns)] if columns else [0.0] * (len(centroids) // width))
+
+        return tables, dimension_tables
+
+    def _nearest_positions(self, dimensions: List[Tuple[int, float, float]], count: int) -> List[Tuple[float, int]]:
+        """
+        Get the positions of the nearest values of a query, from their codes.
+
+        :param dimensions: The ``(dimension, coordinate, weight)`` of each defined coordinate of the query
+        :param count: The number of positions to get
+        :return: A ``list`` of ``(weighted sum of squares, position)`` tuples
+        """
+        tables, dimension_tables = self._tables(dimensions)
+        groups = self.code_size
+        codes = self._codes
+
+        sums = [sum([tables[group][codes[position * groups + group]] for group in range(groups)])
+                for position in range(self._size)]
+
+        # The values with missing coordinates only sum the distances of their defined coordinates
+        mask_size = (self._width + 7) // 8
+        group_of = [bisect.bisect_right(self._bounds, i) - 1 for i in range(self._width)]
+
+        for masked, position in enumerate(self._masked):
+            mask = self._masks[masked * mask_size:(masked + 1) * mask_size]
+            sums[position] = sum([table[codes[position * groups + group_of[i]]]
+                                  for i, table in dimension_tables.items() if mask[i // 8] & (128 >> (i % 8))])
+
+        return heapq.nsmallest(count, zip(sums, range(self._size)))
+
+    def _numpy_nearest_positions(self, dimensions: List[Tuple[int, float, float]],
+                                 count: int) -> List[Tuple[float, int]]:
+        """
+        Same as :meth:`_nearest_positions<EasyKnn.pq.PQIndex._nearest_positions>`, with numpy.
+        """
+        tables, dimension_tables = self._tables(dimensions)
+        groups = self.code_size
+
+        codes = numpy.frombuffer(self._codes, dtype=numpy.uint8).reshape(self._size, groups)
+        sums = numpy.zeros(self._size)
+
+        for group, table in enumerate(tables):
+            sums += numpy.array(table)[codes[:, group]]
+
+        if len(self._masked):
+            positions = numpy.frombuffer(self._masked, dtype=numpy.int64)
+            defined = numpy.unpackbits(numpy.frombuffer(self._masks, dtype=numpy.uint8).reshape(len(positions), -1),
+                                       axis=1).astype(bool)
+
+            masked_sums = numpy.zeros(len(positions))
+            for i, table in dimension_tables.items():
+                group = bisect.bisect_right(self._bounds, i) - 1
+                masked_sums += numpy.where(defined[:, i], numpy.array(table)[codes[positions, group]], 0.0)
+
+            sums[positions] = masked_sums
+
+        if count < len(sums):
+            nearest = numpy.argpartition(sums, count - 1)[:count]
+
+        else:
+            nearest = numpy.arange(len(sums))
+
+        return sorted(zip(sums[nearest].tolist(), nearest.tolist()))
+
+
+def _nearest(codebook: Tuple[array, int, int], point: List[float]) -> int:
+    """
+    Get the nearest centroid of a codebook to a point, over the defined coordinates of the point in the group of the
+    codebook.
+
+    :param codebook: The ``(centroids, first dimension, width)`` of the codebook
+    :param point: The coordinates of the point, NaN for the missing ones
+    :return: The index of the centroid
+    """
+    centroids, first, width = codebook
+    coords = [(i, point[first + i]) for i in range(width) if point[first + i] == point[first + i]]
+
+    sums = [sum([(coord - centroids[centroid * width + i]) ** 2 for i, coord in coords])
+            for centroid in range(len(centroids) // width)]
+
+    return sums.index(min(sums))
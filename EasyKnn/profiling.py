@@ -0,0 +1,191 @@
+import threading
+import time
+from typing import Dict, Union
+
+# The stages of a query, in the order they run
+STAGES = ("wait", "build", "distances", "selection", "points", "ranking", "sorting")
+
+
+class QueryStats:
+    """
+    The time spent in each stage of a :meth:`Plan.neighbors<EasyKnn.plan.Plan.neighbors>` query, and the counters of
+    its work. It is attached to the returned :class:`Neighbors<EasyKnn.neighbors.Neighbors>` as
+    :attr:`Neighbors.stats<EasyKnn.neighbors.Neighbors.stats>` when the query is profiled.
+
+    The stages are:
+
+    - ``"wait"``: waiting for the lock of the Plan, while a :class:`Dataset<EasyKnn.dataset.Dataset>` changes
+    - ``"build"``: building the :attr:`index<EasyKnn.plan.Plan.index>` again, when it is stale
+    - ``"distances"``: computing the distances, by the engine, the index or the pool
+    - ``"selection"``: selecting the ``k`` nearest and farthest distances
+    - ``"points"``: creating the :class:`Points<EasyKnn.point.Point>`
+    - ``"ranking"``: ranking the Datasets by the average distance of their Points
+    - ``"sorting"``: sorting the Points by distance
+
+    The Points created (and sorted) later, when :attr:`Neighbors.neighbors<EasyKnn.neighbors.Neighbors.neighbors>` is
+    first read, add their time to the stats when it happens.
+
+    This object should not be directly created, but read from the Neighbors.
+
+    :param engine: The engine asked for the query
+
+    >>> stats = QueryStats("vector")
+    >>> with stats.stage("distances"):
+    ...     pass
+    >>> stats.candidates = stats.evaluations = 3
+    >>> stats.engine, stats.candidates, stats.evaluations, stats.memo_hits, stats.pruned
+    ('vector', 3, 3, 0, None)
+    >>> sorted(stats.timings), stats.total >= stats.timings["distances"]
+    (['distances'], True)
+    """
+
+    def __init__(self, engine: str):
+        self.engine = engine
+
+        # The wall time of each stage that ran, in seconds
+        self._timings = {}
+
+        self.candidates = 0
+        self.evaluations = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.pruned = None
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """
+        A ``dict`` with the wall time of each stage that ran, in seconds.
+
+        :read-only: True
+        """
+        return self._timings
+
+    @property
+    def total(self) -> float:
+        """
+        The wall time of all the stages, in seconds.
+
+        :read-only: True
+        """
+        return sum(self._timings.values())
+
+    def stage(self, name: str) -> "_Stage":
+        """
+        Time a stage, with a ``with`` statement. A stage timed several times adds up.
+
+        :param name: The name of the stage
+        :return: A context manager timing its block
+        """
+        return _Stage(self._timings, name)
+
+    def as_dict(self) -> dict:
+        """
+        Get the stats as a ``dict``, to be sent to a metrics system.
+
+        :return: A ``dict`` with the engine, the timings and the counters
+        """
+        return {"engine": self.engine, "timings": dict(self._timings), "total": self.total,
+                "candidates": self.candidates, "evaluations": self.evaluations, "memo_hits": self.memo_hits,
+                "memo_misses": self.memo_misses, "pruned": self.pruned}
+
+    def __repr__(self):
+        return f"<QueryStats {self.as_dict()}>"
+
+
+class _Stage:
+    """
+    Add the wall time of a ``with`` block to a stage.
+
+    :param timings: The timings of the stats
+    :param name: The name of the stage
+    """
+    __slots__ = ("_timings", "_name", "_start")
+
+    def __init__(self, timings: Union[Dict[str, float], None], name: str):
+        self._timings = timings
+        self._name = name
+
+    def __enter__(self):
+        if self._timings is not None:
+            self._start = time.perf_counter()
+
+    def __exit__(self, *args):
+        if self._timings is not None:
+            self._timings[self._name] = self._timings.get(self._name, 0.0) + time.perf_counter() - self._start
+
+
+# Used by the queries that are not profiled
+_UNTIMED = _Stage(None, "")
+
+
+def stage(stats: Union[QueryStats, None], name: str) -> _Stage:
+    """
+    Time a stage of a query, if it is profiled.
+
+    :param stats: The :class:`QueryStats<EasyKnn.profiling.QueryStats>` of the query, or ``None``
+    :param name: The name of the stage
+    :return: A context manager timing its block, that does nothing if ``stats`` is ``None``
+    """
+    return _UNTIMED if stats is None else stats.stage(name)
+
+
+class StatsCollector:
+    """
+    A hook for :meth:`Plan.add_stats_hook<EasyKnn.plan.Plan.add_stats_hook>`, adding up the
+    :class:`QueryStats<EasyKnn.profiling.QueryStats>` of the queries of a Plan. It can be read while queries run.
+
+    >>> collector = StatsCollector()
+    >>> stats = QueryStats("python")
+    >>> stats.candidates, stats.memo_hits = 4, 1
+    >>> collector(stats)
+    >>> collector(stats)
+    >>> collector.queries, collector.totals()["candidates"], collector.totals()["memo_hits"]
+    (2, 8, 2)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def queries(self) -> int:
+        """
+        The number of queries added up.
+
+        :read-only: True
+        """
+        return self._queries
+
+    def __call__(self, stats: QueryStats) -> None:
+        with self._lock:
+            self._queries += 1
+            self._engines[stats.engine] = self._engines.get(stats.engine, 0) + 1
+
+            for name, seconds in stats.timings.items():
+                self._timings[name] = self._timings.get(name, 0.0) + seconds
+
+            for name in self._counters:
+                self._counters[name] += getattr(stats, name) or 0
+
+    def totals(self) -> dict:
+        """
+        Get the sums of the stats of the queries.
+
+        :return: A ``dict`` with the number of queries, the number of queries of each engine, the total time of each
+                stage in seconds, and the sum of each counter
+        """
+        with self._lock:
+            return dict({"queries": self._queries, "engines": dict(self._engines), "timings": dict(self._timings)},
+                        **self._counters)
+
+    def reset(self) -> None:
+        """
+        Forget the queries added up so far.
+
+        :return: ``None``
+        """
+        with self._lock:
+            self._queries = 0
+            self._engines = {}
+            self._timings = {}
+            self._counters = {"candidates": 0, "evaluations": 0, "memo_hits": 0, "memo_misses": 0, "pruned": 0}
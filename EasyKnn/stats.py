@@ -0,0 +1,289 @@
+from array import array
+from typing import Callable, Iterable, List, Tuple, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class RunningStatistics:
+    """
+    Per-dimension statistics of a collection of coordinates, updated as coordinates are added and removed instead of
+    being computed again from all of them: the number of defined coordinates, their sum, their mean and the sum of
+    their squared deviations from the mean (with Welford's algorithm), and their minimum and maximum. A missing
+    coordinate (``None`` or NaN, or a dimension past the length of a row) is only counted as missing.
+
+    This object should not be directly created, but read from
+    :attr:`Dataset.statistics<EasyKnn.dataset.Dataset.statistics>`.
+
+    :param column: A function giving every coordinate of a dimension, used to find its minimum and maximum again
+            after the removal of one of them. If ``None``, removing a minimum or a maximum is not supported.
+
+    >>> statistics = RunningStatistics()
+    >>> statistics.add([1, 2])
+    >>> statistics.add([3, None, 5])
+    >>> statistics.rows, statistics.counts, statistics.missing
+    (2, [2, 1, 1], [0, 1, 1])
+    >>> statistics.average(), statistics.variance()
+    ([2.0, 2.0, 5.0], [1.0, 0.0, 0.0])
+    >>> statistics.bounding_box()
+    ([1, 2, 5], [3, 2, 5])
+    """
+
+    def __init__(self, column: Callable[[int], Iterable[Union[float, None]]] = None):
+        self._column = column
+        self._rows = 0
+
+        self._counts = []
+        self._sums = []
+        self._means = []
+        self._m2 = []
+        self._minimums = []
+        self._maximums = []
+
+        # The dimensions whose minimum or maximum was removed, and must be found again before being read
+        self._stale_bounds = set()
+
+    @classmethod
+    def combine(cls, parts: List["RunningStatistics"]) -> "RunningStatistics":
+        """
+        Get the statistics of the union of several collections of coordinates, from their own statistics only (with
+        the pairwise update of Chan et al.).
+
+        :param parts: The statistics of each collection
+        :return: A new RunningStatistics object, that cannot remove coordinates
+
+        >>> first, second = RunningStatistics(), RunningStatistics()
+        >>> first.add([1, 10])
+        >>> second.add([3])
+        >>> second.add([5])
+        >>> combined = RunningStatistics.combine([first, second])
+        >>> combined.average(), combined.variance()
+        ([3.0, 10.0], [2.6666666666666665, 0.0])
+        """
+        combined = cls()
+
+        for part in parts:
+            part._refresh_bounds()
+            combined._widen(part.width)
+            combined._rows += part._rows
+
+            for i in range(part.width):
+                combined._merge(i, part._counts[i], part._sums[i], part._means[i], part._m2[i], part._minimums[i],
+                                part._maximums[i])
+
+        return combined
+
+    @property
+    def rows(self) -> int:
+        """
+        The number of rows of coordinates.
+        """
+        return self._rows
+
+    @property
+    def width(self) -> int:
+        """
+        The number of dimensions, the length of the longest row added so far.
+        """
+        return len(self._counts)
+
+    @property
+    def counts(self) -> List[int]:
+        """
+        The number of defined coordinates of each dimension.
+        """
+        return list(self._counts)
+
+    @property
+    def missing(self) -> List[int]:
+        """
+        The number of rows without a coordinate in each dimension.
+        """
+        return [self._rows - count for count in self._counts]
+
+    @property
+    def sums(self) -> List[float]:
+        """
+        The sum of the defined coordinates of each dimension.
+        """
+        return list(self._sums)
+
+    def _widen(self, width: int) -> None:
+        """
+        Add the empty statistics of the dimensions up to ``width``.
+        """
+        for _ in range(self.width, width):
+            self._counts.append(0)
+            self._sums.append(0)
+            self._means.append(0.0)
+            self._m2.append(0.0)
+            self._minimums.append(None)
+            self._maximums.append(None)
+
+    def add(self, coordinates: List[Union[int, float, None]]) -> None:
+        """
+        Add a row of coordinates.
+
+        :param coordinates: The coordinates, ``None`` or NaN for a missing one
+        :return: ``None``
+        """
+        self._widen(len(coordinates))
+        self._rows += 1
+
+        for i, coord in enumerate(coordinates):
+            if coord is None or coord != coord:  # NaN != NaN
+                continue
+
+            count = self._counts[i] = self._counts[i] + 1
+            self._sums[i] += coord
+
+            delta = coord - self._means[i]
+            self._means[i] += delta / count
+            self._m2[i] += delta * (coord - self._means[i])
+
+            if self._minimums[i] is None or coord < self._minimums[i]:
+                self._minimums[i] = coord
+
+            if self._maximums[i] is None or coord > self._maximums[i]:
+                self._maximums[i] = coord
+
+    def remove(self, coordinates: List[Union[int, float, None]]) -> None:
+        """
+        Remove a row of coordinates, added before.
+
+        :param coordinates: The coordinates, ``None`` or NaN for a missing one
+        :return: ``None``
+        """
+        self._rows -= 1
+
+        for i, coord in enumerate(coordinates):
+            if coord is None or coord != coord:
+                continue
+
+            count = self._counts[i] = self._counts[i] - 1
+            self._sums[i] -= coord
+
+            if count == 0:
+                self._sums[i] = 0
+                self._means[i] = 0.0
+                self._m2[i] = 0.0
+                self._minimums[i] = self._maximums[i] = None
+                self._stale_bounds.discard(i)
+                continue
+
+            delta = coord - self._means[i]
+            self._means[i] -= delta / count
+            # The rounding errors must not make the sum negative
+            self._m2[i] = max(self._m2[i] - delta * (coord - self._means[i]), 0.0)
+
+            if coord == self._minimums[i] or coord == self._maximums[i]:
+                self._stale_bounds.add(i)
+
+    def add_block(self, block: array, width: int) -> None:
+        """
+        Add the rows of a row-major block of floats at once.
+
+        :param block: An ``array('d')`` of rows of ``width`` floats. A NaN is a missing coordinate.
+        :param width: The number of coordinates of each row
+        :return: ``None``
+
+        >>> statistics = RunningStatistics()
+        >>> statistics.add_block(array("d", [1, 2, 3, float("nan")]), 2)
+        >>> statistics.counts, statistics.average()
+        ([2, 1], [2.0, 2.0])
+        """
+        if not width or not block:
+            return
+
+        self._widen(width)
+        self._rows += len(block) // width
+
+        for i in range(width):
+            if numpy is not None:
+                column = numpy.frombuffer(block, dtype=numpy.float64)[i::width]
+                column = column[~numpy.isnan(column)]
+
+                if not len(column):
+                    continue
+
+                mean = float(column.mean())
+                self._merge(i, len(column), float(column.sum()), mean, float(((column - mean) ** 2).sum()),
+                            float(column.min()), float(column.max()))
+                continue
+
+            column = [coord for coord in block[i::width] if coord == coord]  # NaN != NaN
+
+            if not column:
+                continue
+
+            total = sum(column)
+            mean = total / len(column)
+            self._merge(i, len(column), total, mean, sum([(coord - mean) ** 2 for coord in column]), min(column),
+                        max(column))
+
+    def _merge(self, i: int, count: int, total: float, mean: float, m2: float, minimum: float,
+               maximum: float) -> None:
+        """
+        Add the statistics of other coordinates of a dimension, without adding rows.
+        """
+        if not count:
+            return
+
+        own = self._counts[i]
+        delta = mean - self._means[i]
+
+        self._counts[i] = own + count
+        self._sums[i] += total
+        self._means[i] += delta * count / (own + count)
+        self._m2[i] += m2 + delta * delta * own * count / (own + count)
+
+        if self._minimums[i] is None or minimum < self._minimums[i]:
+            self._minimums[i] = minimum
+
+        if self._maximums[i] is None or maximum > self._maximums[i]:
+            self._maximums[i] = maximum
+
+    def _refresh_bounds(self) -> None:
+        """
+        Find again the minimum and maximum of the dimensions where one of them was removed.
+        """
+        if not self._stale_bounds:
+            return
+
+        if self._column is None:
+            raise ValueError("The bounds cannot be found again without the coordinates")
+
+        for i in sorted(self._stale_bounds):
+            coords = [coord for coord in self._column(i) if coord is not None and coord == coord]
+            self._minimums[i] = min(coords, default=None)
+            self._maximums[i] = max(coords, default=None)
+
+        self._stale_bounds.clear()
+
+    def average(self) -> List[Union[float, None]]:
+        """
+        Get the mean of each dimension, or ``None`` for a dimension without any coordinate.
+
+        :return: A ``list`` with the mean of each dimension
+        """
+        return [total / count if count else None for total, count in zip(self._sums, self._counts)]
+
+    def variance(self) -> List[float]:
+        """
+        Get the population variance of each dimension, ``0`` for a dimension without any coordinate.
+
+        :return: A ``list`` with the variance of each dimension
+        """
+        return [m2 / count if count else 0 for m2, count in zip(self._m2, self._counts)]
+
+    def bounding_box(self) -> Tuple[List[Union[float, None]], List[Union[float, None]]]:
+        """
+        Get the minimum and the maximum of each dimension, ``None`` for a dimension without any coordinate.
+
+        :return: A ``(minimums, maximums)`` tuple of lists
+        """
+        self._refresh_bounds()
+
+        return list(self._minimums), list(self._maximums)
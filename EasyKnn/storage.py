@@ -0,0 +1,662 @@
+import struct
+from array import array
+from typing import List, Union, Iterable, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A missing coordinate (a ``None`` in a Value) is stored as a NaN in the matrix.
+_MISSING = float("nan")
+
+# The storage types of the coordinates, with the typecode of their array. Python arrays have no half floats, so a
+# float16 is stored as its 16 bits.
+DTYPES = {"float64": "d", "float32": "f", "float16": "H", "int8": "b"}
+
+# The code of a missing coordinate, for each storage type
+_MISSING_CODES = {"float64": _MISSING, "float32": _MISSING, "float16": 0x7E00, "int8": -128}
+
+# The largest coordinate of the floating point storage types
+_LIMITS = {"float32": 3.4028234663852886e+38, "float16": 65504.0}
+
+# An int8 code goes from -127 to 127 (-128 is a missing coordinate)
+_STEPS = 254
+
+
+class ColumnarStorage:
+    """
+    A contiguous, row-major float matrix holding the coordinates of a :class:`Dataset<EasyKnn.dataset.Dataset>`.
+    Each row is a :class:`Value<EasyKnn.value.Value>`, and each column a dimension. Missing coordinates (``None``)
+    are stored as NaN, and rows shorter than the matrix are padded with NaN.
+
+    The coordinates are stored with one of the :data:`DTYPES<EasyKnn.storage.DTYPES>`:
+
+    - ``"float64"`` (8 bytes, the default) keeps them exactly
+    - ``"float32"`` (4 bytes) keeps about 7 significant digits, up to ``3.4e38``
+    - ``"float16"`` (2 bytes) keeps about 3 significant digits, up to ``65504``
+    - ``"int8"`` (1 byte) maps the range of each column on 255 steps, with a scale and an offset per column: a
+      coordinate is kept within one step, a step being the width of the range of its column divided by 254. When a
+      coordinate falls out of the range of its column, the range grows to at least twice its width, and the column is
+      converted again.
+
+    The coordinates are always read back as float64, so distances are summed in float64 whatever the storage type.
+
+    This object should not be directly created, but only by a :class:`Dataset<EasyKnn.dataset.Dataset>` created with
+    ``columnar=True`` or a ``dtype``.
+
+    >>> storage = ColumnarStorage()
+    >>> storage.append([1, 2], "first")
+    0
+    >>> storage.append([3, None, 5])
+    1
+    >>> storage.width
+    3
+    >>> storage.row(0), storage.row(1)
+    ([1.0, 2.0], [3.0, None, 5.0])
+    >>> compact = ColumnarStorage("int8")
+    >>> compact.extend([([0, 10], None), ([2.5, None], None), ([10, -10], None)])
+    range(0, 3)
+    >>> [round(coord, 2) for coord in compact.row(1)[:1]], compact.row(1)[1]
+    ([2.48], None)
+
+    The distances to a float16 matrix stay within a few thousandths of the exact ones here:
+
+    >>> from EasyKnn.kernels import distances
+    >>> exact, half = ColumnarStorage(), ColumnarStorage("float16")
+    >>> rows = [([0.1 * i, 1 / (i + 1)], None) for i in range(100)]
+    >>> exact.extend(rows), half.extend(rows)
+    (range(0, 100), range(0, 100))
+    >>> pairs = zip(distances([3, 0.5], exact, [1, 1]), distances([3, 0.5], half, [1, 1]))
+    >>> max([abs(first - second) for first, second in pairs]) < 5e-3
+    True
+    """
+
+    def __init__(self, dtype: str = "float64"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown storage type {dtype}, expected one of {', '.join(DTYPES)}")
+
+        self._dtype = dtype
+        self._buffer = array(DTYPES[dtype])
+
+        # The number of columns of the matrix. It only grows, when a longer row is added.
+        self._width = 0
+
+        # The length of each row. It may be smaller than the width, when the row is shorter than others.
+        self._lengths = array("l")
+
+        # The length every row is at least presented with, set by pad. It may be greater than the width.
+        self._min_length = 0
+
+        self._names = []
+
+        # The range of each column of an int8 matrix, NaN until the column gets a coordinate. A code ``c`` stands
+        # for the coordinate ``(low + high) / 2 + c * (high - low) / 254``.
+        self._lows = array("d")
+        self._highs = array("d")
+
+    @classmethod
+    def _from_buffers(cls, buffer: Union[array, memoryview], width: int, lengths: Union[array, memoryview],
+                      names: List[Union[str, None]], dtype: str = "float64", lows: List[float] = None,
+                      highs: List[float] = None, min_length: int = 0) -> "ColumnarStorage":
+        """
+        Create a storage over existing buffers, without copying them. The buffers may be read-only ``memoryview``
+        objects, such as the ones of a memory-mapped file: they are then copied the first time the storage changes.
+        This methode should only be called by :func:`load<EasyKnn.persistence.load>`.
+
+        :param buffer: The row-major codes of the matrix, of the storage type
+        :param width: The number of columns of the matrix
+        :param lengths: The length each row is presented with
+        :param names: The displayed name of each row
+        :param dtype: The storage type of the coordinates
+        :param lows: The lowest coordinate of the range of each column of an int8 matrix
+        :param highs: The highest coordinate of the range of each column of an int8 matrix
+        :param min_length: The length every row is at least presented with. See
+                :meth:`pad<EasyKnn.storage.ColumnarStorage.pad>`.
+        :return: a ColumnarStorage object
+        """
+        storage = cls(dtype)
+
+        storage._buffer = buffer
+        storage._width = width
+        storage._lengths = lengths
+        storage._names = names
+        storage._lows = array("d", lows if lows is not None else [_MISSING] * width)
+        storage._highs = array("d", highs if highs is not None else [_MISSING] * width)
+        storage._min_length = min_length
+
+        return storage
+
+    def _own(self) -> None:
+        """
+        Copy the buffers of the storage if they are read-only views, before they change.
+
+        :return: ``None``
+        """
+        if isinstance(self._buffer, memoryview):
+            owned = array(DTYPES[self._dtype])
+            owned.frombytes(self._buffer.cast("B"))
+            self._buffer = owned
+
+        if isinstance(self._lengths, memoryview):
+            owned = array(self._lengths.format)
+            owned.frombytes(self._lengths.cast("B"))
+            self._lengths = owned
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    @property
+    def width(self) -> int:
+        """
+        The number of columns of the matrix.
+
+        :read-only: True
+        """
+        return self._width
+
+    @property
+    def dtype(self) -> str:
+        """
+        The storage type of the coordinates, one of the :data:`DTYPES<EasyKnn.storage.DTYPES>`.
+
+        :read-only: True
+        """
+        return self._dtype
+
+    @property
+    def buffer(self) -> array:
+        """
+        The underlying row-major array of the matrix, of the storage type. It holds ``len(storage) * width`` codes.
+        For a storage loaded from a file, it may be a read-only ``memoryview`` until the storage changes. Use
+        :meth:`values<EasyKnn.storage.ColumnarStorage.values>` or :meth:`matrix<EasyKnn.storage.ColumnarStorage.matrix>`
+        to read the coordinates as floats.
+
+        :read-only: True
+        """
+        return self._buffer
+
+    def _widen(self, width: int) -> None:
+        """
+        Grow the number of columns of the matrix, padding every existing row with NaN.
+
+        :param width: The new width of the matrix
+        :return: ``None``
+        """
+        if width <= self._width:
+            return
+
+        self._own()
+        old_width = self._width
+        padding = array(DTYPES[self._dtype], [_MISSING_CODES[self._dtype]]) * (width - old_width)
+
+        widened = array(DTYPES[self._dtype])
+        for start in range(0, len(self._buffer), old_width or 1):
+            widened.extend(self._buffer[start:start + old_width])
+            widened.extend(padding)
+
+        self._buffer = widened
+        self._width = width
+
+        self._lows.extend(array("d", [_MISSING]) * (width - old_width))
+        self._highs.extend(array("d", [_MISSING]) * (width - old_width))
+
+    def _encode(self, coordinates: List[Union[int, float, None]]) -> array:
+        """
+        Convert a list of coordinates to a full row of floats.
+
+        :param coordinates: The coordinates to convert
+        :return: An ``array('d')`` of ``width`` floats
+        """
+        row = array("d", [_MISSING if coord is None else coord for coord in coordinates])
+        row.extend(array("d", [_MISSING]) * (self._width - len(row)))
+        return row
+
+    def _pack(self, block: array) -> array:
+        """
+        Convert full rows of floats to codes of the storage type. For an int8 matrix, the ranges of the columns are
+        grown first if needed.
+
+        :param block: An ``array('d')`` of rows of ``width`` floats
+        :return: An array of the storage type, with one code per float
+        """
+        if self._dtype == "float64":
+            return block
+
+        limit = _LIMITS.get(self._dtype)
+        if numpy is not None:
+            too_large = limit is not None and bool((numpy.abs(numpy.frombuffer(block, dtype=numpy.float64)) > limit).any())
+
+        else:
+            too_large = limit is not None and any([abs(coord) > limit for coord in block])
+
+        if too_large:
+            raise ValueError(f"A coordinate is too large to be stored as {self._dtype}")
+
+        packed = array(DTYPES[self._dtype])
+
+        if self._dtype == "int8":
+            self._fit(block)
+            packed.frombytes(_quantize(block, self._width, self._lows, self._highs).tobytes())
+
+        elif numpy is not None:
+            floats = numpy.frombuffer(block, dtype=numpy.float64).astype(self._dtype)
+            packed.frombytes(floats.tobytes())
+
+        elif self._dtype == "float16":
+            packed.frombytes(struct.pack(f"={len(block)}e", *block))
+
+        else:
+            packed.fromlist(block.tolist())
+
+        return packed
+
+    def _fit(self, block: array) -> None:
+        """
+        Grow the range of the columns of an int8 matrix so that it holds the coordinates of new rows, and convert the
+        columns whose range changed again.
+
+        :param block: An ``array('d')`` of rows of ``width`` floats
+        :return: ``None``
+        """
+        for i, (new_low, new_high) in enumerate(_column_ranges(block, self._width)):
+            if new_low is None:
+                continue
+
+            low, high = self._lows[i], self._highs[i]
+
+            if low != low:
+                self._lows[i], self._highs[i] = new_low, new_high
+                continue
+
+            if low <= new_low and new_high <= high:
+                continue
+
+            # The range at least doubles, so a column is converted again a logarithmic number of times
+            new_low, new_high = min(low, new_low), max(high, new_high)
+            if new_high - new_low < 2 * (high - low):
+                if new_high > high:
+                    new_high = new_low + 2 * (high - low)
+
+                else:
+                    new_low = new_high - 2 * (high - low)
+
+            coordinates = _unpack(self._buffer[i::self._width], "int8", 1, self._lows[i:i + 1], self._highs[i:i + 1])
+
+            self._lows[i], self._highs[i] = new_low, new_high
+            self._buffer[i::self._width] = _quantize(coordinates, 1, self._lows[i:i + 1], self._highs[i:i + 1])
+
+    def append(self, coordinates: List[Union[int, float, None]], display_name: str = None) -> int:
+        """
+        Add a row at the end of the matrix.
+
+        :param coordinates: The coordinates of the new row
+        :param display_name: The displayed name of the row
+        :return: The index of the new row
+        """
+        self._own()
+        self._widen(len(coordinates))
+
+        self._buffer.extend(self._pack(self._encode(coordinates)))
+        self._lengths.append(len(coordinates))
+        self._names.append(display_name)
+
+        return len(self._lengths) - 1
+
+    def extend(self, rows: Iterable[Tuple[List[Union[int, float, None]], str]]) -> range:
+        """
+        Add several rows at the end of the matrix. The matrix is widened at most once.
+
+        :param rows: An iterable of ``(coordinates, display_name)`` tuples
+        :return: The indexes of the new rows
+        """
+        rows = list(rows)
+        start = len(self._lengths)
+
+        self._own()
+
+        if rows:
+            self._widen(max([len(coordinates) for coordinates, _ in rows]))
+
+        block = array("d")
+        for coordinates, display_name in rows:
+            block.extend(self._encode(coordinates))
+            self._lengths.append(len(coordinates))
+            self._names.append(display_name)
+
+        self._buffer.extend(self._pack(block))
+
+        return range(start, len(self._lengths))
+
+    def extend_matrix(self, block: array, width: int) -> range:
+        """
+        Add the rows of a row-major block of floats at the end of the matrix, without converting them to lists.
+        A NaN in the block is a missing coordinate.
+
+        :param block: An ``array('d')`` of ``rows * width`` floats
+        :param width: The number of coordinates of each row of the block
+        :return: The indexes of the new rows
+
+        >>> storage = ColumnarStorage()
+        >>> storage.extend_matrix(array("d", [1, 2, 3, float("nan")]), 2)
+        range(0, 2)
+        >>> storage.row(1)
+        [3.0, None]
+        """
+        if width < 1:
+            raise ValueError("The rows must have at least one coordinate")
+
+        count = len(block) // width
+        start = len(self._lengths)
+
+        self._own()
+        self._widen(width)
+
+        if width != self._width:
+            padded = array("d")
+            padding = array("d", [_MISSING]) * (self._width - width)
+            for base in range(0, count * width, width):
+                padded.extend(block[base:base + width])
+                padded.extend(padding)
+
+            block = padded
+
+        self._buffer.extend(self._pack(block))
+
+        self._lengths.extend(array(self._lengths.typecode, [width]) * count)
+        self._names.extend([None] * count)
+
+        return range(start, len(self._lengths))
+
+    def row(self, index: int) -> List[Union[float, None]]:
+        """
+        Get the coordinates of a row, with ``None`` in place of the missing coordinates.
+
+        :param index: The index of the row
+        :return: A new ``list`` of coordinates
+        """
+        length = max(self._lengths[index], self._min_length)
+
+        coordinates = [None if coord != coord else coord
+                       for coord in self.values(index, index + 1)[:min(length, self._width)]]
+
+        return coordinates + [None] * (length - len(coordinates))
+
+    def set_row(self, index: int, coordinates: List[Union[int, float, None]]) -> None:
+        """
+        Replace the coordinates of a row.
+
+        :param index: The index of the row
+        :param coordinates: The new coordinates of the row
+        :return: ``None``
+        """
+        self._own()
+        self._widen(len(coordinates))
+
+        row = self._pack(self._encode(coordinates))
+
+        start = index * self._width
+        self._buffer[start:start + self._width] = row
+        self._lengths[index] = len(coordinates)
+
+    def length(self, index: int) -> int:
+        """
+        Get the number of coordinates a row is presented with.
+
+        :param index: The index of the row
+        :return: The length of the row
+        """
+        return max(self._lengths[index], self._min_length)
+
+    def max_length(self) -> int:
+        """
+        Get the length of the longest row.
+
+        :return: The largest length of all the rows
+        """
+        return max(max(self._lengths), self._min_length) if self._lengths else 0
+
+    def display_name(self, index: int) -> Union[str, None]:
+        """
+        Get the displayed name of a row.
+
+        :param index: The index of the row
+        :return: The displayed name of the row
+        """
+        return self._names[index]
+
+    def set_display_name(self, index: int, display_name: Union[str, None]) -> None:
+        """
+        Replace the displayed name of a row.
+
+        :param index: The index of the row
+        :param display_name: The new displayed name of the row
+        :return: ``None``
+        """
+        self._names[index] = display_name
+
+    def pad(self, min_length: int) -> bool:
+        """
+        Present every row shorter than ``min_length`` with trailing ``None``, the rows added later included. Neither
+        the matrix nor the lengths of the rows are modified.
+
+        :param min_length: The minimum length of the rows
+        :return: ``True`` if a row already in the matrix is now presented longer, ``False`` otherwise
+
+        >>> storage = ColumnarStorage()
+        >>> storage.extend([([1, 2], None), ([3], None)])
+        range(0, 2)
+        >>> storage.pad(3)
+        True
+        >>> storage.row(1)
+        [3.0, None, None]
+        >>> storage.pad(2)
+        False
+        """
+        if min_length <= self._min_length:
+            return False
+
+        # We only compare with the shortest row, so the rows themselves are never visited one by one
+        grown = len(self._lengths) > 0 and max(min(self._lengths), self._min_length) < min_length
+        self._min_length = min_length
+
+        return grown
+
+    def column(self, index: int) -> array:
+        """
+        Get all the values of a column, NaN included.
+
+        :param index: The index of the column
+        :return: An ``array('d')`` with one float per row
+        """
+        if index >= self._width:
+            return array("d", [_MISSING]) * len(self._lengths)
+
+        if self._dtype == "float64":
+            return self._buffer[index::self._width]
+
+        return _unpack(self._buffer[index::self._width], self._dtype, 1, self._lows[index:index + 1],
+                       self._highs[index:index + 1])
+
+    def values(self, start: int = 0, stop: int = None) -> array:
+        """
+        Get the coordinates of a block of rows as row-major floats, NaN for the missing ones. For a float64 matrix,
+        the whole matrix is the buffer itself, and is not copied.
+
+        :param start: The first row of the block
+        :param stop: The row after the last row of the block. If ``None``, the block ends with the storage.
+        :return: An ``array('d')`` (or a ``memoryview`` of floats) of ``(stop - start) * width`` floats
+
+        >>> storage = ColumnarStorage("float16")
+        >>> storage.extend([([1, 0.1], None), ([None, 3], None)])
+        range(0, 2)
+        >>> storage.values(1)
+        array('d', [nan, 3.0])
+        >>> storage.values(0, 1)[1]
+        0.0999755859375
+        """
+        if stop is None:
+            stop = len(self)
+
+        width = self._width
+
+        if self._dtype == "float64":
+            if start == 0 and stop >= len(self):
+                return self._buffer
+
+            return self._buffer[start * width:stop * width]
+
+        return _unpack(self._buffer[start * width:stop * width], self._dtype, width, self._lows, self._highs)
+
+    def matrix(self, start: int = 0, stop: int = None):
+        """
+        Get the coordinates of a block of rows as a numpy matrix of float64, NaN for the missing ones. For a float64
+        matrix, it is a view of the buffer, and is not copied. Only available with numpy.
+
+        :param start: The first row of the block
+        :param stop: The row after the last row of the block. If ``None``, the block ends with the storage.
+        :return: A ``(stop - start, width)`` numpy array
+        """
+        if stop is None:
+            stop = len(self)
+
+        stop = max(start, min(stop, len(self)))
+        width = self._width
+
+        codes = numpy.frombuffer(self._buffer, dtype=self._dtype if self._dtype != "float16" else numpy.float16)
+        return _numpy_unpack(codes[start * width:stop * width].reshape(stop - start, width), self._dtype, self._lows,
+                             self._highs)
+
+    def take(self, rows):
+        """
+        Get the coordinates of some rows as a numpy matrix of float64, NaN for the missing ones. Only available with
+        numpy.
+
+        :param rows: The indexes of the rows
+        :return: A ``(len(rows), width)`` numpy array
+        """
+        codes = numpy.frombuffer(self._buffer, dtype=self._dtype if self._dtype != "float16" else numpy.float16)
+        codes = codes.reshape(len(self), self._width)[numpy.asarray(rows, dtype=numpy.int64)]
+
+        return _numpy_unpack(codes, self._dtype, self._lows, self._highs)
+
+
+def _column_ranges(block: array, width: int) -> List[Tuple[Union[float, None], Union[float, None]]]:
+    """
+    Get the smallest and the largest float of each column of row-major floats, skipping NaN.
+
+    :param block: The floats, ``width`` per row
+    :param width: The number of columns
+    :return: A ``(minimum, maximum)`` tuple per column, ``(None, None)`` for a column without any float
+    """
+    if numpy is not None:
+        floats = numpy.frombuffer(block, dtype=numpy.float64).reshape(-1, width)
+        defined = ~numpy.isnan(floats)
+
+        minimums = numpy.where(defined, floats, numpy.inf).min(axis=0, initial=numpy.inf)
+        maximums = numpy.where(defined, floats, -numpy.inf).max(axis=0, initial=-numpy.inf)
+
+        return [(low, high) if count else (None, None)
+                for low, high, count in zip(minimums.tolist(), maximums.tolist(), defined.sum(axis=0).tolist())]
+
+    ranges = []
+    for i in range(width):
+        column = [coord for coord in block[i::width] if coord == coord]  # NaN != NaN
+        ranges.append((min(column), max(column)) if column else (None, None))
+
+    return ranges
+
+
+def _quantize(block: array, width: int, lows: array, highs: array) -> array:
+    """
+    Convert row-major floats to int8 codes, with the range of each column. A NaN gives the code of a missing
+    coordinate.
+
+    :param block: The floats, ``width`` per row
+    :param width: The number of columns
+    :param lows: The lowest coordinate of the range of each column
+    :param highs: The highest coordinate of the range of each column
+    :return: An ``array('b')`` of codes
+    """
+    if numpy is not None:
+        floats = numpy.frombuffer(block, dtype=numpy.float64).reshape(-1, width)
+        lows, highs = numpy.frombuffer(lows, dtype=numpy.float64), numpy.frombuffer(highs, dtype=numpy.float64)
+
+        steps = (highs - lows) / _STEPS
+        scaled = (floats - (lows + highs) / 2) / numpy.where(steps > 0, steps, 1.0)
+
+        codes = numpy.where(numpy.isnan(floats), -128, numpy.clip(numpy.rint(scaled), -127, 127))
+        return array("b", codes.astype(numpy.int8).tobytes())
+
+    codes = array("b")
+    for position, coord in enumerate(block):
+        if coord != coord:
+            codes.append(-128)
+            continue
+
+        low, high = lows[position % width], highs[position % width]
+        step = (high - low) / _STEPS
+        codes.append(int(max(-127, min(127, round((coord - (low + high) / 2) / step)))) if step > 0 else 0)
+
+    return codes
+
+
+def _dequantize(codes: array, width: int, lows: array, highs: array) -> array:
+    """
+    Convert int8 codes back to row-major floats. See :func:`_quantize<EasyKnn.storage._quantize>`.
+
+    :return: An ``array('d')`` of floats
+    """
+    floats = array("d")
+
+    for position, code in enumerate(codes):
+        low, high = lows[position % width], highs[position % width]
+        floats.append(_MISSING if code == -128 else (low + high) / 2 + code * (high - low) / _STEPS)
+
+    return floats
+
+
+def _unpack(codes: Union[array, memoryview], dtype: str, width: int, lows: array, highs: array) -> array:
+    """
+    Convert codes of a storage type to row-major floats, NaN for the missing coordinates.
+
+    :param codes: The codes
+    :param dtype: The storage type of the codes
+    :param width: The number of columns
+    :param lows: The lowest coordinate of the range of each column, for int8 codes
+    :param highs: The highest coordinate of the range of each column, for int8 codes
+    :return: An ``array('d')`` of floats
+    """
+    if numpy is not None:
+        matrix = numpy.frombuffer(codes, dtype=dtype if dtype != "float16" else numpy.float16)
+        return array("d", _numpy_unpack(matrix.reshape(-1, width) if width else matrix, dtype, lows, highs).tobytes())
+
+    if dtype == "int8":
+        return _dequantize(codes, width, lows, highs)
+
+    if dtype == "float16":
+        return array("d", struct.unpack(f"={len(codes)}e", memoryview(codes).tobytes()))
+
+    return array("d", codes)
+
+
+def _numpy_unpack(codes, dtype: str, lows: array, highs: array):
+    """
+    Same as :func:`_unpack<EasyKnn.storage._unpack>`, for a numpy matrix of codes.
+
+    :return: A numpy matrix of float64
+    """
+    if dtype == "float64":
+        return codes
+
+    if dtype != "int8":
+        return codes.astype(numpy.float64)
+
+    width = codes.shape[1]
+    lows = numpy.frombuffer(lows, dtype=numpy.float64)[:width]
+    highs = numpy.frombuffer(highs, dtype=numpy.float64)[:width]
+
+    floats = (lows + highs) / 2 + codes * ((highs - lows) / _STEPS)
+    floats[codes == -128] = numpy.nan
+
+    return floats
@@ -3,7 +3,6 @@ from typing import TYPE_CHECKING
 
 from EasyKnn.errors import ValueAlreadyLinkedError, ReadOnlyAttributeError, CriticalDeletionError
 from EasyKnn.errors import NoDimensionError
-from EasyKnn.point import Point
 
 if TYPE_CHECKING:
     from EasyKnn.dataset import Dataset
@@ -19,6 +18,10 @@ class Value:
     :exception NoDimensionError: If the coordinates are empty or only None values
     """
 
+    # A Dataset may hold millions of Values: without a __dict__, each one takes less memory. A columnar Dataset keeps
+    # weak references to the Values read from its storage.
+    __slots__ = ("_coordinates", "_dimension", "_display_name", "_dataset", "_row", "__weakref__")
+
     def __init__(self, coordinates: List[Union[int, float, None]], display_name: str = None):
 
         if coordinates == [None] * len(coordinates):  # This way is much faster than using all()
@@ -30,12 +33,48 @@ class Value:
         # We do not allow the modification and the deletion of the dimension
         self._dimension = len(coordinates)
 
+        # The row of the Value in the storage of a columnar Dataset. ``None`` if the Value holds its own coordinates.
+        self._row = None
+
         # we do allow the modification and the deletion of the display_name
-        self.display_name = display_name
+        self._display_name = display_name
 
         # We do allow the modification of the dataset, but under certain conditions
         self._dataset = None
 
+    @classmethod
+    def _from_storage(cls, dataset: "Dataset", row: int) -> "Value":
+        """
+        Create a Value reading its coordinates from the storage of a columnar :class:`Dataset<EasyKnn.dataset.Dataset>`.
+        This methode should only be called by the ``Dataset`` class.
+
+        :param dataset: The columnar Dataset holding the coordinates
+        :param row: The row of the Value in the storage of the Dataset
+        :return: a Value object
+        """
+        value = cls.__new__(cls)
+
+        value._coordinates = None
+        value._dimension = None
+        value._display_name = None
+        value._dataset = dataset
+        value._row = row
+
+        return value
+
+    def _move_to_storage(self, row: int) -> None:
+        """
+        Make the Value read its coordinates from the storage of its columnar Dataset, and drop its own coordinates.
+        This methode should only be called by the ``Dataset`` class.
+
+        :param row: The row of the Value in the storage of its Dataset
+        :return: None
+        """
+        self._coordinates = None
+        self._dimension = None
+        self._display_name = None
+        self._row = row
+
     @property
     def coordinates(self) -> List[Union[int, float, None]]:
         """
@@ -43,6 +82,9 @@ class Value:
 
         :read-only: False
         """
+        if self._row is not None:
+            return self._dataset._storage.row(self._row)
+
         return self._coordinates
 
     @coordinates.setter
@@ -50,6 +92,21 @@ class Value:
 
         if value == [None] * len(value):  # This way is much faster than using all()
             raise NoDimensionError("Coordinates cannot be empty or only None values")
+        elif self._row is not None:
+            with self._dataset._writing():
+                storage = self._dataset._storage
+                previous = storage.row(self._row)
+
+                # The statistics are those of the stored coordinates, that a compact storage type rounds
+                storage.set_row(self._row, value)
+                self._dataset._update_statistics([storage.row(self._row)], [previous])
+                self._dataset._changed(len(value), edited=True)
+        elif self._dataset is not None:
+            with self._dataset._writing():
+                self._dataset._update_statistics([value], [self._coordinates])
+                self._coordinates = value
+                self._dimension = len(value)
+                self._dataset._changed(len(value), edited=True)
         else:
             self._coordinates = value
             self._dimension = len(value)
@@ -64,6 +121,30 @@ class Value:
     Alias for the :attr:`coordinates<EasyKnn.value.Value.coordinates>` attribute.
     """
 
+    @property
+    def display_name(self) -> Union[str, None]:
+        """
+        The displayed name of the Value. The name of a Value of a columnar Dataset is read from, and written to, the
+        storage of the Dataset.
+
+        :read-only: False
+        """
+        if self._row is not None:
+            return self._dataset._storage.display_name(self._row)
+
+        return self._display_name
+
+    @display_name.setter
+    def display_name(self, display_name: Union[str, None]):
+        if self._row is not None:
+            self._dataset._storage.set_display_name(self._row, display_name)
+        else:
+            self._display_name = display_name
+
+    @display_name.deleter
+    def display_name(self):
+        self.display_name = None
+
     @property
     def dimension(self) -> int:
         """
@@ -71,6 +152,9 @@ class Value:
 
         :read-only: True
         """
+        if self._row is not None:
+            return self._dataset._storage.length(self._row)
+
         return self._dimension
 
     @dimension.setter
@@ -112,16 +196,6 @@ class Value:
         else:
             raise ValueAlreadyLinkedError("This Value is already linked to a Dataset")
 
-    def _to_point(self, distance: float) -> Point:
-        """
-        Convert the Value to a :class:EasyKnn.Point. This methode should only be called by the Plan class.
-
-        :param distance: The distance between the Value and the Point
-        :return: a Point object
-        """
-
-        return Point(self.coordinates, distance, self.dataset, self.display_name)
-
     def __repr__(self):
         return f"{self.display_name if self.display_name is not None else self.coordinates}"
 
@@ -0,0 +1,319 @@
+import heapq
+import random
+from array import array
+from typing import List, Union, Tuple, TYPE_CHECKING
+
+from EasyKnn import kernels
+from EasyKnn.index import Index
+from EasyKnn.metrics import Metric, get_metric
+from EasyKnn.weight import Weight
+
+if TYPE_CHECKING:
+    from EasyKnn.plan import Plan
+
+# Bounds are computed from rounded distances, so a node is only pruned if it is farther by more than this ratio
+_TOLERANCE = 1e-9
+
+_NAN = float("nan")
+
+
+class VPTree(Index):
+    """
+    An exact vantage-point tree over all the :class:`Values<EasyKnn.value.Value>` of a
+    :class:`Plan<EasyKnn.plan.Plan>`. Each node picks a value (the vantage point), and splits the other values in
+    two halves: the ones nearer to the vantage point than the median distance, and the others. A query prunes a half
+    with the triangle inequality, from its distance to the vantage point alone.
+
+    The tree only relies on the distance, so it works in any number of dimensions, with any
+    :class:`Metric<EasyKnn.metrics.Metric>` that is a true metric. A metric is only a true one for a fixed
+    :class:`Weight<EasyKnn.weight.Weight>` without negative weights, and without missing coordinates. So:
+
+    - the tree is built for the given ``metric`` and ``weight``, and only answers queries made with both
+    - the values missing a coordinate are kept out of the tree, and compared to every query
+    - a query missing a coordinate is answered by the Plan with a scan of all the values
+
+    :param plan: The :class:`Plan<EasyKnn.plan.Plan>` to index
+    :param leaf_size: The largest number of values in a leaf of the tree
+    :param weight: The :class:`Weight<EasyKnn.weight.Weight>` of the queries the tree will answer
+    :param metric: The :class:`Metric<EasyKnn.metrics.Metric>`, or the name of the metric, of the queries the tree
+            will answer
+    :param seed: The seed used to pick the vantage points
+
+    >>> from EasyKnn import Plan, Dataset, Value
+    >>> plan = Plan()
+    >>> dataset = Dataset()
+    >>> dataset.add_values([Value([x, y]) for x in range(10) for y in range(10)])
+    >>> plan.add_dataset(dataset)
+    >>> tree = VPTree(plan, leaf_size=4)
+    >>> tree.query([2, 7.25], [1, 1], k=2)
+    [(0.25, 0, 27), (0.75, 0, 28)]
+    >>> tree.saved_evaluations > 0
+    True
+    >>> VPTree(plan, metric="manhattan").query([2, 7.25], [1, 1], k=2)
+    [(0.25, 0, 27), (0.75, 0, 28)]
+    """
+
+    # The metric and the weight are saved in the options, and the random generator is only used by the build
+    _UNSAVED = Index._UNSAVED + ("_metric", "_weight", "_random")
+
+    def __init__(self, plan: "Plan", leaf_size: int = 16, weight: Weight = Weight([]),
+                 metric: Union[str, Metric] = "euclidean", seed: int = 0):
+        super().__init__(plan)
+
+        if leaf_size < 1:
+            raise ValueError("The leaf size must be at least 1")
+
+        self._metric = get_metric(metric)
+
+        if not self._metric.is_metric:
+            raise ValueError(f"A vantage-point tree cannot prune with {self._metric.name}, which is not a true metric")
+
+        if any([weight_value is not None and weight_value < 0 for weight_value in weight.weights]):
+            raise ValueError("A vantage-point tree cannot be built with negative weights")
+
+        self._leaf_size = leaf_size
+        self._weight = weight
+        self._seed = seed
+
+        self.build()
+
+    def build(self) -> None:
+        width, points, ids = self._rows()
+
+        self._width = width
+        self._weights = kernels.weight_vector(self._weight, width)
+
+        # Values missing a coordinate are kept out of the tree
+        complete = [index for index in range(len(points)) if all([coord == coord for coord in points[index]])]
+        self._loose = [index for index in range(len(points)) if not all([coord == coord for coord in points[index]])]
+
+        # The coordinates of the values, row-major, with the dataset index and the row of each value
+        self._coordinates = array("d")
+        for point in points:
+            self._coordinates.extend(point)
+
+        self._dataset_indexes = array("q", [dataset_index for dataset_index, _ in ids])
+        self._dataset_rows = array("q", [row for _, row in ids])
+        self._size = len(points)
+
+        # Each node is described by the same index in all these lists. A leaf has no vantage point.
+        self._vantage = []
+        self._bounds = []
+        self._children = []
+        self._leaves = []
+
+        self._random = random.Random(self._seed)
+        self._root = self._build_node(complete) if complete else None
+
+        self._stale = False
+
+    def _options(self) -> dict:
+        # Only the metrics that can be found again from their name can be saved
+        try:
+            saved = get_metric(self._metric.name).name == self._metric.name
+        except ValueError:
+            saved = False
+
+        if not saved:
+            raise ValueError(f"A vantage-point tree using {self._metric.name} cannot be saved")
+
+        return {"leaf_size": self._leaf_size, "weight": self._weight.weights, "metric": self._metric.name,
+                "seed": self._seed}
+
+    @classmethod
+    def _restore(cls, plan, options, state):
+        state = dict(state)
+        offsets = state.pop("_leaf_offsets")
+        positions = state.pop("_leaf_positions")
+
+        index = super()._restore(plan, options, state)
+        index._metric = get_metric(options["metric"])
+        index._weight = Weight(options["weight"])
+        index._restore_nodes(offsets, positions)
+
+        return index
+
+    def _state(self) -> dict:
+        state = super()._state()
+
+        # The lists of the nodes are saved as arrays: -1 stands for a missing vantage point or child, NaN for the
+        # missing bounds, and the values of the leaves are saved one after the other, with the offset of each leaf
+        state["_loose"] = array("q", self._loose)
+        state["_vantage"] = array("q", [-1 if vantage is None else vantage for vantage in self._vantage])
+        state["_children"] = array("q", [-1 if child is None else child
+                                         for children in self._children for child in children or (None, None)])
+        state["_bounds"] = array("d", [bound for bounds in self._bounds for pair in bounds or (None, None)
+                                       for bound in pair or (_NAN, _NAN)])
+
+        leaves = state.pop("_leaves")
+        state["_leaf_offsets"] = array("q", [0])
+        state["_leaf_positions"] = array("q")
+        for leaf in leaves:
+            state["_leaf_positions"].extend(leaf or [])
+            state["_leaf_offsets"].append(len(state["_leaf_positions"]))
+
+        return state
+
+    def _restore_nodes(self, offsets: memoryview, positions: memoryview) -> None:
+        """
+        Rebuild the lists of the nodes from the arrays saved by :meth:`_state<EasyKnn.vptree.VPTree._state>`.
+
+        :param offsets: The offset of the values of each leaf
+        :param positions: The values of the leaves, one leaf after the other
+        :return: ``None``
+        """
+        vantage, children, bounds = self._vantage, self._children, self._bounds
+
+        self._loose = list(self._loose)
+        self._vantage, self._children, self._bounds, self._leaves = [], [], [], []
+
+        for node in range(len(vantage)):
+            if vantage[node] < 0:
+                # A leaf is never empty
+                self._vantage.append(None)
+                self._children.append(None)
+                self._bounds.append(None)
+                self._leaves.append(list(positions[offsets[node]:offsets[node + 1]]))
+                continue
+
+            self._vantage.append(vantage[node])
+            self._children.append(tuple([None if child < 0 else child for child in children[2 * node:2 * node + 2]]))
+            self._bounds.append(tuple([None if bounds[4 * node + 2 * side] != bounds[4 * node + 2 * side] else
+                                       (bounds[4 * node + 2 * side], bounds[4 * node + 2 * side + 1])
+                                       for side in range(2)]))
+            self._leaves.append(None)
+
+    def _point(self, index: int):
+        """
+        Get the coordinates of a value of the tree.
+
+        :param index: The index of the value
+        :return: A slice of the coordinates of the tree
+        """
+        return self._coordinates[index * self._width:(index + 1) * self._width]
+
+    def _id(self, index: int) -> Tuple[int, int]:
+        """
+        Get the dataset index and the row of a value of the tree.
+
+        :param index: The index of the value
+        :return: A ``(dataset index, row)`` tuple
+        """
+        return self._dataset_indexes[index], self._dataset_rows[index]
+
+    def _distance(self, first: Tuple[float], second: Tuple[float]) -> float:
+        """
+        Get the distance between two values, with the metric of the tree.
+
+        :return: The distance
+        """
+        return self._metric.pair(first, second, self._weights)
+
+    def _build_node(self, indexes: List[int]) -> int:
+        """
+        Create the node holding the given values, and its children.
+
+        :param indexes: The indexes of the values of the node
+        :return: The index of the node
+        """
+        node = len(self._vantage)
+
+        self._vantage.append(None)
+        self._bounds.append(None)
+        self._children.append(None)
+        self._leaves.append(None)
+
+        if len(indexes) <= self._leaf_size:
+            self._leaves[node] = indexes
+            return node
+
+        position = self._random.randrange(len(indexes))
+        vantage = indexes[position]
+        others = indexes[:position] + indexes[position + 1:]
+
+        measured = sorted([(self._distance(self._point(vantage), self._point(index)), index) for index in others])
+        middle = len(measured) // 2
+
+        inside, outside = measured[:middle], measured[middle:]
+
+        self._vantage[node] = vantage
+
+        # The smallest and largest distance to the vantage point in each half
+        self._bounds[node] = ((inside[0][0], inside[-1][0]) if inside else None,
+                              (outside[0][0], outside[-1][0]))
+
+        self._children[node] = (self._build_node([index for _, index in inside]) if inside else None,
+                                self._build_node([index for _, index in outside]))
+
+        return node
+
+    def supports(self, query: List[Union[int, float, None]], weights: List[float], k: int, metric: Metric) -> bool:
+        if k <= 0 or metric.name != self._metric.name or len(query) < self._width or None in query[:self._width]:
+            return False
+
+        # Any query weight past the width of the tree is not used by the distance
+        return weights[:self._width] == self._weights
+
+    def query(self, query: List[Union[int, float, None]], weights: List[float], k: int,
+              use_abs: bool = True) -> List[Tuple[float, int, int]]:
+        self._evaluations = 0
+        self._pruned = 0
+
+        if k <= 0:
+            return []
+
+        query = tuple(query[:self._width])
+
+        # The k best values found, as a heap of negated (distance, dataset index, row), so the worst one is on top
+        best = []
+
+        def consider(distance, dataset_index, row):
+            candidate = (-distance, -dataset_index, -row)
+
+            if len(best) < k:
+                heapq.heappush(best, candidate)
+
+            elif candidate > best[0]:
+                heapq.heapreplace(best, candidate)
+
+        # The values missing a coordinate are compared with the scan rules
+        for index in self._loose:
+            self._evaluations += 1
+            consider(self._metric.pair(query, [None if coord != coord else coord for coord in self._point(index)],
+                                       self._weights),
+                     *self._id(index))
+
+        to_visit = [(0, self._root)] if self._root is not None else []
+
+        while to_visit:
+            bound, node = heapq.heappop(to_visit)
+
+            if len(best) == k and bound > -best[0][0] * (1 + _TOLERANCE):
+                self._pruned += len(to_visit) + 1
+                break
+
+            if self._leaves[node] is not None:
+                for index in self._leaves[node]:
+                    self._evaluations += 1
+                    consider(self._distance(query, self._point(index)), *self._id(index))
+                continue
+
+            distance = self._distance(query, self._point(self._vantage[node]))
+            self._evaluations += 1
+            consider(distance, *self._id(self._vantage[node]))
+
+            for child, child_bounds in zip(self._children[node], self._bounds[node]):
+                if child is None:
+                    continue
+
+                # By the triangle inequality, no value of the child is nearer to the query than this bound
+                lowest, highest = child_bounds
+                child_bound = max(lowest - distance, distance - highest, bound, 0)
+
+                if len(best) < k or child_bound <= -best[0][0] * (1 + _TOLERANCE):
+                    heapq.heappush(to_visit, (child_bound, child))
+                else:
+                    self._pruned += 1
+
+        # Weights are never negative here, so use_abs does not change the distances
+        return sorted([(-distance, -dataset_index, -row) for distance, dataset_index, row in best])
@@ -0,0 +1,486 @@
+"""
+Benchmarks of EasyKnn.
+
+Run the benchmarks, and write their results as JSON::
+
+    python benchmarks/bench.py run --values 10000 --dimensions 8 --output before.json
+
+Each parameter accepts several values, and every combination of them is benchmarked as a separate case::
+
+    python benchmarks/bench.py run --values 1000 10000 --missing 0 0.2 --k 1 10 --output before.json
+
+Compare two runs, and flag the benchmarks that got slower by more than the threshold, and by more than ``--noise``
+milliseconds (the exit status is 1 if any did)::
+
+    python benchmarks/bench.py compare before.json after.json --threshold 0.1
+
+For each benchmark, a run records the number of timed samples, the throughput (operations per second) and the
+mean, p50, p95 and p99 latencies of one operation, in milliseconds. The values are generated from ``--seed``, so two
+runs with the same parameters benchmark the same values and queries.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+# We benchmark the EasyKnn of this repository, and not an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EasyKnn import Dataset, Plan, Value, Weight  # noqa: E402
+from EasyKnn.plan import INDEXES  # noqa: E402
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The version of the JSON written by a run
+FORMAT_VERSION = 1
+
+# The options of the indexes, when the defaults would not fit the generated values
+INDEX_OPTIONS = {
+    "pq": lambda parameters: {"subvectors": min(8, parameters["dimensions"]), "rerank": 10 * abs(parameters["k"])},
+}
+
+
+def generate_rows(count: int, dimensions: int, missing: float, ragged: float, generator: random.Random) -> list:
+    """
+    Generate the coordinates of random values.
+
+    :param count: The number of values
+    :param dimensions: The largest dimension of the values
+    :param missing: The probability of a coordinate to be ``None``
+    :param ragged: The probability of a value to be shorter than ``dimensions``
+    :param generator: The ``random.Random`` generating the coordinates
+    :return: A ``list`` with the coordinates of each value
+    """
+    rows = []
+
+    for _ in range(count):
+        length = generator.randint(1, dimensions - 1) if dimensions > 1 and generator.random() < ragged else dimensions
+        row = [None if generator.random() < missing else generator.gauss(0, 1) for _ in range(length)]
+
+        # A value cannot be only made of None
+        if all([coord is None for coord in row]):
+            row[generator.randrange(length)] = generator.gauss(0, 1)
+
+        rows.append(row)
+
+    return rows
+
+
+def percentile(samples: list, rank: float) -> float:
+    """
+    Get a percentile of sorted samples, with the nearest-rank method.
+
+    :param samples: The sorted samples
+    :param rank: The percentile, between 0 and 100
+    :return: The sample at this percentile
+    """
+    return samples[max(0, -(-len(samples) * rank // 100) - 1)]
+
+
+def summarize(samples: list, operations: int = 1) -> dict:
+    """
+    Summarize the latencies of a benchmark.
+
+    :param samples: The time taken by each sample, in seconds
+    :param operations: The number of operations made by each sample, used for the throughput
+    :return: A ``dict`` with the number of samples, the throughput and the latencies in milliseconds
+    """
+    samples = sorted(samples)
+    total = sum(samples)
+
+    return {
+        "samples": len(samples),
+        "throughput": len(samples) * operations / total if total else float("inf"),
+        "mean_ms": total / len(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def measure(operation, repeat: int, warmup: int, setup=None) -> list:
+    """
+    Time an operation several times.
+
+    :param operation: The function to time. It is given the result of ``setup``, if any.
+    :param repeat: The number of timed samples
+    :param warmup: The number of samples run before, and not timed
+    :param setup: A function called before each sample, and not timed
+    :return: The time taken by each timed sample, in seconds
+    """
+    samples = []
+
+    for sample in range(warmup + repeat):
+        argument = setup(sample) if setup is not None else None
+
+        start = time.perf_counter()
+        operation(argument) if setup is not None else operation()
+        elapsed = time.perf_counter() - start
+
+        if sample >= warmup:
+            samples.append(elapsed)
+
+    return samples
+
+
+class Case:
+    """
+    The values, queries and Plan of a combination of parameters.
+
+    :param parameters: The parameters of the case
+    :param seed: The seed generating the values and the queries
+    :param queries: The number of different queries, used in turn by the samples
+    """
+
+    def __init__(self, parameters: dict, seed: int, queries: int):
+        self.parameters = parameters
+        generator = random.Random(seed)
+
+        count = parameters["values"]
+        datasets = parameters["datasets"]
+
+        rows = generate_rows(count, parameters["dimensions"], parameters["missing"], parameters["ragged"], generator)
+
+        # The values are split evenly between the datasets
+        self.parts = [rows[count * part // datasets:count * (part + 1) // datasets] for part in range(datasets)]
+
+        self.queries = [Value(row) for row in generate_rows(queries, parameters["dimensions"], 0, 0, generator)]
+
+        if parameters["weights"] == "random":
+            self.weight = Weight([generator.uniform(0.5, 2) for _ in range(parameters["dimensions"])])
+        else:
+            self.weight = Weight([])
+
+        self.plan = Plan()
+        self.plan.add_datasets(self.datasets())
+
+    def datasets(self) -> list:
+        """
+        Create the datasets of the case.
+
+        :return: A ``list`` of :class:`Datasets<EasyKnn.dataset.Dataset>`
+        """
+        datasets = []
+
+        for number, part in enumerate(self.parts):
+            dataset = Dataset(display_name=f"Dataset {number}", columnar=self.parameters["columnar"],
+                              dtype=self.parameters["dtype"])
+            dataset.add_values([Value(row) for row in part])
+            datasets.append(dataset)
+
+        return datasets
+
+    def query(self, sample: int) -> Value:
+        """
+        Get the query of a sample. The queries are used in turn, so that memoized distances can be reused.
+
+        :param sample: The number of the sample
+        :return: The :class:`Value<EasyKnn.value.Value>` to search
+        """
+        return self.queries[sample % len(self.queries)]
+
+
+def run_case(case: Case, arguments) -> dict:
+    """
+    Run all the benchmarks of a case.
+
+    :param case: The :class:`Case` to benchmark
+    :param arguments: The parsed command line arguments
+    :return: A ``dict`` with the summary of each benchmark, by name
+    """
+    parameters = case.parameters
+    plan = case.plan
+    k = parameters["k"]
+    repeat, warmup = arguments.repeat, arguments.warmup
+
+    results = {}
+
+    def record(name, samples, operations=1):
+        if selected(name, arguments.only):
+            results[name] = summarize(samples, operations)
+            print(f"  {name:<40} p50 {results[name]['p50_ms']:10.3f} ms", file=sys.stderr)
+
+    def neighbors(sample, **options):
+        return plan.neighbors(case.query(sample), memoize=parameters["memoize"], weight=case.weight, k=k, **options)
+
+    # Dataset.add_values, on new datasets
+    if selected("add_values", arguments.only):
+        def setup(_):
+            return [(Dataset(columnar=parameters["columnar"], dtype=parameters["dtype"]),
+                     [Value(row) for row in part]) for part in case.parts]
+
+        record("add_values", measure(lambda created: [dataset.add_values(values) for dataset, values in created],
+                                     arguments.builds, 0, setup), parameters["values"])
+
+    if selected("average", arguments.only):
+        record("average", measure(lambda: [dataset.average() for dataset in plan.datasets], repeat, warmup))
+
+    # Plan.neighbors, with each engine
+    engines = [("python", {}), ("vector", {})]
+    if k > 0:
+        engines.append(("vector,early_abandon", {"engine": "vector", "early_abandon": True}))
+
+    for name, options in engines:
+        options = dict({"engine": name}, **options)
+        name = f"neighbors[{name}]"
+
+        if selected(name, arguments.only):
+            plan.clear_cache()
+            record(name, measure(lambda sample: neighbors(sample, **options), repeat, warmup, lambda sample: sample))
+
+    # The Neighbors methods, on a new Neighbors for each sample
+    for name, method in (("nearest_neighbor", "nearest_neighbor"), ("nearest_dataset", "nearest_dataset")):
+        if selected(name, arguments.only):
+            record(name, measure(lambda found: getattr(found, method)(k=k or 1), repeat, warmup,
+                                 lambda sample: plan.neighbors(case.query(sample), memoize=False, weight=case.weight,
+                                                               engine="vector")))
+
+    if selected("neighbors_batch", arguments.only):
+        record("neighbors_batch", measure(lambda: plan.neighbors_batch(case.queries, k=k, weight=case.weight),
+                                          repeat, warmup), len(case.queries))
+
+    # The batch classification and regression, voting over the k nearest values
+    if k > 0:
+        if selected("predict", arguments.only):
+            record("predict", measure(lambda: plan.predict(case.queries, k=k, weight=case.weight), repeat, warmup),
+                   len(case.queries))
+
+        if selected("regress", arguments.only):
+            record("regress", measure(lambda: plan.regress(case.queries, 0, k=k, weight=case.weight), repeat,
+                                      warmup), len(case.queries))
+
+    # Each index: its build, then its queries
+    for kind in arguments.indexes:
+        build, query = f"build_index[{kind}]", f"neighbors[index:{kind}]"
+
+        if not (selected(build, arguments.only) or selected(query, arguments.only)) or k <= 0:
+            continue
+
+        options = INDEX_OPTIONS[kind](parameters) if kind in INDEX_OPTIONS else {}
+        record(build, measure(lambda: plan.build_index(kind, **options), arguments.builds, 0))
+
+        record(query, measure(lambda sample: neighbors(sample, engine="index"), repeat, warmup,
+                              lambda sample: sample))
+        plan.drop_index()
+
+    # The process engine
+    if arguments.processes and k != 0 and selected("neighbors[process]", arguments.only):
+        plan.start_pool(arguments.processes)
+
+        try:
+            record("neighbors[process]", measure(lambda sample: neighbors(sample, engine="process"), repeat, warmup,
+                                                 lambda sample: sample))
+        finally:
+            plan.stop_pool()
+
+    return results
+
+
+def selected(name: str, only: list) -> bool:
+    """
+    Check if a benchmark is selected by ``--only``.
+
+    :param name: The name of the benchmark
+    :param only: The texts given to ``--only``. If empty, every benchmark is selected.
+    :return: ``True`` if the name contains one of the texts
+    """
+    return not only or any([text in name for text in only])
+
+
+def environment() -> dict:
+    """
+    Describe where the benchmarks run.
+
+    :return: A ``dict`` with the versions of Python and numpy, and the platform
+    """
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "numpy": numpy.__version__ if numpy is not None else None,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(arguments) -> None:
+    """
+    Run the benchmarks of every combination of parameters, and write their results.
+
+    :param arguments: The parsed command line arguments
+    :return: ``None``
+    """
+    names = ("values", "dimensions", "datasets", "missing", "ragged", "weights", "k", "memoize", "columnar", "dtype")
+    grids = [getattr(arguments, name) for name in names]
+
+    cases = []
+    for combination in itertools.product(*grids):
+        parameters = dict(zip(names, combination))
+
+        # A Dataset storing compact coordinates is columnar
+        parameters["columnar"] = parameters["columnar"] or parameters["dtype"] != "float64"
+
+        if parameters["datasets"] > parameters["values"]:
+            continue
+
+        print(json.dumps(parameters, sort_keys=True), file=sys.stderr)
+
+        case = Case(parameters, arguments.seed, arguments.queries)
+        cases.append({"parameters": parameters, "results": run_case(case, arguments)})
+
+    report = {
+        "format": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "settings": {"seed": arguments.seed, "queries": arguments.queries, "repeat": arguments.repeat,
+                     "warmup": arguments.warmup, "builds": arguments.builds, "processes": arguments.processes},
+        "cases": cases,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+def compare(arguments) -> int:
+    """
+    Compare the results of two runs, matching the benchmarks by parameters and name.
+
+    :param arguments: The parsed command line arguments
+    :return: The exit status: ``1`` if a benchmark got slower than the threshold, ``0`` otherwise
+    """
+    with open(arguments.baseline) as file:
+        baseline = json.load(file)
+    with open(arguments.candidate) as file:
+        candidate = json.load(file)
+
+    def by_key(report):
+        return {(json.dumps(case["parameters"], sort_keys=True), name): result
+                for case in report["cases"] for name, result in case["results"].items()}
+
+    before, after = by_key(baseline), by_key(candidate)
+    statistic = f"{arguments.statistic}_ms"
+
+    regressions = 0
+    rows = []
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key][statistic], after[key][statistic]
+        change = new / old - 1 if old else 0.0
+
+        # A change smaller than the noise is never flagged, whatever its ratio
+        if abs(new - old) < arguments.noise:
+            status = ""
+        elif change > arguments.threshold:
+            status = "REGRESSION"
+            regressions += 1
+        elif change < -arguments.threshold:
+            status = "improvement"
+        else:
+            status = ""
+
+        rows.append((key[0], key[1], old, new, change, status))
+
+    parameters = None
+    for case, name, old, new, change, status in rows:
+        if case != parameters:
+            print(case)
+            parameters = case
+
+        print(f"  {name:<40} {old:10.3f} ms -> {new:10.3f} ms  {change:+8.1%}  {status}")
+
+    for key in sorted(set(before) ^ set(after)):
+        print(f"only in {'baseline' if key in before else 'candidate'}: {key[1]} {key[0]}")
+
+    print(f"{regressions} regression(s) above {arguments.threshold:.0%} on {arguments.statistic}, "
+          f"out of {len(rows)} compared benchmark(s)")
+
+    return 1 if regressions else 0
+
+
+def parse_arguments(argv: list = None):
+    """
+    Parse the command line.
+
+    :param argv: The arguments. If ``None``, the ones of the process are used.
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Benchmark EasyKnn, or compare two benchmark runs.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    runner = commands.add_parser("run", help="run the benchmarks")
+    runner.add_argument("--values", type=int, nargs="+", default=[10000], help="the number of values")
+    runner.add_argument("--dimensions", type=int, nargs="+", default=[8], help="the largest dimension of the values")
+    runner.add_argument("--datasets", type=int, nargs="+", default=[2], help="the number of datasets")
+    runner.add_argument("--missing", type=float, nargs="+", default=[0.0],
+                        help="the probability of a coordinate to be None")
+    runner.add_argument("--ragged", type=float, nargs="+", default=[0.0],
+                        help="the probability of a value to be shorter than the others")
+    runner.add_argument("--weights", choices=("uniform", "random"), nargs="+", default=["uniform"],
+                        help="uniform weights, or random weights between 0.5 and 2")
+    runner.add_argument("--k", type=int, nargs="+", default=[10],
+                        help="the number of neighbors, negative for the farthest ones")
+    runner.add_argument("--memoize", choices=("on", "off"), nargs="+", default=["on"],
+                        help="if the python engine memoizes the distances")
+    runner.add_argument("--columnar", choices=("on", "off"), nargs="+", default=["off"],
+                        help="if the datasets are columnar")
+    runner.add_argument("--dtype", choices=("float64", "float32", "float16", "int8"), nargs="+",
+                        default=["float64"], help="the storage type of the coordinates")
+    runner.add_argument("--indexes", choices=sorted(INDEXES), nargs="*", default=sorted(INDEXES),
+                        help="the indexes to benchmark")
+    runner.add_argument("--processes", type=int, default=2,
+                        help="the processes of the process engine, 0 to skip it")
+    runner.add_argument("--queries", type=int, default=10, help="the number of different queries")
+    runner.add_argument("--repeat", type=int, default=50, help="the number of timed samples of each benchmark")
+    runner.add_argument("--warmup", type=int, default=2, help="the number of samples run before the timed ones")
+    runner.add_argument("--builds", type=int, default=3,
+                        help="the number of timed samples of add_values and of each index build")
+    runner.add_argument("--seed", type=int, default=0, help="the seed of the values and queries")
+    runner.add_argument("--only", nargs="*", default=[],
+                        help="only run the benchmarks whose name contains one of these texts")
+    runner.add_argument("--output", help="the JSON file to write. If not given, the JSON is printed.")
+
+    comparer = commands.add_parser("compare", help="compare two runs")
+    comparer.add_argument("baseline", help="the JSON file of the reference run")
+    comparer.add_argument("candidate", help="the JSON file of the new run")
+    comparer.add_argument("--threshold", type=float, default=0.1,
+                          help="the relative slowdown flagged as a regression, 0.1 for 10%%")
+    comparer.add_argument("--noise", type=float, default=0.05,
+                          help="the change in milliseconds under which a benchmark is never flagged")
+    comparer.add_argument("--statistic", choices=("mean", "p50", "p95", "p99"), default="p50",
+                          help="the latency compared")
+
+    arguments = parser.parse_args(argv)
+
+    # We only map the switches once argparse has refused anything else than on or off
+    if arguments.command == "run":
+        arguments.memoize = [switch == "on" for switch in arguments.memoize]
+        arguments.columnar = [switch == "on" for switch in arguments.columnar]
+
+    return arguments
+
+
+def main(argv: list = None) -> int:
+    arguments = parse_arguments(argv)
+
+    if arguments.command == "compare":
+        return compare(arguments)
+
+    run(arguments)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
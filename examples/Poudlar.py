@@ -121,7 +121,7 @@ print(f"{student.display_name} will probably join {house.display_name} !")
 
 # We also can know the average distance between Hughes and the students of each house
 for i in range(4):
-    print(f"The average distance between {student.display_name} and the students of {plan.datasets[i].display_name} is {plan.datasets[i].average_dist}")
+    print(f"The average distance between {student.display_name} and the students of {plan.datasets[i].display_name} is {neighbors.dataset_average_dist(plan.datasets[i])}")
 
 # We find that Hughes is in fact, waayy more likely to be in Ravenclaw than in Gryffindor !
 # Also, he is very unlikely to be in Slytherin, since the average distance is very high (~ 7.5 with Slytherin
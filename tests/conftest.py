@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from EasyKnn import Dataset, Plan, Value
+
+
+@pytest.fixture
+def clustered_plan():
+    """
+    Create a Plan of a single Dataset of random values around a few centers, and queries drawn the same way.
+    """
+    def create(size=600, width=6, centers=12, queries=30, seed=7):
+        generator = random.Random(seed)
+        middles = [[generator.uniform(-10, 10) for _ in range(width)] for _ in range(centers)]
+
+        def draw():
+            middle = generator.choice(middles)
+            return [coord + generator.gauss(0, 1) for coord in middle]
+
+        plan = Plan()
+        dataset = Dataset()
+        dataset.add_values([Value(draw()) for _ in range(size)])
+        plan.add_dataset(dataset)
+
+        return plan, [draw() for _ in range(queries)]
+
+    return create
+
+
+@pytest.fixture
+def recall():
+    """
+    Get the share of the exact k nearest values of the queries that the index of a Plan finds.
+    """
+    def measure(plan, queries, k=10):
+        found = 0
+        for query in queries:
+            exact = plan.neighbors(Value(query), engine="vector", k=k).nearest_neighbor(k)
+            approximate = plan.neighbors(Value(query), engine="index", k=k).nearest_neighbor(k)
+
+            # Compared by coordinates, as the distances of a compressed index are only estimates
+            found += len(set([tuple(point.coordinates) for point in exact]) &
+                         set([tuple(point.coordinates) for point in approximate]))
+
+        return found / (k * len(queries))
+
+    return measure
@@ -0,0 +1,53 @@
+import asyncio
+
+from EasyKnn import AsyncPlan, Dataset, Plan, Value
+from EasyKnn.metrics import Minkowski
+
+
+def test_an_empty_plan_finds_no_neighbors():
+    async_plan = AsyncPlan(Plan())
+
+    neighbors = asyncio.run(async_plan.neighbors(Value([1, 1])))
+
+    assert neighbors.nearest_neighbor() == []
+    assert neighbors.average_dist is None
+
+
+def test_metrics_with_the_same_name_are_not_batched_together():
+    plan = Plan()
+    dataset = Dataset()
+    dataset.add_values([Value([3, 0]), Value([2, 2])])
+    plan.add_dataset(dataset)
+    async_plan = AsyncPlan(plan, max_batch_size=8)
+
+    manhattan, euclidean = Minkowski(1), Minkowski(2)
+    euclidean.name = manhattan.name
+
+    async def main():
+        return await asyncio.gather(async_plan.neighbors(Value([0, 0]), metric=manhattan),
+                                    async_plan.neighbors(Value([0, 0]), metric=euclidean))
+
+    by_manhattan, by_euclidean = asyncio.run(main())
+
+    assert by_manhattan.nearest_neighbor()[0].coordinates == [3, 0]
+    assert by_euclidean.nearest_neighbor()[0].coordinates == [2, 2]
+    assert async_plan.batch_sizes == {1: 2}
+
+
+def test_computed_batches_are_not_kept():
+    plan = Plan()
+    dataset = Dataset()
+    dataset.add_values([Value([1, 1])])
+    plan.add_dataset(dataset)
+    async_plan = AsyncPlan(plan)
+
+    async def main():
+        query = asyncio.ensure_future(async_plan.neighbors(Value([0, 0])))
+        await asyncio.sleep(0)
+        await async_plan.flush()
+        await query
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+
+    assert async_plan._tasks == set()
@@ -0,0 +1,56 @@
+from EasyKnn import Dataset, Plan, Value, Weight
+
+
+def columnar_plan():
+    plan = Plan()
+    dataset = Dataset(columnar=True)
+    dataset.add_values([Value([i, i + 1]) for i in range(20)])
+    plan.add_dataset(dataset)
+
+    return plan, dataset
+
+
+def test_direct_distances_hit_the_distances_memoized_by_neighbors():
+    plan, dataset = columnar_plan()
+    query = Value([3, 3])
+
+    plan.neighbors(query)
+    hits, misses = plan.memoized.hits, plan.memoized.misses
+
+    for point in dataset.data:
+        plan._distance(query, point, Weight([]))
+
+    assert plan.memoized.hits - hits == len(dataset)
+    assert plan.memoized.misses == misses
+
+
+def test_direct_distances_intern_one_context_per_query():
+    plan, dataset = columnar_plan()
+    query = Value([3, 3])
+
+    for _ in range(3):
+        for point in dataset.data:
+            plan._distance(query, point, Weight([]))
+
+    assert len(plan._contexts) == 1
+    assert plan.memoized.misses == len(dataset)
+    assert plan.memoized.hits == 2 * len(dataset)
+
+
+def test_direct_distances_of_rows_are_not_reused_after_an_edit():
+    plan, dataset = columnar_plan()
+    query, point = Value([0, 0]), dataset.data[0]
+
+    assert plan._distance(query, point, Weight([])) == 1.0
+
+    point.coordinates = [3, 4]
+    assert plan._distance(query, point, Weight([])) == 5.0
+
+
+def test_direct_distances_of_unlinked_values():
+    plan = Plan()
+    query, point = Value([0, 0]), Value([3, 4])
+
+    assert plan._distance(query, point, Weight([])) == 5.0
+    assert plan._distance(query, point, Weight([])) == 5.0
+    assert (plan.memoized.hits, plan.memoized.misses) == (1, 1)
@@ -0,0 +1,80 @@
+import gc
+
+import pytest
+
+from EasyKnn import Dataset, Plan, Value, StaleNeighborsError
+
+
+def test_columnar_data_gives_the_same_value_for_a_row():
+    dataset = Dataset(columnar=True)
+    dataset.add_values([Value([1, 2]), Value([3, 4])])
+
+    first = dataset.data[0]
+
+    assert dataset.data[0] is first
+    assert dataset.data[-2] is first
+    assert dataset.data[0:1][0] is first
+    assert list(dataset.data)[0] is first
+
+
+def test_columnar_data_keeps_the_added_values():
+    dataset = Dataset(columnar=True)
+    added = Value([1, 2], display_name="first")
+    dataset.add_value(added)
+
+    assert dataset.data[0] is added
+    assert added.coordinates == [1.0, 2.0]
+
+
+def test_columnar_data_writes_through():
+    plan = Plan()
+    dataset = Dataset(columnar=True)
+    dataset.add_values([Value([1, 2]), Value([3, 4])])
+    plan.add_dataset(dataset)
+
+    dataset.data[1].coordinates = [0, 1]
+    dataset.data[1].display_name = "moved"
+
+    assert dataset._storage.row(1) == [0.0, 1.0]
+    assert dataset.data[1].display_name == "moved"
+
+    nearest = plan.neighbors(Value([0, 1]), k=1).nearest_neighbor()[0]
+    assert nearest.coordinates == [0.0, 1.0]
+    assert nearest.display_name == "moved"
+
+
+def test_columnar_data_does_not_keep_unused_values():
+    dataset = Dataset(columnar=True)
+    dataset.add_values([[i, i] for i in range(100)])
+
+    for value in dataset.data:
+        value.coordinates
+    del value
+
+    gc.collect()
+    assert len(dataset._proxies) == 0
+    assert len(dataset.data) == 100
+
+
+def test_columnar_nonify_pads_the_rows_virtually():
+    dataset = Dataset(columnar=True)
+    dataset.add_values([Value([1, 2, 3]), Value([4, 5])])
+    plan = Plan()
+    plan.add_dataset(dataset)
+
+    nearest = plan.neighbors(Value([4, 5]), k=1).nearest_neighbor()[0]
+    version = dataset._version
+    dataset.nonify()
+
+    assert list(dataset._storage._lengths) == [3, 2]
+    assert dataset.data[1].coordinates == [4, 5, None]
+    assert dataset._version > version
+
+    # The row is presented differently, so a Point read lazily must not see it
+    with pytest.raises(StaleNeighborsError):
+        nearest.coordinates
+
+    # Nothing is presented differently the second time
+    version = dataset._version
+    dataset.nonify()
+    assert dataset._version == version
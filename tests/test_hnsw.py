@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.mark.parametrize("ef_search, expected", [(10, 0.9), (50, 0.97)])
+def test_recall_against_a_full_scan(clustered_plan, recall, ef_search, expected):
+    plan, queries = clustered_plan()
+    plan.build_index("hnsw", M=8, ef_construction=40, ef_search=ef_search)
+
+    assert recall(plan, queries) >= expected
@@ -0,0 +1,33 @@
+import pytest
+
+from EasyKnn import Value
+
+
+@pytest.mark.parametrize("kind, options, expected", [
+    ("ivf", {"nlist": 16, "nprobe": 4}, 0.97),
+    ("hnsw", {"M": 8, "ef_construction": 40}, 0.97),
+    ("lsh", {}, 0.9),
+    ("pq", {"subvectors": 3, "bits": 6}, 0.6),
+    ("pq", {"subvectors": 3, "bits": 6, "rerank": 50}, 0.97),
+])
+def test_added_and_edited_values_are_found(clustered_plan, recall, kind, options, expected):
+    plan, queries = clustered_plan()
+    index = plan.build_index(kind, **options)
+    dataset = plan.datasets[0]
+
+    def found(query):
+        return [point.coordinates for point in plan.neighbors(Value(query), engine="index", k=5).nearest_neighbor(5)]
+
+    # The next query after an addition updates the index, by adding the values or building it again
+    dataset.add_value(Value(queries[0]))
+    assert index.stale
+    assert queries[0] in found(queries[0])
+    assert not index.stale
+
+    old = list(dataset.data[0].coordinates)
+    dataset.data[0].coordinates = queries[1]
+    assert index.stale
+    assert queries[1] in found(queries[1])
+    assert old not in found(old)
+
+    assert recall(plan, queries) >= expected
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.mark.parametrize("nprobe, expected", [(1, 0.75), (2, 0.9), (4, 0.97), (16, 1.0)])
+def test_recall_grows_with_nprobe(clustered_plan, recall, nprobe, expected):
+    plan, queries = clustered_plan()
+    plan.build_index("ivf", nlist=16, nprobe=nprobe)
+
+    assert recall(plan, queries) >= expected
@@ -0,0 +1,24 @@
+import pytest
+
+from EasyKnn import Value
+
+
+@pytest.mark.parametrize("tables, bits, expected", [(8, 12, 0.9), (2, 16, 0.75)])
+def test_recall_against_a_full_scan(clustered_plan, recall, tables, bits, expected):
+    plan, queries = clustered_plan()
+    plan.build_index("lsh", tables=tables, bits=bits)
+
+    assert recall(plan, queries) >= expected
+
+
+def test_a_query_with_too_few_candidates_scans_all_the_values(clustered_plan):
+    plan, _ = clustered_plan()
+    index = plan.build_index("lsh", tables=1, bits=16)
+
+    # No value shares the bucket of a query this far
+    query = Value([1000] * 6)
+    found = plan.neighbors(query, engine="index", k=5).nearest_neighbor(5)
+    exact = plan.neighbors(query, engine="vector", k=5).nearest_neighbor(5)
+
+    assert index.evaluations == len(plan.datasets[0])
+    assert [point.coordinates for point in found] == [point.coordinates for point in exact]
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+import pytest
+
+from EasyKnn import Dataset, Plan, Value
+from EasyKnn.metrics import Minkowski, get_metric
+
+
+def test_minkowski_needs_its_order():
+    with pytest.raises(ValueError):
+        get_metric("minkowski")
+
+    with pytest.raises(ValueError):
+        get_metric("minkowski:two")
+
+
+def test_minkowski_by_name_uses_its_order():
+    plan = Plan()
+    dataset = Dataset()
+    dataset.add_values([Value([0, 0]), Value([3, 4])])
+    plan.add_dataset(dataset)
+
+    by_name = plan.neighbors(Value([0, 0]), metric="minkowski:1", k=2).nearest_neighbor(2)
+    by_object = plan.neighbors(Value([0, 0]), metric=Minkowski(1), k=2).nearest_neighbor(2)
+
+    assert [point.distance for point in by_name] == [point.distance for point in by_object] == [0.0, 7.0]
+
+
+def test_vptree_with_a_minkowski_distance_is_saved():
+    plan = Plan()
+    dataset = Dataset()
+    dataset.add_values([Value([x, y]) for x in range(5) for y in range(5)])
+    plan.add_dataset(dataset)
+    plan.build_index("vptree", metric=Minkowski(3))
+
+    path = os.path.join(tempfile.mkdtemp(), "plan.knn")
+    plan.save(path)
+
+    assert Plan.load(path).index._metric.name == "minkowski(3)"
@@ -0,0 +1,67 @@
+import pytest
+
+from EasyKnn import Dataset, Plan, Value
+
+
+@pytest.mark.parametrize("k", [None, 1])
+def test_each_query_keeps_its_own_dataset_averages(k):
+    plan = Plan()
+    near, far = Dataset(), Dataset()
+    near.add_values([Value([1, 0]), Value([3, 0])])
+    far.add_values([Value([10, 0]), Value([20, 0])])
+    plan.add_datasets([near, far])
+
+    first = plan.neighbors(Value([0, 0]), k=k)
+    second = plan.neighbors(Value([20, 0]), k=k)
+
+    assert (first.dataset_average_dist(near), first.dataset_average_dist(far)) == (2.0, 15.0)
+    assert (second.dataset_average_dist(near), second.dataset_average_dist(far)) == (18.0, 5.0)
+    assert first.nearest_dataset() == [near] and second.nearest_dataset() == [far]
+
+    with pytest.raises(AttributeError, match="Neighbors.dataset_average_dist"):
+        near.average_dist
+
+
+@pytest.mark.parametrize("engine", ["python", "vector"])
+@pytest.mark.parametrize("datasets", [0, 2])
+def test_a_plan_without_values_finds_no_neighbors(engine, datasets):
+    plan = Plan()
+    plan.add_datasets([Dataset() for _ in range(datasets)])
+
+    for k in (None, 1):
+        neighbors = plan.neighbors(Value([1, 2]), engine=engine, k=k)
+
+        assert neighbors.nearest_neighbor() == []
+        assert neighbors.average_dist is None
+        assert neighbors.dataset_neighbors == []
+
+
+def _plan_of_datasets():
+    plan = Plan()
+    datasets = []
+    for offset in (0, 40, 80):
+        dataset = Dataset()
+        dataset.add_values([Value([offset + i * 0.5, (i * 7) % 13]) for i in range(100)])
+        datasets.append(dataset)
+    plan.add_datasets(datasets)
+    return plan
+
+
+@pytest.mark.parametrize("engine, options", [("index", {"kind": "kdtree"}), ("index", {"kind": "hnsw"}),
+                                             ("vector", {"early_abandon": True})])
+def test_partial_engines_rank_the_datasets_like_a_scan(engine, options):
+    plan = _plan_of_datasets()
+    if engine == "index":
+        plan.build_index(options["kind"])
+        options = {}
+
+    query = Value([10, 3])
+    scan = plan.neighbors(query, k=3)
+    partial = plan.neighbors(query, engine=engine, k=3, **options)
+
+    # Only the nearest dataset holds one of the 3 nearest points, yet all of them are ranked
+    assert set([point.dataset for point in partial.nearest_neighbor(3)]) == set([plan.datasets[0]])
+    assert partial.dataset_neighbors == scan.dataset_neighbors == plan.datasets
+    for dataset in plan.datasets:
+        assert partial.dataset_average_dist(dataset) == pytest.approx(scan.dataset_average_dist(dataset))
+    assert partial.average_dist == pytest.approx(scan.average_dist)
@@ -0,0 +1,60 @@
+import sys
+import threading
+
+import pytest
+
+from EasyKnn import Dataset, Plan, Value
+from EasyKnn.parallel import _attached_blocks
+
+pytestmark = pytest.mark.skipif(sys.version_info < (3, 8), reason="shared memory needs Python 3.8")
+
+
+def test_workers_close_the_blocks_of_older_publications():
+    plan = Plan()
+    datasets = [Dataset(), Dataset()]
+    for offset, dataset in enumerate(datasets):
+        dataset.add_values([Value([offset + i, i]) for i in range(20)])
+    plan.add_datasets(datasets)
+
+    pool = plan.start_pool(processes=2, shard_size=5)
+    try:
+        for edit in range(5):
+            datasets[0].add_value(Value([100 + edit, 0]))
+            assert plan.neighbors(Value([100 + edit, 0]), engine="process", k=1).nearest_neighbor()[0].distance == 0
+
+        # Every worker only keeps the blocks of the latest publication it saw, one per Dataset
+        counts = pool._pool.map(_attached_blocks, range(20), chunksize=1)
+        assert 0 < max(counts) <= len(datasets)
+    finally:
+        plan.stop_pool()
+
+
+def test_a_query_does_not_hold_the_lock_while_the_workers_search():
+    plan = Plan()
+    dataset = Dataset()
+    dataset.add_values([Value([i, i]) for i in range(40)])
+    plan.add_dataset(dataset)
+
+    pool = plan.start_pool(processes=2, shard_size=10)
+    try:
+        search = pool._pool.map
+        republished = []
+
+        def map_while_another_thread_publishes(function, tasks):
+            # Another thread takes the lock and publishes new blocks while the query runs
+            thread = threading.Thread(target=lambda: republished.append(pool.publish()))
+            thread.start()
+            thread.join(timeout=10)
+
+            # The blocks of the running query are kept until it ends
+            assert republished and pool._retired
+            return search(function, tasks)
+
+        pool._pool.map = map_while_another_thread_publishes
+        found = pool.query([3, 3], [1, 1], 1)
+        pool._pool.map = search
+
+        assert found[0][0] == 0
+        assert pool._retired == {} and pool._readers == {}
+    finally:
+        plan.stop_pool()
@@ -0,0 +1,95 @@
+import json
+import random
+import threading
+
+import pytest
+
+from EasyKnn import Dataset, Plan, Value
+from EasyKnn.persistence import _HEADER
+
+
+def _plan(size=300):
+    generator = random.Random(5)
+    plan = Plan()
+    dataset = Dataset()
+    dataset.add_values([Value([generator.random() for _ in range(4)]) for _ in range(size)])
+    dataset.add_value(Value([0.5, None, 0.5, 0.5]))
+    plan.add_dataset(dataset)
+    return plan
+
+
+def _description(path):
+    with open(path, "rb") as file:
+        raw = file.read()
+
+    _, _, length = _HEADER.unpack(raw[:_HEADER.size])
+    return json.loads(raw[_HEADER.size:_HEADER.size + length].decode("utf-8"))
+
+
+@pytest.mark.parametrize("kind", ["kdtree", "vptree"])
+def test_the_nodes_of_a_tree_are_saved_as_arrays(kind, tmp_path):
+    plan = _plan()
+    plan.build_index(kind)
+    query = Value([0.3, 0.6, 0.1, 0.9])
+    expected = plan.neighbors(query, engine="index", k=5).nearest_neighbor(5)
+
+    path = str(tmp_path / "plan.knn")
+    plan.save(path)
+
+    state = _description(path)["index"]["state"]
+    assert not [name for name, value in state.items() if isinstance(value, list) and len(value) > 4]
+
+    for mmap in (True, False):
+        found = Plan.load(path, mmap=mmap).neighbors(query, engine="index", k=5).nearest_neighbor(5)
+        assert [point.distance for point in found] == [point.distance for point in expected]
+
+
+def test_save_rebuilds_a_stale_index_under_the_build_lock(tmp_path):
+    plan = _plan()
+    plan.build_index("kdtree")
+    plan.datasets[0].add_value(Value([0.1, 0.1, 0.1, 0.1]))
+
+    class RecordingLock:
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.held = 0
+
+        def __enter__(self):
+            self.lock.acquire()
+            self.held += 1
+
+        def __exit__(self, *args):
+            self.lock.release()
+
+    plan._build_lock = RecordingLock()
+    plan.save(str(tmp_path / "plan.knn"))
+
+    assert plan._build_lock.held == 1
+    assert not plan.index.stale
+
+
+def test_only_the_current_layout_is_loaded(tmp_path):
+    path = str(tmp_path / "plan.knn")
+    _plan(10).save(path)
+
+    with open(path, "r+b") as file:
+        magic, version, length = _HEADER.unpack(file.read(_HEADER.size))
+        file.seek(0)
+        file.write(_HEADER.pack(magic, version + 1, length))
+
+    with pytest.raises(ValueError):
+        Plan.load(path)
+
+
+def test_the_virtual_padding_of_a_columnar_dataset_is_saved(tmp_path):
+    dataset = Dataset(columnar=True)
+    dataset.add_values([Value([1, 2, 3]), Value([4, 5])])
+    dataset.nonify()
+    plan = Plan()
+    plan.add_dataset(dataset)
+
+    path = str(tmp_path / "plan.knn")
+    plan.save(path)
+    loaded = Plan.load(path).datasets[0]
+
+    assert [value.coordinates for value in loaded.data] == [[1, 2, 3], [4, 5, None]]
@@ -0,0 +1,53 @@
+import pytest
+
+from EasyKnn import Dataset, Plan, Value, StaleNeighborsError
+
+
+def _plan(columnar=False):
+    dataset = Dataset(columnar=columnar)
+    dataset.add_values([Value([1, 1]), Value([5, 5])])
+    plan = Plan()
+    plan.add_dataset(dataset)
+    return plan, dataset
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_points_read_their_row_once(columnar):
+    plan, dataset = _plan(columnar)
+
+    nearest = plan.neighbors(Value([0, 0]), k=1).nearest_neighbor()[0]
+    assert nearest._coordinates is None
+
+    assert nearest.coordinates == [1, 1]
+
+    # Once read, the coordinates are the ones of the query, whatever changes afterwards
+    dataset.data[0].coordinates = [9, 9]
+    assert nearest.coordinates == [1, 1]
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_points_refuse_a_changed_dataset(columnar):
+    plan, dataset = _plan(columnar)
+
+    nearest = plan.neighbors(Value([0, 0]), k=1).nearest_neighbor()[0]
+    everything = plan.neighbors(Value([0, 0])).neighbors
+    dataset.data[0].coordinates = [9, 9]
+
+    with pytest.raises(StaleNeighborsError):
+        nearest.coordinates
+
+    with pytest.raises(StaleNeighborsError):
+        everything[0].coordinates
+
+    # The distance and the dataset are kept by the Point
+    assert (nearest.distance, nearest.dataset) == (2 ** 0.5, dataset)
+
+
+def test_lazy_neighbors_refuse_a_changed_dataset():
+    plan, dataset = _plan()
+
+    neighbors = plan.neighbors(Value([0, 0]), k=1)
+    dataset.data[1].coordinates = [0, 0]
+
+    with pytest.raises(StaleNeighborsError):
+        neighbors.neighbors
@@ -0,0 +1,9 @@
+import pytest
+
+
+@pytest.mark.parametrize("rerank, expected", [(0, 0.6), (50, 0.97)])
+def test_recall_against_a_full_scan(clustered_plan, recall, rerank, expected):
+    plan, queries = clustered_plan()
+    plan.build_index("pq", subvectors=3, bits=6, rerank=rerank)
+
+    assert recall(plan, queries) >= expected
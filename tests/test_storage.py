@@ -0,0 +1,76 @@
+import math
+import random
+
+import pytest
+
+from EasyKnn.metrics import get_metric
+from EasyKnn.storage import ColumnarStorage
+
+WIDTH = 8
+
+
+def _rows(count, low, high, seed):
+    generator = random.Random(seed)
+    return [[generator.uniform(low, high) for _ in range(WIDTH)] for _ in range(count)]
+
+
+def _distances(storage, query):
+    return list(get_metric("euclidean").block(query, storage, [1] * WIDTH))
+
+
+def _storages(dtype, rows):
+    exact, quantized = ColumnarStorage(), ColumnarStorage(dtype)
+    for row in rows:
+        exact.append(row)
+        quantized.append(row)
+
+    return exact, quantized
+
+
+@pytest.mark.parametrize("dtype, relative", [("float32", 2 ** -24), ("float16", 2 ** -11)])
+def test_float_distances_stay_within_the_rounding_of_the_coordinates(dtype, relative):
+    rows = _rows(200, -100, 100, seed=1)
+    query = _rows(1, -100, 100, seed=2)[0]
+    exact, quantized = _storages(dtype, rows)
+
+    # Each coordinate is rounded to the nearest float of the type, so by the triangle inequality a distance moves by
+    # at most the length of the row times the relative rounding
+    for row, expected, found in zip(rows, _distances(exact, query), _distances(quantized, query)):
+        tolerance = math.sqrt(sum([coord ** 2 for coord in row])) * relative
+        assert abs(found - expected) <= tolerance + 1e-12
+
+
+def test_int8_distances_stay_within_a_step_of_the_column_ranges():
+    rows = _rows(200, -5, 5, seed=3)
+    query = _rows(1, -5, 5, seed=4)[0]
+    exact, quantized = _storages("int8", rows)
+
+    # A coordinate is rounded to the nearest of the 255 codes of its column, half a step away at most
+    steps = [(high - low) / 254 for low, high in zip(quantized._lows, quantized._highs)]
+    tolerance = math.sqrt(sum([(step / 2) ** 2 for step in steps]))
+
+    for expected, found in zip(_distances(exact, query), _distances(quantized, query)):
+        assert abs(found - expected) <= tolerance + 1e-12
+
+
+def test_int8_rows_are_converted_again_when_a_later_value_widens_the_range():
+    rows = _rows(100, 0, 1, seed=5)
+    exact, quantized = _storages("int8", rows)
+    low, high = quantized._lows[0], quantized._highs[0]
+
+    wide = [50.0] + [0.5] * (WIDTH - 1)
+    exact.append(wide)
+    quantized.append(wide)
+    rows.append(wide)
+
+    assert quantized._lows[0] <= low and quantized._highs[0] >= 50 > high
+    assert quantized.row(len(rows) - 1)[0] == pytest.approx(50, abs=(quantized._highs[0] - quantized._lows[0]) / 254)
+
+    # The rows added before were rounded on the old range, then again on the new one: each coordinate is at most a
+    # half step of each range away, so a full step of the wider one
+    steps = [(high - low) / 254 for low, high in zip(quantized._lows, quantized._highs)]
+    tolerance = math.sqrt(sum([step ** 2 for step in steps]))
+
+    query = _rows(1, 0, 1, seed=6)[0]
+    for expected, found in zip(_distances(exact, query), _distances(quantized, query)):
+        assert abs(found - expected) <= tolerance + 1e-12